@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+VitalSense Pro - Batch Feature Extraction
+Runs VitalSignsExtractor over directories of BIDMC-style WFDB records with a process pool,
+appending one result per record to JSONL (or Parquet when pyarrow is installed). Records
+whose files hash to an already extracted result are skipped, so interrupted runs resume.
+
+Usage:
+    python batch_extract_features.py ../archive --workers 8 --output features.jsonl
+    python batch_extract_features.py ../archive/bidmc01 ../archive/bidmc02 --format parquet --output features_parquet
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Set
+
+from services.wfdb_reader import record_base_path
+
+# Files that make up one record set, relative to the record base path
+RECORD_FILE_SUFFIXES = ('.hea', '.dat', 'n.hea', 'n.dat')
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def discover_records(inputs: Iterable[str]) -> List[str]:
+    """Resolve directories, record files and bare record paths to sorted record base paths.
+
+    Numerics records (<record>n) are folded into their parent record rather than
+    extracted on their own.
+    """
+    bases = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for filename in files:
+                    if filename.endswith('.hea'):
+                        bases.add(os.path.join(root, filename[:-4]))
+        else:
+            base = record_base_path(item)
+            if os.path.exists(base + '.hea'):
+                bases.add(base)
+            else:
+                print(f"⚠️  Skipping {item}: no {base}.hea")
+
+    return sorted(
+        base for base in bases
+        if not (base.endswith('n') and base[:-1] in bases)
+    )
+
+def content_hash(base: str) -> str:
+    """SHA-256 over every file of the record set, so renamed copies are still recognised"""
+    digest = hashlib.sha256()
+    for suffix in RECORD_FILE_SUFFIXES:
+        path = base + suffix
+        if not os.path.exists(path):
+            continue
+        digest.update(f"{suffix}:{os.path.getsize(path)}\n".encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+class JSONLResultWriter:
+    """Appends one JSON object per record and flushes after each, so partial runs are kept"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+
+    def completed_hashes(self) -> Set[str]:
+        hashes = set()
+        if not os.path.exists(self.path):
+            return hashes
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Truncated final line from an interrupted run
+                if row.get('status') == 'ok' and row.get('content_hash'):
+                    hashes.add(row['content_hash'])
+        return hashes
+
+    def write(self, result: Dict[str, Any]):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(result, default=str) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class ParquetResultWriter:
+    """Writes a new part file per run into an output directory, in row groups of batch_size.
+
+    Features are stored as a JSON string column so records with different channel sets
+    share one schema.
+    """
+
+    COLUMNS = ('record', 'path', 'content_hash', 'status', 'error', 'seconds', 'extracted_at', 'features_json')
+
+    def __init__(self, path: str, batch_size: int = 256):
+        import pyarrow  # noqa: F401  (fail early when the optional dependency is missing)
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(path, exist_ok=True)
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+
+    def completed_hashes(self) -> Set[str]:
+        import pyarrow.parquet as pq
+        hashes = set()
+        for filename in sorted(os.listdir(self.path)):
+            if not filename.endswith('.parquet'):
+                continue
+            table = pq.read_table(os.path.join(self.path, filename), columns=['content_hash', 'status'])
+            for content_hash_value, status in zip(table.column('content_hash').to_pylist(),
+                                                  table.column('status').to_pylist()):
+                if status == 'ok' and content_hash_value:
+                    hashes.add(content_hash_value)
+        return hashes
+
+    def write(self, result: Dict[str, Any]):
+        row = {column: result.get(column) for column in self.COLUMNS}
+        row['features_json'] = json.dumps(result['features'], default=str) if result.get('features') else None
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._rows, schema=pa.schema([
+            ('record', pa.string()),
+            ('path', pa.string()),
+            ('content_hash', pa.string()),
+            ('status', pa.string()),
+            ('error', pa.string()),
+            ('seconds', pa.float64()),
+            ('extracted_at', pa.string()),
+            ('features_json', pa.string())
+        ]))
+        if self._writer is None:
+            part = f"part-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.parquet"
+            self._writer = pq.ParquetWriter(os.path.join(self.path, part), table.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+def create_writer(output_format: str, output: str):
+    if output_format == 'parquet':
+        try:
+            return ParquetResultWriter(output)
+        except ImportError:
+            print("❌ Parquet output needs the optional pyarrow package (pip install pyarrow)")
+            sys.exit(1)
+    return JSONLResultWriter(output)
+
+# Worker process state, set once per process by _init_worker
+_completed_hashes: Set[str] = set()
+_extractor = None
+
+def _init_worker(completed_hashes: Set[str], verbose: bool):
+    global _completed_hashes, _extractor
+    from vitalsigns_extractor import VitalSignsExtractor
+
+    _completed_hashes = completed_hashes
+    _extractor = VitalSignsExtractor()
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+def extract_record(base: str) -> Dict[str, Any]:
+    """Hash one record set and extract its features unless that content was already done"""
+    started = time.perf_counter()
+    result: Dict[str, Any] = {
+        'record': os.path.basename(base),
+        'path': os.path.abspath(base),
+        'content_hash': None,
+        'status': 'ok',
+        'error': None
+    }
+    try:
+        result['content_hash'] = content_hash(base)
+        if result['content_hash'] in _completed_hashes:
+            result['status'] = 'skipped'
+        else:
+            features = _extractor.extract_all_features(base)
+            if features is None:
+                result['status'] = 'failed'
+                result['error'] = 'Could not read WFDB record'
+            else:
+                result['features'] = features
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    result['extracted_at'] = datetime.now().isoformat()
+    return result
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract MAI-DxO features from many WFDB records in parallel")
+    parser.add_argument("inputs", nargs="+", help="Directories to scan for .hea files, or individual records")
+    parser.add_argument("--output", default="features.jsonl",
+                        help="JSONL file, or a directory of part files for --format parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--chunksize", type=int, default=4, help="Records handed to a worker at a time")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--force", action="store_true", help="Re-extract records that already have results")
+    parser.add_argument("--verbose", action="store_true", help="Keep the extractor's per-record output")
+    return parser.parse_args()
+
+def print_progress(counts: Dict[str, int], total: int, started: float):
+    elapsed = time.perf_counter() - started
+    done = sum(counts.values())
+    extracted = counts['ok'] + counts['failed']
+    print(f"   {done}/{total} records | ✅ {counts['ok']} ok, ⏭️  {counts['skipped']} skipped, "
+          f"❌ {counts['failed']} failed | {extracted / elapsed if elapsed else 0.0:.1f} records/s", flush=True)
+
+def main():
+    args = parse_args()
+    records = discover_records(args.inputs)
+    if not records:
+        print("❌ No WFDB records found")
+        sys.exit(1)
+
+    writer = create_writer(args.format, args.output)
+    completed = set() if args.force else writer.completed_hashes()
+    workers = max(1, min(args.workers, len(records)))
+
+    print(f"🚀 Extracting features from {len(records)} records with {workers} workers "
+          f"(chunksize {args.chunksize}) -> {args.output}")
+    if completed:
+        print(f"   {len(completed)} records already extracted in {args.output} will be skipped")
+
+    counts = {'ok': 0, 'skipped': 0, 'failed': 0}
+    started = time.perf_counter()
+    last_progress = started
+
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(completed, args.verbose)) as pool:
+            for result in pool.imap_unordered(extract_record, records, chunksize=args.chunksize):
+                counts[result['status']] += 1
+                if result['status'] == 'failed':
+                    print(f"   ❌ {result['record']}: {result['error']}")
+                if result['status'] != 'skipped':
+                    writer.write(result)
+
+                now = time.perf_counter()
+                if now - last_progress >= args.progress_every:
+                    print_progress(counts, len(records), started)
+                    last_progress = now
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    extracted = counts['ok'] + counts['failed']
+    print(f"\n✅ Done in {elapsed:.1f}s: {counts['ok']} extracted, {counts['skipped']} skipped, "
+          f"{counts['failed']} failed")
+    print(f"📈 Throughput: {extracted / elapsed if elapsed else 0.0:.2f} records/s extracted, "
+          f"{len(records) / elapsed if elapsed else 0.0:.2f} records/s including skipped")
+
+if __name__ == "__main__":
+    main()
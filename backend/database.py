@@ -9,7 +9,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import Engine
 from typing import Generator
 
-from config import get_database_url
+from config import get_database_url, settings
 
 # Import all models so SQLAlchemy can create tables
 from models.user import User
@@ -18,12 +18,17 @@ from models.health_center import HealthCenter
 from models.analysis_session import AnalysisSession
 from models.specialist_consultation import SpecialistConsultation
 
+# SQLite (local development and benchmarks) is shared between request and worker threads
+database_url = get_database_url()
+connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+
 # Create SQLAlchemy engine
 engine: Engine = create_engine(
-    get_database_url(),
-    echo=True,  # Set to False in production
+    database_url,
+    echo=settings.database_echo,  # Set to False in production
     pool_pre_ping=True,  # Verify connections before use
     pool_recycle=300,  # Recycle connections every 5 minutes
+    connect_args=connect_args,
 )
 
 # Create SessionLocal class
@@ -61,6 +66,10 @@ def test_connection():
     try:
         from sqlalchemy import text
         with engine.connect() as conn:
+            if engine.dialect.name == "sqlite":
+                version = conn.execute(text("SELECT sqlite_version()")).fetchone()[0]
+                print(f"✅ Connected to SQLite: {version}")
+                return True
             result = conn.execute(text("SELECT version()"))
             version = result.fetchone()[0]
             print(f"✅ Connected to PostgreSQL: {version}")
@@ -5,13 +5,18 @@ Complete implementation of the 5-agent virtual medical panel using Gemini 2.0 Fl
 """
 
 import json
+import threading
 import requests
+import requests.adapters
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from dataclasses import dataclass
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from config import settings
+from services.llm_cache import ResponseCache, get_response_cache, make_cache_key
+from services.incremental_json import IncrementalJSONScanner
 
 # Load environment variables
 load_dotenv()
@@ -30,20 +35,175 @@ class DebateRound:
     specialist_responses: Dict[str, Dict[str, Any]]
     consensus_level: float
     key_disagreements: List[str]
+    preliminary_consensus_level: Optional[float] = None
+
+class PanelPromptBuilder:
+    """
+    Serializes prompt context once per analysis in compact form.
+    
+    Patient data is dumped a single time and shared by every prompt. Earlier rounds
+    are reduced to each specialist's core_assessment plus their stated
+    disagreements, and the debate context is capped at a character budget
+    (oldest rounds are dropped first) so prompts no longer grow with every round.
+    Per-run timestamps are left out, so the same inputs always give the same prompt
+    (and hit the response cache).
+    """
+    
+    def __init__(self, patient_data: Dict, debate_char_budget: Optional[int] = None):
+        self.patient_data = patient_data
+        self.debate_char_budget = debate_char_budget if debate_char_budget is not None else settings.mai_dxo_debate_char_budget
+        self._patient_json = None
+        self._round_summaries: Dict[int, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def compact_json(data: Any) -> str:
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+    
+    @property
+    def patient_json(self) -> str:
+        if self._patient_json is None:
+            self._patient_json = self.compact_json(self.stable_patient_data(self.patient_data))
+        return self._patient_json
+    
+    @staticmethod
+    def stable_patient_data(patient_data: Dict) -> Dict:
+        """Patient data without recording_metadata.timestamp, which changes on every run"""
+        metadata = patient_data.get('recording_metadata')
+        if not isinstance(metadata, dict) or 'timestamp' not in metadata:
+            return patient_data
+        return {**patient_data, 'recording_metadata': {k: v for k, v in metadata.items() if k != 'timestamp'}}
+    
+    @staticmethod
+    def stable_response(response: Dict[str, Any]) -> Dict[str, Any]:
+        """A specialist response without its completion timestamp"""
+        return {k: v for k, v in response.items() if k != 'timestamp'}
+    
+    @staticmethod
+    def summarize_response(response: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only what the rest of the panel needs from one specialist response"""
+        analysis = response.get('analysis', {})
+        if 'error' in analysis:
+            return {'status': 'failed'}
+        if 'raw_response' in analysis:
+            return {'status': 'unparsed'}
+        
+        summary = {'core_assessment': analysis.get('core_assessment', {})}
+        disagreements = analysis.get('disagreements_with_others') or analysis.get('key_disagreements')
+        if disagreements:
+            summary['disagreements'] = disagreements
+        return summary
+    
+    def round_summary(self, debate_round: DebateRound) -> Dict[str, Any]:
+        # Rounds are immutable once recorded, so each one is summarized only once
+        if debate_round.round_number not in self._round_summaries:
+            self._round_summaries[debate_round.round_number] = {
+                'round': debate_round.round_number,
+                'consensus_level': round(debate_round.consensus_level, 3),
+                'key_disagreements': debate_round.key_disagreements,
+                'assessments': {
+                    name: self.summarize_response(response)
+                    for name, response in debate_round.specialist_responses.items()
+                }
+            }
+        return self._round_summaries[debate_round.round_number]
+    
+    def debate_summary(self, debate_history: Optional[List[DebateRound]]) -> str:
+        """Compact summary of all rounds, oldest to newest; the oldest are dropped first to fit the budget"""
+        if not debate_history:
+            return ""
+        
+        summaries = [self.round_summary(r) for r in debate_history]
+        text = self.compact_json(summaries)
+        while len(text) > self.debate_char_budget and len(summaries) > 1:
+            summaries = summaries[1:]
+            text = self.compact_json(summaries)
+        return self._fit_budget(text)
+    
+    def latest_round_assessments(self, debate_history: Optional[List[DebateRound]]) -> str:
+        """Full analyses of the latest round when they fit the budget, otherwise its summary"""
+        if not debate_history:
+            return ""
+        
+        latest_round = debate_history[-1]
+        text = self.compact_json({name: self.stable_response(response)
+                                  for name, response in latest_round.specialist_responses.items()})
+        if len(text) <= self.debate_char_budget:
+            return text
+        return self._fit_budget(self.compact_json(self.round_summary(latest_round)))
+    
+    def specialist_assessment(self, debate_history: Optional[List[DebateRound]], specialist_name: str) -> str:
+        """First recorded response of one specialist"""
+        for debate_round in debate_history or []:
+            if specialist_name in debate_round.specialist_responses:
+                return self._fit_budget(self.compact_json(
+                    self.stable_response(debate_round.specialist_responses[specialist_name])))
+        return ""
+    
+    def _fit_budget(self, text: str) -> str:
+        if len(text) <= self.debate_char_budget:
+            return text
+        return text[:self.debate_char_budget] + " ...[truncated]"
 
 class GeminiClient:
     """Client for interacting with Gemini 2.0 Flash API"""
     
-    def __init__(self):
+    # One pooled keep-alive session per process, shared by every client instance
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    
+    def __init__(self, cache: Optional[ResponseCache] = None):
         self.api_key = os.getenv('GOOGLE_AI_API_KEY')
-        self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+        self.model = "gemini-2.0-flash"
+        base_url = settings.gemini_api_base_url.rstrip('/')
+        self.api_url = f"{base_url}/models/{self.model}:generateContent"
+        self.stream_url = f"{base_url}/models/{self.model}:streamGenerateContent?alt=sse"
+        self.streaming = settings.gemini_streaming
         self.headers = {
             'Content-Type': 'application/json',
-            'X-goog-api-key': self.api_key
+            'X-goog-api-key': self.api_key or ''
         }
+        self.generation_config = {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 8192,
+        }
+        self.timeout = (settings.gemini_connect_timeout, settings.gemini_read_timeout)
+        self.cache = cache if cache is not None else get_response_cache()
+        self._cache_served = set()  # Keys answered from the cache and not yet confirmed
     
-    def generate_response(self, prompt: str) -> str:
-        """Generate response from Gemini 2.0 Flash"""
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        """Return the process-wide pooled HTTP session"""
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=settings.gemini_max_connections
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    cls._session = session
+        return cls._session
+    
+    def _build_payload(self, prompt: str) -> Dict[str, Any]:
+        """Build the generateContent request body"""
+        return {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ],
+            "generationConfig": self.generation_config
+        }
+    
+    def _log_request(self, prompt: str):
         print("\n" + "="*80)
         print("🤖 GEMINI API CALL")
         print("="*80)
@@ -57,46 +217,121 @@ class GeminiClient:
         print(prompt_preview)
         print("-" * 40)
         print(f"📏 Full prompt length: {len(prompt)} characters")
+    
+    def _extract_text(self, result: Dict[str, Any]) -> str:
+        """Pull the generated text out of a generateContent response"""
+        if 'candidates' in result and len(result['candidates']) > 0:
+            ai_response = result['candidates'][0]['content']['parts'][0]['text']
+            print("✅ API Response received!")
+            print(f"📥 RESPONSE PREVIEW:")
+            print("-" * 40)
+            response_preview = ai_response[:500] + "..." if len(ai_response) > 500 else ai_response
+            print(response_preview)
+            print("-" * 40)
+            print(f"📏 Full response length: {len(ai_response)} characters")
+            print("="*80)
+            return ai_response
+        else:
+            print("❌ No valid response from Gemini API")
+            print(f"🔍 Raw API response: {result}")
+            raise Exception("No valid response from Gemini API")
+    
+    def _cache_key(self, prompt: str) -> str:
+        return make_cache_key(self.model, self.generation_config, prompt)
+    
+    def _cached_response(self, cache_key: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._cache_served.add(cache_key)
+            print(f"💾 Cache hit ({cache_key[:12]}) - skipping API call")
+            print("="*80)
+        return cached
+    
+    def cache_response(self, prompt: str, response_text: str):
+        """Cache a response once the caller has parsed it, so truncated or invalid output is never replayed"""
+        if self.cache is None:
+            return
+        cache_key = self._cache_key(prompt)
+        if cache_key in self._cache_served:
+            # Already cached; storing it again would restart its TTL
+            self._cache_served.discard(cache_key)
+            return
+        self.cache.set(cache_key, response_text)
+    
+    @staticmethod
+    def _stream_chunk_text(line: str) -> str:
+        """Text carried by one server-sent event line of streamGenerateContent"""
+        if not line or not line.startswith('data:'):
+            return ""
+        event = json.loads(line[5:].strip())
+        if 'error' in event:
+            raise Exception(f"Gemini stream error: {event['error']}")
+        text = ""
+        for candidate in event.get('candidates', []):
+            for part in candidate.get('content', {}).get('parts', []):
+                text += part.get('text', '')
+        return text
+    
+    def _finish_stream(self, chunks: List[str]) -> str:
+        response_text = "".join(chunks)
+        if not response_text:
+            print("❌ No valid response from Gemini API stream")
+            raise Exception("No valid response from Gemini API")
+        print(f"✅ API stream finished ({len(chunks)} chunks, {len(response_text)} characters)")
+        print("="*80)
+        return response_text
+    
+    def generate_response_stream(self, prompt: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Generate response via streamGenerateContent, passing each text chunk to on_text"""
+        self._log_request(prompt)
+        cache_key = self._cache_key(prompt)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            if on_text is not None:
+                on_text(cached)
+            return cached
+        
+        payload = self._build_payload(prompt)
         
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 8192,
-            }
-        }
+        try:
+            print("🌊 Making streaming API request...")
+            chunks = []
+            with self._get_session().post(
+                self.stream_url, headers=self.headers, json=payload, timeout=self.timeout, stream=True
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    text = self._stream_chunk_text(line)
+                    if text:
+                        chunks.append(text)
+                        if on_text is not None:
+                            on_text(text)
+            return self._finish_stream(chunks)
+        
+        except Exception as e:
+            print(f"❌ Error calling Gemini API: {e}")
+            print("="*80)
+            raise
+    
+    def generate_response(self, prompt: str) -> str:
+        """Generate response from Gemini 2.0 Flash"""
+        self._log_request(prompt)
+        cache_key = self._cache_key(prompt)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        payload = self._build_payload(prompt)
         
         try:
             print("🌐 Making API request...")
-            response = requests.post(self.api_url, headers=self.headers, json=payload)
+            response = self._get_session().post(
+                self.api_url, headers=self.headers, json=payload, timeout=self.timeout
+            )
             response.raise_for_status()
-            
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                ai_response = result['candidates'][0]['content']['parts'][0]['text']
-                print("✅ API Response received!")
-                print(f"📥 RESPONSE PREVIEW:")
-                print("-" * 40)
-                response_preview = ai_response[:500] + "..." if len(ai_response) > 500 else ai_response
-                print(response_preview)
-                print("-" * 40)
-                print(f"📏 Full response length: {len(ai_response)} characters")
-                print("="*80)
-                return ai_response
-            else:
-                print("❌ No valid response from Gemini API")
-                print(f"🔍 Raw API response: {result}")
-                raise Exception("No valid response from Gemini API")
+            return self._extract_text(response.json())
                 
         except Exception as e:
             print(f"❌ Error calling Gemini API: {e}")
@@ -111,62 +346,92 @@ class MAIDxOVirtualSpecialist:
         self.role = role
         self.gemini_client = gemini_client
     
-    def analyze(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> Dict[str, Any]:
-        """Analyze patient data and return specialist assessment"""
+    def analyze(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                prompt_builder: Optional[PanelPromptBuilder] = None,
+                on_core_assessment: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Analyze patient data and return specialist assessment.
+        
+        In streaming mode on_core_assessment(specialist_name, core_assessment) is
+        called as soon as the core_assessment object has been generated.
+        """
+        prompt = self._start_analysis(patient_data, previous_debate, prompt_builder)
+        
+        try:
+            if self.gemini_client.streaming:
+                scanner = self._core_assessment_scanner(on_core_assessment)
+                response = self.gemini_client.generate_response_stream(prompt, scanner.feed)
+            else:
+                response = self.gemini_client.generate_response(prompt)
+            return self._parse_analysis(response, prompt)
+        except Exception as e:
+            return self._failed_analysis(e)
+    
+    def _core_assessment_scanner(self, on_core_assessment: Optional[Callable[[str, Dict[str, Any]], None]]) -> IncrementalJSONScanner:
+        def on_field(key: str, value: Any):
+            print(f"⚡ {self.name} - core assessment streamed: {value}")
+            if on_core_assessment is not None and isinstance(value, dict):
+                on_core_assessment(self.name, value)
+        
+        return IncrementalJSONScanner(['core_assessment'], on_field)
+    
+    def _start_analysis(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                        prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
         print(f"\n🏥 {self.name} ({self.role}) - Starting Analysis")
         print(f"📊 Patient: {patient_data.get('personal_information', {}).get('full_name', 'Unknown')}")
         print(f"📋 Chief Complaint: {patient_data.get('symptoms_context', {}).get('chief_complaint', 'None')}")
         
-        prompt = self.create_prompt(patient_data, previous_debate)
-        
+        return self.create_prompt(patient_data, previous_debate, prompt_builder or PanelPromptBuilder(patient_data))
+    
+    def _parse_analysis(self, response: str, prompt: str) -> Dict[str, Any]:
+        """Turn the raw model text into the specialist response structure; only parsed responses are cached"""
+        # Try to parse JSON response - handle markdown code blocks
         try:
-            response = self.gemini_client.generate_response(prompt)
+            # Clean the response - remove markdown code blocks if present
+            cleaned_response = response.strip()
+            if cleaned_response.startswith('```json'):
+                cleaned_response = cleaned_response[7:]  # Remove ```json
+            if cleaned_response.startswith('```'):
+                cleaned_response = cleaned_response[3:]  # Remove ```
+            if cleaned_response.endswith('```'):
+                cleaned_response = cleaned_response[:-3]  # Remove ```
             
-            # Try to parse JSON response - handle markdown code blocks
-            try:
-                # Clean the response - remove markdown code blocks if present
-                cleaned_response = response.strip()
-                if cleaned_response.startswith('```json'):
-                    cleaned_response = cleaned_response[7:]  # Remove ```json
-                if cleaned_response.startswith('```'):
-                    cleaned_response = cleaned_response[3:]  # Remove ```
-                if cleaned_response.endswith('```'):
-                    cleaned_response = cleaned_response[:-3]  # Remove ```
-                
-                cleaned_response = cleaned_response.strip()
-                parsed_response = json.loads(cleaned_response)
-                print(f"✅ {self.name} - Analysis completed successfully")
-                return {
-                    'specialist': self.name,
-                    'role': self.role,
-                    'analysis': parsed_response,
-                    'timestamp': datetime.now().isoformat()
-                }
-            except json.JSONDecodeError as e:
-                print(f"⚠️ {self.name} - JSON parsing failed: {e}")
-                print(f"🔍 Raw response: {response[:200]}...")
-                # If JSON parsing fails, create a structured response with raw text
-                return {
-                    'specialist': self.name,
-                    'role': self.role,
-                    'analysis': {
-                        'raw_response': response,
-                        'note': 'Response not in valid JSON format, stored as raw text',
-                        'parsing_error': str(e)
-                    },
-                    'timestamp': datetime.now().isoformat()
-                }
-        except Exception as e:
-            # If API call fails, return error
-            print(f"❌ {self.name} - Analysis failed: {str(e)}")
+            cleaned_response = cleaned_response.strip()
+            parsed_response = json.loads(cleaned_response)
+            self.gemini_client.cache_response(prompt, response)
+            print(f"✅ {self.name} - Analysis completed successfully")
             return {
                 'specialist': self.name,
                 'role': self.role,
-                'analysis': {'error': str(e)},
+                'analysis': parsed_response,
                 'timestamp': datetime.now().isoformat()
             }
+        except json.JSONDecodeError as e:
+            print(f"⚠️ {self.name} - JSON parsing failed: {e}")
+            print(f"🔍 Raw response: {response[:200]}...")
+            # If JSON parsing fails, create a structured response with raw text
+            return {
+                'specialist': self.name,
+                'role': self.role,
+                'analysis': {
+                    'raw_response': response,
+                    'note': 'Response not in valid JSON format, stored as raw text',
+                    'parsing_error': str(e)
+                },
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def _failed_analysis(self, error: Exception) -> Dict[str, Any]:
+        # If API call fails, return error
+        print(f"❌ {self.name} - Analysis failed: {str(error)}")
+        return {
+            'specialist': self.name,
+            'role': self.role,
+            'analysis': {'error': str(error)},
+            'timestamp': datetime.now().isoformat()
+        }
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
         """Create the prompt for this specialist - to be overridden by subclasses"""
         raise NotImplementedError
 
@@ -176,13 +441,15 @@ class DrHypothesis(MAIDxOVirtualSpecialist):
     def __init__(self, gemini_client: GeminiClient):
         super().__init__("Dr. Hypothesis", "Differential Assessment Specialist", gemini_client)
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
         previous_debate_text = ""
         if previous_debate:
-            debate_data = json.dumps([r.__dict__ for r in previous_debate], indent=2)
+            debate_data = prompt_builder.debate_summary(previous_debate)
             previous_debate_text = f"PREVIOUS PANEL DISCUSSION: {debate_data}"
         
-        patient_data_str = json.dumps(patient_data, indent=2)
+        patient_data_str = prompt_builder.patient_json
         
         return f"""
 You are Dr. Hypothesis, the differential assessment specialist in the VitalSense virtual medical panel.
@@ -268,16 +535,13 @@ class DrMonitoringStrategist(MAIDxOVirtualSpecialist):
     def __init__(self, gemini_client: GeminiClient):
         super().__init__("Dr. Monitoring Strategist", "Clinical Monitoring Specialist", gemini_client)
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
-        hypothesis_assessment = ""
-        if previous_debate:
-            # Extract Dr. Hypothesis assessment from previous debate
-            for round in previous_debate:
-                if 'Dr. Hypothesis' in round.specialist_responses:
-                    hypothesis_assessment = json.dumps(round.specialist_responses['Dr. Hypothesis'])
-                    break
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
+        # Extract Dr. Hypothesis assessment from previous debate
+        hypothesis_assessment = prompt_builder.specialist_assessment(previous_debate, 'Dr. Hypothesis')
         
-        patient_context = json.dumps(patient_data, indent=2)
+        patient_context = prompt_builder.patient_json
         
         return f"""
 You are Dr. Monitoring Strategist, the clinical monitoring specialist in the VitalSense panel.
@@ -365,13 +629,15 @@ class DrChallenger(MAIDxOVirtualSpecialist):
     def __init__(self, gemini_client: GeminiClient):
         super().__init__("Dr. Challenger", "Devil's Advocate", gemini_client)
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
         previous_debate_text = ""
         if previous_debate:
-            debate_data = json.dumps([r.__dict__ for r in previous_debate], indent=2)
+            debate_data = prompt_builder.debate_summary(previous_debate)
             previous_debate_text = f"PREVIOUS PANEL DISCUSSION: {debate_data}"
         
-        patient_data_str = json.dumps(patient_data, indent=2)
+        patient_data_str = prompt_builder.patient_json
         
         return f"""
 You are Dr. Challenger, the devil's advocate in the VitalSense virtual medical panel.
@@ -480,11 +746,10 @@ class DrStewardship(MAIDxOVirtualSpecialist):
     def __init__(self, gemini_client: GeminiClient):
         super().__init__("Dr. Stewardship", "Rural Healthcare Optimizer", gemini_client)
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
-        all_assessments = ""
-        if previous_debate:
-            latest_round = previous_debate[-1]
-            all_assessments = json.dumps(latest_round.specialist_responses, indent=2)
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
+        all_assessments = prompt_builder.latest_round_assessments(previous_debate)
         
         return f"""
 You are Dr. Stewardship, the rural Indonesian healthcare resource optimization specialist in the VitalSense panel.
@@ -582,13 +847,12 @@ class DrChecklist(MAIDxOVirtualSpecialist):
     def __init__(self, gemini_client: GeminiClient):
         super().__init__("Dr. Checklist", "Quality Control Validator", gemini_client)
     
-    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None) -> str:
-        all_assessments = ""
-        if previous_debate:
-            latest_round = previous_debate[-1]
-            all_assessments = json.dumps(latest_round.specialist_responses, indent=2)
+    def create_prompt(self, patient_data: Dict, previous_debate: List[DebateRound] = None,
+                      prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
+        all_assessments = prompt_builder.latest_round_assessments(previous_debate)
         
-        patient_data_str = json.dumps(patient_data, indent=2)
+        patient_data_str = prompt_builder.patient_json
         
         return f"""
 You are Dr. Checklist, the quality control and validation specialist in the VitalSense panel.
@@ -677,11 +941,43 @@ RESPOND IN VALID JSON FORMAT:
 }}
 """
 
+class StreamedCoreAssessments:
+    """
+    Collects core assessments streamed during a round.
+    
+    Once every specialist queried this round has emitted its core_assessment, the
+    preliminary consensus and disagreements are computed right away, while the
+    specialists are still generating the rest of their analysis.
+    """
+    
+    def __init__(self, moderator: "VitalSenseDebateModerator", expected: List[str],
+                 carried_responses: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.moderator = moderator
+        self.expected = set(expected)
+        self.responses = dict(carried_responses or {})
+        self.consensus_level: Optional[float] = None
+        self.disagreements: List[str] = []
+        self._received = set()
+        self._lock = threading.Lock()
+    
+    def on_core_assessment(self, specialist_name: str, core_assessment: Dict[str, Any]):
+        with self._lock:
+            self.responses[specialist_name] = {'analysis': {'core_assessment': core_assessment}}
+            self._received.add(specialist_name)
+            if self.consensus_level is not None or not self.expected <= self._received:
+                return
+            self.consensus_level = self.moderator._calculate_consensus(self.responses)
+            self.disagreements = self.moderator._identify_disagreements(self.responses)
+        
+        print(f"⚡ Preliminary consensus from streamed core assessments: {self.consensus_level:.2%}")
+        if self.disagreements:
+            print(f"⚡ Preliminary disagreements: {', '.join(self.disagreements)}")
+
 class VitalSenseDebateModerator:
     """Orchestrates structured deliberation between the 5 virtual medical specialists"""
     
-    def __init__(self):
-        self.gemini_client = GeminiClient()
+    def __init__(self, gemini_client: Optional[GeminiClient] = None):
+        self.gemini_client = gemini_client or GeminiClient()
         self.specialists = [
             DrHypothesis(self.gemini_client),
             DrMonitoringStrategist(self.gemini_client),
@@ -689,66 +985,201 @@ class VitalSenseDebateModerator:
             DrStewardship(self.gemini_client),
             DrChecklist(self.gemini_client)
         ]
-        self.max_rounds = 3
-        self.consensus_threshold = 0.8
+        self.max_rounds = settings.mai_dxo_max_rounds
+        self.consensus_threshold = settings.mai_dxo_consensus_threshold
+        self.adaptive_rounds = settings.mai_dxo_adaptive_rounds
+        self.early_exit = settings.mai_dxo_early_exit
+        self.max_workers = max(1, min(settings.mai_dxo_max_workers, len(self.specialists)))
+        
+    def _run_specialist_round(self, patient_data: Dict, debate_history: List[DebateRound],
+                              prompt_builder: PanelPromptBuilder,
+                              specialists: List[MAIDxOVirtualSpecialist],
+                              streamed: StreamedCoreAssessments) -> Dict[str, Dict[str, Any]]:
+        """Run the given specialists for one round concurrently.
+        
+        Specialists in a round only see previous rounds, so they are independent of
+        each other. Responses are collected in panel order so the resulting
+        DebateRound is identical to a sequential run.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mai-dxo") as executor:
+            futures = [
+                executor.submit(specialist.analyze, patient_data, debate_history, prompt_builder, streamed.on_core_assessment)
+                for specialist in specialists
+            ]
+            
+            responses = {}
+            for specialist, future in zip(specialists, futures):
+                responses[specialist.name] = future.result()
+                print(f"✅ {specialist.name} completed analysis")
         
+        return responses
+    
+    def _streamed_cores(self, specialists: List[MAIDxOVirtualSpecialist],
+                        debate_history: List[DebateRound]) -> StreamedCoreAssessments:
+        carried = {}
+        if debate_history:
+            queried = {specialist.name for specialist in specialists}
+            carried = {
+                name: response for name, response in debate_history[-1].specialist_responses.items()
+                if name not in queried
+            }
+        return StreamedCoreAssessments(self, [specialist.name for specialist in specialists], carried)
+    
     def moderate_panel_discussion(self, patient_data: Dict) -> Dict[str, Any]:
         """Moderate the virtual medical panel discussion"""
-        print("\n" + "🎭" * 40)
-        print("🎭 VIRTUAL MEDICAL PANEL DEBATE STARTING")
-        print("🎭" * 40)
-        print(f"👥 Panel Members: {', '.join([specialist.name for specialist in self.specialists])}")
-        print(f"📋 Patient: {patient_data.get('personal_information', {}).get('full_name', 'Unknown')}")
-        print(f"🏥 Chief Complaint: {patient_data.get('symptoms_context', {}).get('chief_complaint', 'None')}")
+        self._announce_panel(patient_data)
         
         debate_history = []
-        max_rounds = 3  # Limit to 3 rounds to prevent infinite loops
-        consensus_threshold = 0.8  # 80% consensus required
+        prompt_builder = PanelPromptBuilder(patient_data)
         
-        for round_num in range(max_rounds):
+        for round_num in range(self.max_rounds):
             print(f"\n🔄 ROUND {round_num + 1} - Starting Specialist Analysis")
             print("-" * 60)
             
-            # Get responses from all specialists
-            responses = {}
-            for specialist in self.specialists:
-                response = specialist.analyze(patient_data, debate_history)
-                responses[specialist.name] = response
-                print(f"✅ {specialist.name} completed analysis")
-            
-            # Calculate consensus level
-            consensus_level = self._calculate_consensus(responses)
-            print(f"\n📊 ROUND {round_num + 1} CONSENSUS LEVEL: {consensus_level:.2%}")
-            
-            # Identify disagreements
-            disagreements = self._identify_disagreements(responses)
-            if disagreements:
-                print(f"⚠️ Key Disagreements: {', '.join(disagreements)}")
-            else:
-                print("✅ No major disagreements identified")
-            
-            # Create debate round
-            debate_round = DebateRound(
-                round_number=round_num + 1,
-                specialist_responses=responses,
-                consensus_level=consensus_level,
-                key_disagreements=disagreements
-            )
-            debate_history.append(debate_round)
+            # Re-query only the specialists still out of line (concurrently, in panel order)
+            specialists = self._select_specialists(debate_history)
+            streamed = self._streamed_cores(specialists, debate_history)
+            responses = self._run_specialist_round(patient_data, debate_history, prompt_builder, specialists, streamed)
+            responses = self._merge_carried_over(responses, debate_history)
             
-            # Check if consensus reached
-            if consensus_level >= consensus_threshold:
-                print(f"\n🎉 CONSENSUS REACHED! Level: {consensus_level:.2%}")
+            if self._record_round(round_num, responses, debate_history, streamed.consensus_level):
                 break
-            elif round_num < max_rounds - 1:
-                print(f"\n🔄 Consensus not reached ({consensus_level:.2%} < {consensus_threshold:.2%}), continuing to next round...")
-            else:
-                print(f"\n⏰ Max rounds reached ({max_rounds}), proceeding with final consensus...")
         
         # Build final consensus
         print(f"\n🏁 BUILDING FINAL CONSENSUS...")
-        final_consensus = self._build_final_consensus(debate_history, patient_data)
+        final_consensus = self._build_final_consensus(debate_history, patient_data, prompt_builder)
+        
+        return self._compile_result(patient_data, debate_history, final_consensus)
+    
+    def _announce_panel(self, patient_data: Dict):
+        print("\n" + "🎭" * 40)
+        print("🎭 VIRTUAL MEDICAL PANEL DEBATE STARTING")
+        print("🎭" * 40)
+        print(f"👥 Panel Members: {', '.join([specialist.name for specialist in self.specialists])}")
+        print(f"📋 Patient: {patient_data.get('personal_information', {}).get('full_name', 'Unknown')}")
+        print(f"🏥 Chief Complaint: {patient_data.get('symptoms_context', {}).get('chief_complaint', 'None')}")
+    
+    def _select_specialists(self, debate_history: List[DebateRound]) -> List[MAIDxOVirtualSpecialist]:
+        """Pick who speaks next round: everyone at first, then only the dissenters"""
+        if not debate_history or not self.adaptive_rounds:
+            return self.specialists
+        
+        requery = self._specialists_to_requery(debate_history[-1].specialist_responses)
+        selected = [specialist for specialist in self.specialists if specialist.name in requery]
+        carried = [specialist.name for specialist in self.specialists if specialist.name not in requery]
+        if carried:
+            print(f"📌 Keeping prior responses from: {', '.join(carried)}")
+        return selected
+    
+    def _specialists_to_requery(self, responses: Dict[str, Any]) -> List[str]:
+        """Specialists whose core assessment differs from the majority, or whose analysis failed"""
+        from collections import Counter
         
+        risk_levels = {}
+        urgency_levels = {}
+        requery = []
+        for specialist_name, response in responses.items():
+            analysis = response.get('analysis', {})
+            if 'error' in analysis or 'raw_response' in analysis:
+                requery.append(specialist_name)
+                continue
+            risk_levels[specialist_name] = self._extract_risk_level(analysis)
+            urgency_levels[specialist_name] = self._extract_urgency(analysis)
+        
+        for levels in (risk_levels, urgency_levels):
+            stated = [level for level in levels.values() if level]
+            if not stated:
+                continue
+            majority_level = Counter(stated).most_common(1)[0][0]
+            for specialist_name, level in levels.items():
+                if level and level != majority_level and specialist_name not in requery:
+                    requery.append(specialist_name)
+        
+        return requery
+    
+    def _merge_carried_over(self, responses: Dict[str, Any], debate_history: List[DebateRound]) -> Dict[str, Any]:
+        """Fill in specialists that were not re-queried with their previous response, in panel order"""
+        if not debate_history:
+            return responses
+        
+        previous_round = debate_history[-1]
+        merged = {}
+        for specialist in self.specialists:
+            if specialist.name in responses:
+                merged[specialist.name] = responses[specialist.name]
+                continue
+            previous = previous_round.specialist_responses.get(specialist.name)
+            if previous is None:
+                continue
+            carried = dict(previous)
+            carried.setdefault('carried_over_from_round', previous_round.round_number)
+            merged[specialist.name] = carried
+        return merged
+    
+    def _risk_level_locked(self, responses: Dict[str, Any]) -> bool:
+        """True when re-querying the dissenters can no longer overturn the majority risk level.
+        
+        Only re-queried specialists can change their answer, so if the majority risk
+        level is held by more carried-over specialists than there are specialists
+        left to re-query, no outcome of the next round can change it.
+        """
+        from collections import Counter
+        
+        requery = set(self._specialists_to_requery(responses))
+        kept_levels = []
+        for specialist_name, response in responses.items():
+            if specialist_name in requery:
+                continue
+            risk = self._extract_risk_level(response.get('analysis', {}))
+            if risk:
+                kept_levels.append(risk)
+        if not kept_levels:
+            return False
+        
+        majority_count = Counter(kept_levels).most_common(1)[0][1]
+        return majority_count > len(requery)
+    
+    def _record_round(self, round_num: int, responses: Dict[str, Any], debate_history: List[DebateRound],
+                      preliminary_consensus_level: Optional[float] = None) -> bool:
+        """Score a finished round, append it to the history and return True when the debate should stop"""
+        # Calculate consensus level
+        consensus_level = self._calculate_consensus(responses)
+        print(f"\n📊 ROUND {round_num + 1} CONSENSUS LEVEL: {consensus_level:.2%}")
+        
+        # Identify disagreements
+        disagreements = self._identify_disagreements(responses)
+        if disagreements:
+            print(f"⚠️ Key Disagreements: {', '.join(disagreements)}")
+        else:
+            print("✅ No major disagreements identified")
+        
+        # Create debate round
+        debate_round = DebateRound(
+            round_number=round_num + 1,
+            specialist_responses=responses,
+            consensus_level=consensus_level,
+            key_disagreements=disagreements,
+            preliminary_consensus_level=preliminary_consensus_level
+        )
+        debate_history.append(debate_round)
+        
+        # Check if consensus reached
+        if consensus_level >= self.consensus_threshold:
+            print(f"\n🎉 CONSENSUS REACHED! Level: {consensus_level:.2%}")
+            return True
+        elif round_num < self.max_rounds - 1 and self.adaptive_rounds and not self._specialists_to_requery(responses):
+            print(f"\n📌 No dissenting specialists left to re-query, proceeding with final consensus...")
+            return True
+        elif round_num < self.max_rounds - 1 and self.adaptive_rounds and self.early_exit and self._risk_level_locked(responses):
+            print(f"\n🔒 Risk level can no longer change ({consensus_level:.2%} consensus), proceeding with final consensus...")
+            return True
+        elif round_num < self.max_rounds - 1:
+            print(f"\n🔄 Consensus not reached ({consensus_level:.2%} < {self.consensus_threshold:.2%}), continuing to next round...")
+        else:
+            print(f"\n⏰ Max rounds reached ({self.max_rounds}), proceeding with final consensus...")
+        return False
+    
+    def _compile_result(self, patient_data: Dict, debate_history: List[DebateRound], final_consensus: Dict[str, Any]) -> Dict[str, Any]:
         # Create complete result
         result = {
             "patient_data": patient_data,
@@ -756,6 +1187,11 @@ class VitalSenseDebateModerator:
             "final_consensus": final_consensus,
             "panel_metadata": {
                 "total_rounds": len(debate_history),
+                "specialist_calls": sum(
+                    1 for round in debate_history
+                    for response in round.specialist_responses.values()
+                    if 'carried_over_from_round' not in response
+                ),
                 "final_consensus_level": debate_history[-1].consensus_level if debate_history else 0,
                 "timestamp": datetime.now().isoformat(),
                 "model_used": "gemini-2.0-flash"
@@ -923,54 +1359,70 @@ class VitalSenseDebateModerator:
         
         return disagreements
     
-    def _build_final_consensus(self, debate_history: List[DebateRound], patient_data: Dict) -> Dict[str, Any]:
+    def _build_final_consensus(self, debate_history: List[DebateRound], patient_data: Dict,
+                               prompt_builder: Optional[PanelPromptBuilder] = None) -> Dict[str, Any]:
         """Build final consensus from debate history"""
         print("🔍 Analyzing debate history for final consensus...")
         
         if not debate_history:
-            print("⚠️ No debate history available, creating basic consensus")
-            return {
-                "analysis_summary": {
-                    "overall_risk_level": "medium",
-                    "primary_concerns": ["Insufficient data for complete assessment"],
-                    "key_recommendations": ["Collect additional clinical data"],
-                    "follow_up_needed": True
-                },
-                "consensus_notes": "No specialist debate available"
-            }
+            return self._empty_consensus()
         
         # Create consensus prompt
-        consensus_prompt = self._create_consensus_prompt(debate_history, patient_data)
+        consensus_prompt = self._create_consensus_prompt(debate_history, patient_data, prompt_builder)
         
         print("🤖 Generating final consensus with Gemini...")
         try:
             response = self.gemini_client.generate_response(consensus_prompt)
-            
-            # Try to parse JSON response - handle markdown code blocks
-            try:
-                # Clean the response - remove markdown code blocks if present
-                cleaned_response = response.strip()
-                if cleaned_response.startswith('```json'):
-                    cleaned_response = cleaned_response[7:]  # Remove ```json
-                if cleaned_response.startswith('```'):
-                    cleaned_response = cleaned_response[3:]  # Remove ```
-                if cleaned_response.endswith('```'):
-                    cleaned_response = cleaned_response[:-3]  # Remove ```
-                
-                cleaned_response = cleaned_response.strip()
-                consensus_data = json.loads(cleaned_response)
-                print("✅ Final consensus generated successfully")
-                return consensus_data
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Consensus JSON parsing failed: {e}")
-                print(f"🔍 Raw consensus response: {response[:300]}...")
-                
-                # Create a structured consensus from the debate history instead
-                return self._create_structured_consensus(debate_history, patient_data, response)
-                
+            consensus = self._parse_consensus(response, consensus_prompt, debate_history, patient_data)
         except Exception as e:
             print(f"❌ Final consensus generation failed: {e}")
-            return self._create_structured_consensus(debate_history, patient_data, f"Error: {str(e)}")
+            consensus = self._create_structured_consensus(debate_history, patient_data, f"Error: {str(e)}")
+        return self._stamp_consensus(consensus)
+    
+    @staticmethod
+    def _stamp_consensus(consensus: Dict[str, Any]) -> Dict[str, Any]:
+        """Record when the consensus was built (not asked of the model, so the prompt stays cacheable)"""
+        summary = consensus.setdefault('analysis_summary', {})
+        if isinstance(summary, dict):
+            summary['analysis_timestamp'] = datetime.now().isoformat()
+        return consensus
+    
+    def _empty_consensus(self) -> Dict[str, Any]:
+        print("⚠️ No debate history available, creating basic consensus")
+        return {
+            "analysis_summary": {
+                "overall_risk_level": "medium",
+                "primary_concerns": ["Insufficient data for complete assessment"],
+                "key_recommendations": ["Collect additional clinical data"],
+                "follow_up_needed": True
+            },
+            "consensus_notes": "No specialist debate available"
+        }
+    
+    def _parse_consensus(self, response: str, prompt: str, debate_history: List[DebateRound],
+                         patient_data: Dict) -> Dict[str, Any]:
+        # Try to parse JSON response - handle markdown code blocks
+        try:
+            # Clean the response - remove markdown code blocks if present
+            cleaned_response = response.strip()
+            if cleaned_response.startswith('```json'):
+                cleaned_response = cleaned_response[7:]  # Remove ```json
+            if cleaned_response.startswith('```'):
+                cleaned_response = cleaned_response[3:]  # Remove ```
+            if cleaned_response.endswith('```'):
+                cleaned_response = cleaned_response[:-3]  # Remove ```
+            
+            cleaned_response = cleaned_response.strip()
+            consensus_data = json.loads(cleaned_response)
+            self.gemini_client.cache_response(prompt, response)
+            print("✅ Final consensus generated successfully")
+            return consensus_data
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Consensus JSON parsing failed: {e}")
+            print(f"🔍 Raw consensus response: {response[:300]}...")
+            
+            # Create a structured consensus from the debate history instead
+            return self._create_structured_consensus(debate_history, patient_data, response)
     
     def _create_structured_consensus(self, debate_history: List[DebateRound], patient_data: Dict, raw_response: str = "") -> Dict[str, Any]:
         """Create a structured consensus from debate history when JSON parsing fails"""
@@ -1082,10 +1534,12 @@ class VitalSenseDebateModerator:
             "raw_consensus_response": raw_response
         }
     
-    def _create_consensus_prompt(self, debate_history: List[DebateRound], patient_data: Dict) -> str:
+    def _create_consensus_prompt(self, debate_history: List[DebateRound], patient_data: Dict,
+                                 prompt_builder: Optional[PanelPromptBuilder] = None) -> str:
         """Create the final consensus prompt"""
-        debate_summary = json.dumps([r.__dict__ for r in debate_history], indent=2)
-        patient_data_str = json.dumps(patient_data, indent=2)
+        prompt_builder = prompt_builder or PanelPromptBuilder(patient_data)
+        debate_summary = prompt_builder.debate_summary(debate_history)
+        patient_data_str = prompt_builder.patient_json
         
         return f"""
 You are the Consensus Builder for the VitalSense virtual medical panel.
@@ -1109,8 +1563,7 @@ OUTPUT FINAL VITALSENSE PRO ANALYSIS in exact JSON format:
   "analysis_summary": {{
     "overall_risk_level": "low|medium|high",
     "confidence_score": 0.0,
-    "primary_concerns": ["consensus primary physiological concerns"],
-    "analysis_timestamp": "{datetime.now().isoformat()}"
+    "primary_concerns": ["consensus primary physiological concerns"]
   }},
   "vital_signs_interpretation": {{
     "spo2_assessment": {{
@@ -1543,14 +1996,18 @@ def process_patient_with_mai_dxo(patient_data: Dict, include_dashboard: bool = T
     Returns:
         Complete analysis with debate history, final consensus, and optional dashboard format
     """
-    # Anonymize a deep copy of the patient data before sending to the AI panel
-    anonymized_data = json.loads(json.dumps(patient_data))
-    anonymized_data = anonymize_patient_data(anonymized_data)
-
     # Run the comprehensive MAI-DxO analysis with the anonymized data
     moderator = VitalSenseDebateModerator()
-    mai_dxo_result = moderator.moderate_panel_discussion(anonymized_data)
+    mai_dxo_result = moderator.moderate_panel_discussion(_anonymized_copy(patient_data))
     
+    return _finalize_mai_dxo_result(mai_dxo_result, patient_data, include_dashboard)
+
+def _anonymized_copy(patient_data: Dict) -> Dict:
+    # Anonymize a deep copy of the patient data before sending to the AI panel
+    anonymized_data = json.loads(json.dumps(patient_data))
+    return anonymize_patient_data(anonymized_data)
+
+def _finalize_mai_dxo_result(mai_dxo_result: Dict[str, Any], patient_data: Dict, include_dashboard: bool) -> Dict[str, Any]:
     # IMPORTANT: Re-attach the original, non-anonymized patient data to the final result object.
     # This ensures that only anonymized data is present in the debate history sent to the LLM,
     # while the complete data is preserved for secure storage within our system.
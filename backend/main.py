@@ -12,6 +12,10 @@ from contextlib import asynccontextmanager
 # Import our configuration and database
 from config import settings
 from database import create_tables, test_connection
+from services.job_queue import analysis_job_queue, plot_job_queue
+from services.llm_cache import get_response_cache
+from services.plot_render_service import plot_render_service
+from services.record_loader import record_cache
 
 # Import our route modules
 from routers import auth, upload, video_processing, specialist_analysis, plot_api
@@ -34,10 +38,20 @@ async def lifespan(app: FastAPI):
     else:
         print("❌ Database connection failed - check your DATABASE_URL")
     
+    # Start background analysis and plot pre-render workers
+    analysis_job_queue.start()
+    plot_job_queue.start()
+    
+    # Spawn warm plot renderer processes
+    plot_render_service.start()
+    
     yield
     
     # Shutdown
     print("🛑 Shutting down VitalSense Pro Backend...")
+    analysis_job_queue.stop(timeout=5)
+    plot_job_queue.stop(timeout=5)
+    plot_render_service.stop(timeout=5)
 
 # Create FastAPI app instance
 app = FastAPI(
@@ -79,13 +93,16 @@ async def health_check():
     """Detailed health check endpoint"""
     # Test database connection
     db_status = "connected" if test_connection() else "disconnected"
+    response_cache = get_response_cache()
     
     return {
         "status": "healthy",
         "service": "vitalsense-pro-backend",
         "database": db_status,
         "environment": settings.environment,
-        "ai_services": "available"
+        "ai_services": "available",
+        "llm_cache": response_cache.stats() if response_cache else None,
+        "record_cache": record_cache.stats()
     }
 
 @app.get("/config")
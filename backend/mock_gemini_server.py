@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+VitalSense Pro - Local Gemini Stand-in Server
+Offline mock of the Gemini generateContent / streamGenerateContent endpoints that returns
+schema-valid MAI-DxO specialist and consensus JSON with configurable latency, error rate
+and response size, for reproducible load and latency testing.
+
+Usage:
+    python mock_gemini_server.py --port 8090 --latency-ms 800 --error-rate 0.02
+    # then point the backend at it
+    GEMINI_API_BASE_URL=http://127.0.0.1:8090/v1beta python main.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic_settings import BaseSettings
+
+RISK_LEVELS = ["low", "medium", "high"]
+URGENCY_BY_RISK = {"low": "routine", "medium": "expedited", "high": "urgent"}
+
+class MockGeminiSettings(BaseSettings):
+    """Mock server behaviour, read from MOCK_GEMINI_* environment variables"""
+
+    host: str = "127.0.0.1"
+    port: int = 8090
+
+    # Latency per request: fixed | uniform | lognormal | exponential
+    latency_distribution: str = "lognormal"
+    latency_ms: float = 800.0  # Median (lognormal), mean (exponential) or center (fixed/uniform)
+    latency_jitter: float = 0.5  # Sigma for lognormal, +/- fraction of latency_ms for uniform
+    first_chunk_fraction: float = 0.2  # Share of the latency spent before the first streamed chunk
+    stream_chunk_chars: int = 200
+
+    # Failures
+    error_rate: float = 0.0  # Probability that a request fails
+    error_status: int = 503  # 429 or 5xx
+
+    # Content
+    response_padding_chars: int = 0  # Extra filler text appended to every response
+    base_risk_level: str = "medium"  # Risk level the panel converges on
+    agreement_rate: float = 0.8  # Probability a specialist reports base_risk_level
+    seed: int = 42
+
+    class Config:
+        env_prefix = "MOCK_GEMINI_"
+        env_file = ".env"
+        env_file_encoding = 'utf-8'
+        extra = "ignore"
+
+class MockGeminiBehaviour:
+    """Deterministic latency, failure and content decisions for each request.
+
+    Every decision is drawn from a generator seeded by (seed, prompt, attempt), so a
+    run is reproducible regardless of request interleaving, while retries of the same
+    prompt still see fresh draws.
+    """
+
+    def __init__(self, config: MockGeminiSettings):
+        self.config = config
+        self._attempts: Counter = Counter()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def rng_for(self, prompt: str) -> random.Random:
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._attempts[prompt_hash]
+            self._attempts[prompt_hash] += 1
+        return random.Random(f"{self.config.seed}:{prompt_hash}:{attempt}")
+
+    def latency_seconds(self, rng: random.Random) -> float:
+        config = self.config
+        base = config.latency_ms / 1000.0
+        distribution = config.latency_distribution.lower()
+        if distribution == "fixed":
+            return base
+        if distribution == "uniform":
+            return max(0.0, rng.uniform(base * (1 - config.latency_jitter), base * (1 + config.latency_jitter)))
+        if distribution == "lognormal":
+            return base * rng.lognormvariate(0.0, config.latency_jitter)
+        if distribution == "exponential":
+            return rng.expovariate(1.0 / base) if base > 0 else 0.0
+        raise ValueError(f"Unknown latency distribution: {config.latency_distribution}")
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return rng.random() < self.config.error_rate
+
+    def risk_level(self, rng: random.Random) -> str:
+        if rng.random() < self.config.agreement_rate:
+            return self.config.base_risk_level
+        return rng.choice([level for level in RISK_LEVELS if level != self.config.base_risk_level])
+
+    def response_text(self, prompt: str, rng: random.Random) -> str:
+        role = _prompt_role(prompt)
+        if role == "consensus":
+            body = _consensus_response(self.config.base_risk_level, rng)
+        else:
+            body = _specialist_response(role, self.risk_level(rng), rng)
+        if self.config.response_padding_chars > 0:
+            body["mock_padding"] = "x" * self.config.response_padding_chars
+        # Real responses usually arrive wrapped in a markdown fence
+        return "```json\n" + json.dumps(body, indent=2) + "\n```"
+
+def _prompt_role(prompt: str) -> str:
+    head = prompt.lstrip()[:200]
+    if "Consensus Builder" in head:
+        return "consensus"
+    for role in ("Dr. Hypothesis", "Dr. Monitoring Strategist", "Dr. Challenger", "Dr. Stewardship", "Dr. Checklist"):
+        if role in head:
+            return role
+    return "Dr. Hypothesis"
+
+def _core_assessment(risk_level: str, rng: random.Random) -> Dict[str, Any]:
+    return {
+        "risk_level": risk_level,
+        "confidence": round(rng.uniform(0.6, 0.95), 2),
+        "primary_concerns": rng.sample(
+            ["mild tachycardia", "borderline SpO2", "elevated respiratory rate", "reduced HRV", "irregular breathing pattern"], 2
+        ),
+        "urgency": URGENCY_BY_RISK[risk_level]
+    }
+
+def _specialist_response(role: str, risk_level: str, rng: random.Random) -> Dict[str, Any]:
+    response = {"core_assessment": _core_assessment(risk_level, rng)}
+
+    if role == "Dr. Hypothesis":
+        response.update({
+            "differential_assessments": [
+                {
+                    "condition": condition,
+                    "probability": round(probability, 2),
+                    "supporting_evidence": ["mock vital sign finding"],
+                    "clinical_significance": "moderate concern",
+                    "confidence_level": round(rng.uniform(0.5, 0.9), 2)
+                }
+                for condition, probability in (
+                    ("sinus tachycardia", rng.uniform(0.5, 0.8)),
+                    ("early respiratory compromise", rng.uniform(0.1, 0.3)),
+                    ("measurement artifact", rng.uniform(0.0, 0.1))
+                )
+            ],
+            "overall_assessment_confidence": round(rng.uniform(0.6, 0.9), 2),
+            "key_physiological_concerns": ["heart rate trend"],
+            "cross_modal_coherence": "vital signs broadly consistent",
+            "clinical_correlation": "symptoms align with objective findings",
+            "uncertainty_factors": ["short recording window"],
+            "disagreements_with_others": []
+        })
+    elif role == "Dr. Monitoring Strategist":
+        response.update({
+            "risk_stratification": {
+                "immediate_risk": risk_level,
+                "short_term_risk": risk_level,
+                "monitoring_urgency": URGENCY_BY_RISK[risk_level]
+            },
+            "selected_monitoring": [{
+                "type": "repeat vital signs",
+                "rationale": "confirms trend",
+                "duration": "24 hours",
+                "feasibility_rural": "high",
+                "discriminatory_value": round(rng.uniform(0.4, 0.8), 2),
+                "cost_level": "low"
+            }],
+            "follow_up_strategy": {
+                "reassessment_timeline": "within 24 hours",
+                "escalation_triggers": ["SpO2 below 92%"],
+                "specialist_referral": {"recommended": risk_level == "high", "urgency": "within_24hrs", "specialty": "internal_medicine"}
+            },
+            "management_recommendations": {
+                "activity_level": "light_restriction",
+                "medication_considerations": [],
+                "return_precautions": ["chest pain", "shortness of breath"]
+            },
+            "monitoring_confidence": round(rng.uniform(0.6, 0.9), 2)
+        })
+    elif role == "Dr. Challenger":
+        response.update({
+            "challenges_raised": [{
+                "challenge_area": "risk level",
+                "specific_concern": "trend may reflect measurement noise",
+                "contradictory_evidence": ["stable SpO2"],
+                "alternative_explanation": "anxiety-related tachycardia"
+            }],
+            "bias_alerts": [{"bias_type": "anchoring", "description": "focus on heart rate", "impact": "minor"}],
+            "alternative_hypotheses": [{
+                "hypothesis": "dehydration",
+                "supporting_evidence": ["elevated heart rate"],
+                "probability_estimate": round(rng.uniform(0.1, 0.3), 2),
+                "clinical_implications": "oral rehydration"
+            }],
+            "measurement_quality_concerns": [],
+            "overlooked_factors": [],
+            "safety_net_questions": [],
+            "recommended_reassessments": [],
+            "challenger_confidence": round(rng.uniform(0.5, 0.9), 2),
+            "key_disagreements": []
+        })
+    elif role == "Dr. Stewardship":
+        response.update({
+            "resource_optimization": {
+                "puskesmas_manageable": ["repeat vital signs"],
+                "requires_referral": [],
+                "cost_optimized_alternatives": []
+            },
+            "implementation_feasibility": {
+                "local_staff_capable": ["vital signs monitoring"],
+                "requires_training": [],
+                "equipment_available": ["pulse oximeter"],
+                "equipment_needed": []
+            },
+            "patient_family_considerations": {
+                "economic_impact": "minimal",
+                "transport_requirements": [],
+                "family_support_needed": [],
+                "cultural_sensitivity": []
+            },
+            "stewardship_decision": {
+                "overall_approval": "approved",
+                "modification_rationale": "",
+                "cost_effectiveness_score": round(rng.uniform(0.6, 0.9), 2),
+                "sustainability_rating": "high"
+            },
+            "final_recommendations": {
+                "immediate_actions": ["recheck vital signs in 4 hours"],
+                "referral_decisions": [],
+                "follow_up_timeline": "24 hours",
+                "resource_requirements": []
+            }
+        })
+    elif role == "Dr. Checklist":
+        response.update({
+            "validation_results": {
+                "clinical_consistency": True,
+                "safety_validation": True,
+                "output_format_compliance": True,
+                "panel_consensus_achieved": True,
+                "technical_quality": True,
+                "cultural_contextual_appropriateness": True
+            },
+            "identified_issues": [],
+            "consensus_assessment": {
+                "agreement_level": round(rng.uniform(0.6, 1.0), 2),
+                "resolved_disagreements": [],
+                "remaining_uncertainties": []
+            },
+            "quality_metrics": {
+                "overall_quality_score": round(rng.uniform(0.7, 0.95), 2),
+                "confidence_in_assessment": round(rng.uniform(0.7, 0.95), 2),
+                "safety_assurance_level": round(rng.uniform(0.7, 0.95), 2),
+                "cultural_appropriateness_score": round(rng.uniform(0.7, 0.95), 2)
+            },
+            "validation_decision": {
+                "approval_status": "approved",
+                "revision_requirements": [],
+                "approval_rationale": "consistent panel assessment"
+            },
+            "vitalsense_pro_readiness": {
+                "json_structure_ready": True,
+                "all_fields_completable": True,
+                "confidence_scores_valid": True,
+                "recommendations_actionable": True
+            }
+        })
+    return response
+
+def _consensus_response(risk_level: str, rng: random.Random) -> Dict[str, Any]:
+    return {
+        "analysis_summary": {
+            "overall_risk_level": risk_level,
+            "confidence_score": round(rng.uniform(0.7, 0.95), 2),
+            "primary_concerns": ["mild tachycardia"],
+            "analysis_timestamp": datetime.now().isoformat()
+        },
+        "vital_signs_interpretation": {
+            "spo2_assessment": {
+                "status": "normal",
+                "clinical_significance": "adequate oxygenation",
+                "normal_range": "95-100%",
+                "patient_value": "97%"
+            },
+            "cardiovascular_assessment": {
+                "heart_rate_status": "tachycardic",
+                "rhythm_assessment": "regular sinus rhythm",
+                "ecg_interpretation": "sinus tachycardia",
+                "clinical_significance": "low cardiovascular risk"
+            },
+            "respiratory_assessment": {
+                "rate_status": "normal",
+                "pattern_assessment": "regular",
+                "clinical_significance": "no respiratory compromise"
+            }
+        },
+        "clinical_findings": [{
+            "category": "cardiovascular",
+            "finding": "elevated resting heart rate",
+            "severity": "mild",
+            "confidence": round(rng.uniform(0.6, 0.9), 2),
+            "supporting_evidence": ["ECG-derived heart rate"]
+        }],
+        "risk_assessment": {
+            "immediate_risk": risk_level,
+            "short_term_risk": risk_level,
+            "risk_factors": ["hypertension"],
+            "protective_factors": ["normal SpO2"],
+            "escalation_triggers": ["SpO2 below 92%"]
+        },
+        "recommendations": {
+            "immediate_actions": ["recheck vital signs in 4 hours"],
+            "specialist_consultation": {
+                "urgency": "within_24_hours",
+                "specialty": "internal_medicine",
+                "specific_focus": ["heart rate trend"]
+            },
+            "monitoring_recommendations": ["daily vital signs for 3 days"],
+            "follow_up_timeline": "1 week"
+        },
+        "patient_communication": {
+            "summary_for_patient": "Your heart rate is slightly high; we will check it again.",
+            "warning_signs": ["chest pain", "shortness of breath"],
+            "reassuring_points": ["oxygen levels are normal"]
+        },
+        "data_quality_assessment": {
+            "overall_quality": "good",
+            "reliability_factors": ["clean ECG signal"],
+            "limitations": ["short recording window"]
+        },
+        "panel_metadata": {
+            "debate_rounds_completed": 1,
+            "consensus_score": round(rng.uniform(0.7, 1.0), 2),
+            "key_disagreements_resolved": [],
+            "remaining_uncertainties": [],
+            "model_used": "mock-gemini",
+            "rural_context_optimization": True
+        }
+    }
+
+def _prompt_from_payload(payload: Dict[str, Any]) -> str:
+    parts: List[Dict[str, Any]] = []
+    for content in payload.get("contents", []):
+        parts.extend(content.get("parts", []))
+    return "".join(part.get("text", "") for part in parts)
+
+def _candidate(text: str, finish_reason: Optional[str] = None) -> Dict[str, Any]:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish_reason:
+        candidate["finishReason"] = finish_reason
+    return {"candidates": [candidate]}
+
+def _error_response(status_code: int) -> JSONResponse:
+    status = "RESOURCE_EXHAUSTED" if status_code == 429 else "UNAVAILABLE"
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"code": status_code, "message": "Injected failure from mock Gemini server", "status": status}}
+    )
+
+def create_app(config: Optional[MockGeminiSettings] = None) -> FastAPI:
+    """Build the mock server app; behaviour is fixed for the app's lifetime"""
+    config = config or MockGeminiSettings()
+    behaviour = MockGeminiBehaviour(config)
+    app = FastAPI(title="Mock Gemini API", description="Offline stand-in for Gemini generateContent")
+    app.state.behaviour = behaviour
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        prompt = _prompt_from_payload(await request.json())
+        rng = behaviour.rng_for(prompt)
+        behaviour.stats["requests"] += 1
+
+        await asyncio.sleep(behaviour.latency_seconds(rng))
+        if behaviour.should_fail(rng):
+            behaviour.stats["errors"] += 1
+            return _error_response(config.error_status)
+
+        text = behaviour.response_text(prompt, rng)
+        result = _candidate(text, "STOP")
+        result["usageMetadata"] = {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4
+        }
+        result["modelVersion"] = model
+        return result
+
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def stream_generate_content(model: str, request: Request):
+        prompt = _prompt_from_payload(await request.json())
+        rng = behaviour.rng_for(prompt)
+        behaviour.stats["requests"] += 1
+        behaviour.stats["stream_requests"] += 1
+
+        latency = behaviour.latency_seconds(rng)
+        first_chunk_delay = latency * config.first_chunk_fraction
+        if behaviour.should_fail(rng):
+            await asyncio.sleep(first_chunk_delay)
+            behaviour.stats["errors"] += 1
+            return _error_response(config.error_status)
+
+        text = behaviour.response_text(prompt, rng)
+        chunk_size = max(1, config.stream_chunk_chars)
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        chunk_delay = (latency - first_chunk_delay) / max(1, len(chunks) - 1)
+
+        async def events():
+            await asyncio.sleep(first_chunk_delay)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(chunk_delay)
+                event = _candidate(chunk, "STOP" if i == len(chunks) - 1 else None)
+                yield f"data: {json.dumps(event)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"config": config.model_dump(), "counters": dict(behaviour.stats)}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "mock-gemini"}
+
+    return app
+
+def main():
+    config = MockGeminiSettings()
+    parser = argparse.ArgumentParser(description="Run the local Gemini stand-in server")
+    parser.add_argument("--host", default=config.host)
+    parser.add_argument("--port", type=int, default=config.port)
+    parser.add_argument("--latency-distribution", default=config.latency_distribution,
+                        choices=["fixed", "uniform", "lognormal", "exponential"])
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--latency-jitter", type=float, default=config.latency_jitter)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--error-status", type=int, default=config.error_status)
+    parser.add_argument("--response-padding-chars", type=int, default=config.response_padding_chars)
+    parser.add_argument("--agreement-rate", type=float, default=config.agreement_rate)
+    parser.add_argument("--seed", type=int, default=config.seed)
+    args = parser.parse_args()
+
+    config = config.model_copy(update=vars(args))
+    print("🧪 Mock Gemini server")
+    print(f"📡 http://{config.host}:{config.port}/v1beta")
+    print(f"⏱️ Latency: {config.latency_distribution} ~{config.latency_ms:.0f} ms (jitter {config.latency_jitter})")
+    print(f"💥 Error rate: {config.error_rate:.1%} (HTTP {config.error_status})")
+
+    uvicorn.run(create_app(config), host=config.host, port=config.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ from database import get_db
 from models.analysis_session import AnalysisSession, AnalysisStatus
 from models.patient import Patient
 from mai_dxo_pipeline import process_patient_with_mai_dxo
+from services.feature_store import load_session_features
 
 def process_patient_analysis(patient_id: str):
     """Process MAI-DxO analysis for a specific patient"""
@@ -54,10 +55,15 @@ def process_patient_analysis(patient_id: str):
         if isinstance(clinical_notes, str):
             clinical_notes = json.loads(clinical_notes)
         
-        # Parse features
-        features = analysis_session.features or {}
-        if isinstance(features, str):
-            features = json.loads(features)
+        # Parse features, preferring the session's feature store when its files are unchanged
+        stored = load_session_features(analysis_session, prime_caches=False)
+        if stored is not None:
+            print(f"⚡ Loaded stored features from {stored.created_at}")
+            features = stored.features
+        else:
+            features = analysis_session.features or {}
+            if isinstance(features, str):
+                features = json.loads(features)
         
         # Build complete patient data for MAI-DxO analysis
         complete_patient_data = {
@@ -3,20 +3,57 @@ Plot API Router
 Serve medical plots for specialist portal
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+import hashlib
+import json
 import os
+from email.utils import formatdate, parsedate_to_datetime
 from typing import Dict, Optional
 
+from config import settings
 from database import get_db
 from models.analysis_session import AnalysisSession
-from services.plot_generation import plot_generator
+from services.feature_store import feature_store, session_files
+from services.job_queue import QueueFullError, plot_job_queue
+from services.plot_generation import PLOT_REQUIREMENTS, PlotRenderError, to_data_uri
+from services.plot_render_service import RenderTimeoutError, plot_render_service
+from services.plot_store import available_plot_types, plot_store
+from services.series_export import (
+    ARROW_MEDIA_TYPE, DECIMATION_METHODS, DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, SERIES_FORMAT_VERSION,
+    SERIES_MEDIA_TYPE, VALUE_DTYPES, decimate_window, encode_arrow, encode_binary
+)
+from services.wfdb_reader import open_record
 from utils.auth import get_current_user
 
 router = APIRouter()
 
+# Plots are patient data: browsers may keep them but must revalidate (cheap 304s) before reuse
+PLOT_CACHE_CONTROL = "private, no-cache"
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison per RFC 9110, as If-None-Match requires"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def _not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Conditional GET: If-None-Match wins over If-Modified-Since when both are sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
 @router.get("/patient-plots/{patient_id}")
 async def get_patient_plots(
     patient_id: str,
@@ -48,72 +85,22 @@ async def get_patient_plots(
             file_path = getattr(analysis_session, f"{file_type}_path", None)
             print(f"  {file_type}: {exists} (path: {file_path})")
         
-        # Generate plots
+        # Serve pre-rendered plots from the session's plot store, rendering only on a miss
         plots = {}
-        
-        # ECG Waveform Plot
-        if files_exist['dat_file'] and files_exist['hea_file']:
-            try:
-                plots['ecg_waveform'] = plot_generator.generate_ecg_waveform_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path
-                )
-                print("✅ ECG waveform plot generated successfully")
-            except Exception as e:
-                print(f"❌ Error generating ECG waveform plot: {str(e)}")
-                plots['ecg_waveform'] = None
-        
-        # Vital Signs Trend Plot
-        if files_exist['dat_normalized_file'] and files_exist['hea_normalized_file']:
-            try:
-                plots['vital_signs_trend'] = plot_generator.generate_vital_signs_trend_plot(
-                    analysis_session.dat_normalized_file_path,
-                    analysis_session.hea_normalized_file_path
-                )
-                print("✅ Vital signs trend plot generated successfully")
-            except Exception as e:
-                print(f"❌ Error generating vital signs trend plot: {str(e)}")
-                plots['vital_signs_trend'] = None
-        
-        # Respiratory Pattern Plot
-        if files_exist['dat_file'] and files_exist['hea_file'] and files_exist['breath_annotation_file']:
+        for plot_type in available_plot_types(analysis_session):
             try:
-                plots['respiratory_pattern'] = plot_generator.generate_respiratory_pattern_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path,
-                    analysis_session.breath_annotation_file_path
-                )
-                print("✅ Respiratory pattern plot generated successfully")
+                png = await run_in_threadpool(plot_store.get_or_render, analysis_session, plot_type)
+                plots[plot_type] = to_data_uri(png)
+                print(f"✅ {plot_type} plot ready")
+            except PlotRenderError as e:
+                # Show the error image for this request only; nothing was stored
+                print(f"❌ Error generating {plot_type} plot: {str(e)}")
+                plots[plot_type] = to_data_uri(e.png)
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e))
             except Exception as e:
-                print(f"❌ Error generating respiratory pattern plot: {str(e)}")
-                plots['respiratory_pattern'] = None
-        
-        # HRV Analysis Plot
-        if files_exist['dat_file'] and files_exist['hea_file']:
-            try:
-                plots['hrv_analysis'] = plot_generator.generate_hrv_analysis_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path
-                )
-                print("✅ HRV analysis plot generated successfully")
-            except Exception as e:
-                print(f"❌ Error generating HRV analysis plot: {str(e)}")
-                plots['hrv_analysis'] = None
-        
-        # Combined Dashboard Plot
-        if (files_exist['dat_file'] and files_exist['hea_file'] and 
-            files_exist['dat_normalized_file'] and files_exist['hea_normalized_file']):
-            try:
-                plots['combined_dashboard'] = plot_generator.generate_combined_dashboard_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path,
-                    analysis_session.dat_normalized_file_path,
-                    analysis_session.hea_normalized_file_path
-                )
-                print("✅ Combined dashboard plot generated successfully")
-            except Exception as e:
-                print(f"❌ Error generating combined dashboard plot: {str(e)}")
-                plots['combined_dashboard'] = None
+                print(f"❌ Error generating {plot_type} plot: {str(e)}")
+                plots[plot_type] = None
         
         # Filter out None values
         plots = {k: v for k, v in plots.items() if v is not None}
@@ -152,52 +139,19 @@ async def get_single_plot(
         if not analysis_session:
             raise HTTPException(status_code=404, detail="No analysis session found for this patient")
         
-        # Generate the requested plot
-        plot_data = None
-        
-        if plot_type == "ecg_waveform":
-            if analysis_session.dat_file_path and analysis_session.hea_file_path:
-                plot_data = plot_generator.generate_ecg_waveform_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path
-                )
-        
-        elif plot_type == "vital_signs_trend":
-            if analysis_session.dat_normalized_file_path and analysis_session.hea_normalized_file_path:
-                plot_data = plot_generator.generate_vital_signs_trend_plot(
-                    analysis_session.dat_normalized_file_path,
-                    analysis_session.hea_normalized_file_path
-                )
-        
-        elif plot_type == "respiratory_pattern":
-            if (analysis_session.dat_file_path and analysis_session.hea_file_path and 
-                analysis_session.breath_annotation_file_path):
-                plot_data = plot_generator.generate_respiratory_pattern_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path,
-                    analysis_session.breath_annotation_file_path
-                )
-        
-        elif plot_type == "hrv_analysis":
-            if analysis_session.dat_file_path and analysis_session.hea_file_path:
-                plot_data = plot_generator.generate_hrv_analysis_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path
-                )
-        
-        elif plot_type == "combined_dashboard":
-            if (analysis_session.dat_file_path and analysis_session.hea_file_path and 
-                analysis_session.dat_normalized_file_path and analysis_session.hea_normalized_file_path):
-                plot_data = plot_generator.generate_combined_dashboard_plot(
-                    analysis_session.dat_file_path,
-                    analysis_session.hea_file_path,
-                    analysis_session.dat_normalized_file_path,
-                    analysis_session.hea_normalized_file_path
-                )
-        
-        else:
+        if plot_type not in PLOT_REQUIREMENTS:
             raise HTTPException(status_code=400, detail=f"Unknown plot type: {plot_type}")
         
+        # Serve the stored plot, rendering it only on a miss
+        plot_data = None
+        if plot_type in available_plot_types(analysis_session):
+            try:
+                png = await run_in_threadpool(plot_store.get_or_render, analysis_session, plot_type)
+            except PlotRenderError as e:
+                print(f"❌ Error generating {plot_type} plot: {str(e)}")
+                png = e.png
+            plot_data = to_data_uri(png)
+        
         if plot_data is None:
             raise HTTPException(status_code=404, detail=f"Could not generate {plot_type} plot - missing required files")
         
@@ -210,10 +164,153 @@ async def get_single_plot(
         
     except HTTPException:
         raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"Error generating {plot_type} plot for patient {patient_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate {plot_type} plot: {str(e)}")
 
+@router.get("/image/{plot_type}/{patient_id}")
+def get_plot_image(
+    plot_type: str,
+    patient_id: str,
+    request: Request,
+    db: Session = Depends(get_db)
+    # TODO: Re-enable authentication: current_user: dict = Depends(get_current_user)
+):
+    """Get a specific plot as a PNG image with a strong ETag for conditional requests.
+    
+    Declared sync so a render on a store miss runs in the threadpool, not the event loop.
+    """
+    
+    if plot_type not in PLOT_REQUIREMENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown plot type: {plot_type}")
+    
+    try:
+        # Get the most recent analysis session for this patient
+        analysis_session = db.query(AnalysisSession).filter(
+            AnalysisSession.patient_id == patient_id
+        ).order_by(AnalysisSession.created_at.desc()).first()
+        
+        if not analysis_session:
+            raise HTTPException(status_code=404, detail="No analysis session found for this patient")
+        
+        if plot_type not in available_plot_types(analysis_session):
+            raise HTTPException(status_code=404, detail=f"Could not generate {plot_type} plot - missing required files")
+        
+        entry = plot_store.entry(analysis_session, plot_type) if settings.plot_store_enabled else None
+        png = None
+        if entry is None:
+            try:
+                png = plot_store.render(analysis_session, plot_type)
+            except PlotRenderError as e:
+                # Failed renders are neither stored nor cacheable, so the next request retries
+                print(f"❌ Error generating {plot_type} image: {str(e)}")
+                return Response(content=e.png, media_type="image/png", headers={"Cache-Control": "no-store"})
+            if settings.plot_store_enabled:
+                entry = plot_store.entry(analysis_session, plot_type)
+        
+        if entry is None:
+            # Plot store disabled: rendered bytes, validated by their own hash
+            etag = f'"{hashlib.blake2b(png, digest_size=16).hexdigest()}"'
+            headers = {"ETag": etag, "Cache-Control": PLOT_CACHE_CONTROL}
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match is not None and _etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+            return Response(content=png, media_type="image/png", headers=headers)
+        
+        # The ETag is the stored PNG's BLAKE2 hash, which the manifest ties to the session's file hashes
+        path = plot_store.file_path(analysis_session, plot_type)
+        last_modified = os.stat(path).st_mtime
+        etag = f'"{entry["hash"]}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(last_modified, usegmt=True),
+            "Cache-Control": PLOT_CACHE_CONTROL
+        }
+        if _not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type="image/png", headers=headers)
+        
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        print(f"Error serving {plot_type} image for patient {patient_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate {plot_type} plot: {str(e)}")
+
+@router.get("/series/{session_id}")
+def get_session_series(
+    session_id: str,
+    request: Request,
+    channels: Optional[str] = None,
+    start_s: float = 0.0,
+    end_s: Optional[float] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    dtype: str = "float32",
+    method: str = "minmax",
+    source: str = "raw",
+    output: str = "binary",
+    db: Session = Depends(get_db)
+    # TODO: Re-enable authentication: current_user: dict = Depends(get_current_user)
+):
+    """Get decimated channel data for client-side plotting as compact binary (or Arrow IPC).
+    
+    channels is a comma-separated list of names or indices (all when omitted); start_s/end_s
+    select the range (negative counts from the end) and max_points the level of detail.
+    """
+    
+    if dtype not in VALUE_DTYPES:
+        raise HTTPException(status_code=400, detail=f"dtype must be one of {', '.join(VALUE_DTYPES)}")
+    if method not in DECIMATION_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(DECIMATION_METHODS)}")
+    if source not in ("raw", "normalized"):
+        raise HTTPException(status_code=400, detail="source must be raw or normalized")
+    if output not in ("binary", "arrow"):
+        raise HTTPException(status_code=400, detail="output must be binary or arrow")
+    if not 2 <= max_points <= MAX_POINTS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_points must be between 2 and {MAX_POINTS_LIMIT}")
+    
+    analysis_session = db.query(AnalysisSession).filter(AnalysisSession.session_id == session_id).first()
+    if not analysis_session:
+        raise HTTPException(status_code=404, detail="Analysis session not found")
+    
+    dat_path = analysis_session.dat_file_path if source == "raw" else analysis_session.dat_normalized_file_path
+    if not dat_path or not os.path.exists(dat_path):
+        raise HTTPException(status_code=404, detail=f"No {source} recording for this session")
+    
+    selected = None
+    if channels:
+        selected = [int(c) if c.strip().isdigit() else c.strip() for c in channels.split(",") if c.strip()]
+    
+    try:
+        # Same files and parameters always encode to the same bytes, so the ETag is strong
+        params = [SERIES_FORMAT_VERSION, source, selected, start_s, end_s, max_points, dtype, method, output]
+        fingerprint = feature_store.fingerprint(session_files(analysis_session))
+        etag = f'"{hashlib.blake2b(json.dumps([fingerprint, params]).encode(), digest_size=16).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": PLOT_CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        window = decimate_window(open_record(dat_path), selected, start_s, end_s, max_points, method)
+        if output == "arrow":
+            return Response(content=encode_arrow(window, dtype), media_type=ARROW_MEDIA_TYPE, headers=headers)
+        return Response(content=encode_binary(window, dtype), media_type=SERIES_MEDIA_TYPE, headers=headers)
+        
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Arrow output needs the optional pyarrow package")
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid channel selection: {str(e)}")
+    except Exception as e:
+        print(f"Error exporting series for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to export series: {str(e)}")
+
 @router.get("/plot-info/{patient_id}")
 async def get_plot_info(
     patient_id: str,
@@ -255,22 +352,12 @@ async def get_plot_info(
             }
         }
         
-        # Determine available plots
-        available_plots = []
-        
-        if files_info['dat_file']['exists'] and files_info['hea_file']['exists']:
-            available_plots.extend(['ecg_waveform', 'hrv_analysis'])
-        
-        if files_info['dat_normalized_file']['exists'] and files_info['hea_normalized_file']['exists']:
-            available_plots.append('vital_signs_trend')
-        
-        if (files_info['dat_file']['exists'] and files_info['hea_file']['exists'] and 
-            files_info['breath_annotation_file']['exists']):
-            available_plots.append('respiratory_pattern')
-        
-        if (files_info['dat_file']['exists'] and files_info['hea_file']['exists'] and 
-            files_info['dat_normalized_file']['exists'] and files_info['hea_normalized_file']['exists']):
-            available_plots.append('combined_dashboard')
+        # Determine available plots and which of them are already pre-rendered
+        available_plots = available_plot_types(analysis_session)
+        stored_plots = [
+            plot_type for plot_type in available_plots
+            if settings.plot_store_enabled and plot_store.entry(analysis_session, plot_type) is not None
+        ]
         
         return JSONResponse(content={
             "success": True,
@@ -278,6 +365,8 @@ async def get_plot_info(
             "session_id": analysis_session.session_id,
             "files_info": files_info,
             "available_plots": available_plots,
+            "stored_plots": stored_plots,
+            "image_urls": {plot_type: f"/api/plots/image/{plot_type}/{patient_id}" for plot_type in available_plots},
             "total_plots_available": len(available_plots)
         })
         
@@ -285,4 +374,9 @@ async def get_plot_info(
         raise
     except Exception as e:
         print(f"Error getting plot info for patient {patient_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to get plot info: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get plot info: {str(e)}") 
+
+@router.get("/render-stats")
+async def get_render_stats():
+    """Get worker, queue and outcome statistics for the plot render service and pre-render queue"""
+    return JSONResponse(content={**plot_render_service.stats(), "precompute_queue": plot_job_queue.stats()})
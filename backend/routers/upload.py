@@ -7,17 +7,27 @@ import shutil
 import uuid
 from datetime import datetime
 from typing import Optional, List
-import wfdb
 import numpy as np
 from scipy import signal
 import json
 import tempfile
+import time
 
-from database import get_db
+from config import settings
+from database import get_db, SessionLocal
 from models.patient import Patient
 from models.analysis_session import AnalysisSession, AnalysisStatus
 from utils.auth import get_current_user
 from mai_dxo_pipeline import process_patient_with_mai_dxo
+from services.job_queue import analysis_job_queue, plot_job_queue, QueueFullError, time_stage
+from services.record_loader import load_record
+from services.wfdb_reader import read_window
+from services.signal_stats import column_stats
+from services.qrs_detection import record_r_peaks
+from services.hrv_engine import record_hrv
+from services.respiratory_analysis import MIN_BREATHS, record_breaths
+from services.feature_store import load_session_features, save_session_features
+from services.plot_store import plot_store
 
 router = APIRouter()
 
@@ -33,9 +43,8 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 def extract_normalized_vital_signs(dat_normalized_path: str, hea_normalized_path: str) -> dict:
     """Extract vital signs from normalized WFDB files"""
     try:
-        # Load normalized WFDB record
-        record_name = dat_normalized_path.replace('.dat', '')
-        record = wfdb.rdrecord(record_name)
+        # Load normalized WFDB record (cached for the plot endpoints)
+        record = load_record(dat_normalized_path)
         
         # Get signals and names
         signals = record.p_signal
@@ -51,19 +60,14 @@ def extract_normalized_vital_signs(dat_normalized_path: str, hea_normalized_path
             'duration_seconds': len(signals) / record.fs if len(signals) > 0 else 0
         }
         
+        # Column-wise statistics over all signals, excluding NaN and the common invalid value
+        stats = column_stats(signals, signal_names, invalid_value=-32768)
+        
         # Extract vital signs from each signal
         for i, signal_name in enumerate(signal_names):
             if i < signals.shape[1]:
-                signal_data = signals[:, i]
-                
-                # Remove invalid values
-                signal_data = signal_data[~np.isnan(signal_data)]
-                signal_data = signal_data[signal_data != -32768]  # Common invalid value
-                
-                if len(signal_data) > 0:
-                    # Calculate statistics
-                    mean_val = float(np.mean(signal_data))
-                    std_val = float(np.std(signal_data))
+                if stats.has_data(i):
+                    mean_val = float(stats.mean[i])
                     
                     # Map signal types to vital signs
                     if 'HR' in signal_name.upper():
@@ -124,24 +128,14 @@ def extract_vital_signs_features(dat_file_path: str, hea_file_path: str) -> dict
         if not os.path.exists(hea_file_path):
             raise FileNotFoundError(f"HEA file not found: {hea_file_path}")
         
-        # Load WFDB record (path without extension)
-        record_name = dat_file_path.replace('.dat', '')
-        record = wfdb.rdrecord(record_name)
-        
-        # Get sampling frequency
-        fs = record.fs
-        
-        # Extract signals
-        signals = record.p_signal
-        signal_names = record.sig_name
-        
         # Analysis window: final 2 minutes (physiological stabilization)
         analysis_duration = 120  # seconds
-        analysis_samples = analysis_duration * fs
         
-        # Take final 2 minutes of data
-        if signals.shape[0] > analysis_samples:
-            signals = signals[-analysis_samples:]
+        # Decode only the final 2 minutes of the WFDB record
+        window = read_window(dat_file_path, start_s=-analysis_duration)
+        fs = window.fs
+        signals = window.signals
+        signal_names = list(window.sig_name)
         
         # Create time vector
         time_vector = np.linspace(0, analysis_duration, signals.shape[0])
@@ -154,23 +148,20 @@ def extract_vital_signs_features(dat_file_path: str, hea_file_path: str) -> dict
             'analysis_duration': analysis_duration
         }
         
+        # Basic statistics for every channel at once (NaN-aware, no per-channel copies)
+        stats = column_stats(signals, signal_names, median=True)
+        
         # Process each signal type
         for i, signal_name in enumerate(signal_names):
             if i < signals.shape[1]:
                 signal_data = signals[:, i]
                 
-                # Remove NaN values
-                signal_data = signal_data[~np.isnan(signal_data)]
+                # Remove NaN values (only copies channels that have gaps)
+                if stats.count[i] < len(signal_data):
+                    signal_data = signal_data[~np.isnan(signal_data)]
                 
-                if len(signal_data) > 0:
-                    # Basic statistics
-                    signal_stats = {
-                        'mean': float(np.mean(signal_data)),
-                        'std': float(np.std(signal_data)),
-                        'min': float(np.min(signal_data)),
-                        'max': float(np.max(signal_data)),
-                        'median': float(np.median(signal_data))
-                    }
+                if stats.has_data(i):
+                    signal_stats = stats.as_dict(i)
                     
                     # Process specific signal types
                     if 'PLETH' in signal_name.upper() or 'SPO2' in signal_name.upper():
@@ -193,36 +184,13 @@ def extract_vital_signs_features(dat_file_path: str, hea_file_path: str) -> dict
                     
                     elif 'ECG' in signal_name.upper() or 'II' in signal_name.upper():
                         # Heart Rate Processing with R-peak detection for HRV
-                        from scipy.signal import find_peaks
-                        
-                        # Normalize ECG signal for peak detection
-                        ecg_normalized = (signal_data - np.mean(signal_data)) / (np.std(signal_data) + 1e-8)
-                        
-                        # Find R-peaks (adjust parameters based on sampling rate)
-                        min_distance = int(0.6 * fs)  # Minimum 600ms between peaks
-                        height_threshold = 1.5  # Above 1.5 standard deviations
+                        # (Pan-Tompkins over the whole record, cached and shared with the HRV plot)
+                        beats = record_r_peaks(dat_file_path, i)
+                        peaks = beats.between(window.start_sample, window.end_sample)
                         
-                        peaks, _ = find_peaks(ecg_normalized, 
-                                            height=height_threshold, 
-                                            distance=min_distance)
-                        
-                        # Calculate HRV metrics if we have enough peaks
-                        hrv_metrics = {'SDNN': 0.0, 'RMSSD': 0.0, 'pNN50': 0.0}
-                        
-                        if len(peaks) >= 10:  # Need at least 10 peaks for reliable HRV
-                            # Calculate RR intervals in milliseconds
-                            rr_intervals = np.diff(peaks) / fs * 1000
-                            
-                            # SDNN: Standard deviation of NN intervals
-                            hrv_metrics['SDNN'] = float(np.std(rr_intervals))
-                            
-                            # RMSSD: Root mean square of successive differences
-                            rr_diffs = np.diff(rr_intervals)
-                            hrv_metrics['RMSSD'] = float(np.sqrt(np.mean(rr_diffs**2)))
-                            
-                            # pNN50: Percentage of successive NN intervals > 50ms
-                            nn50_count = np.sum(np.abs(rr_diffs) > 50)
-                            hrv_metrics['pNN50'] = float(nn50_count / len(rr_diffs) * 100)
+                        # Time, frequency and Poincaré HRV metrics for the analysis window
+                        hrv = record_hrv(dat_file_path, i, window.start_s, window.end_s)
+                        hrv_metrics = hrv.as_dict() if hrv else {'SDNN': 0.0, 'RMSSD': 0.0, 'pNN50': 0.0}
                         
                         features['heart_rate'] = {
                             **signal_stats,
@@ -233,28 +201,41 @@ def extract_vital_signs_features(dat_file_path: str, hea_file_path: str) -> dict
                         }
                     
                     elif 'RESP' in signal_name.upper():
-                        # Respiratory Rate Processing
+                        # Respiratory Rate Processing from breaths detected on the impedance
+                        # waveform (cached and shared with the respiratory pattern plot)
+                        breaths = record_breaths(dat_file_path, i, window.start_s, window.end_s)
+                        if breaths.breath_count < MIN_BREATHS:
+                            continue
+                        rate_stats = breaths.rate_stats()
+                        rates = breaths.breath_rates_bpm
+                        breath_summary = breaths.summary()
+                        
                         features['respiratory_rate'] = {
-                            **signal_stats,
-                            'normal_range': 12 <= signal_stats['mean'] <= 20,
-                            'episodes_high': int(np.sum(signal_data > 20)),
-                            'episodes_low': int(np.sum(signal_data < 12)),
-                            'trend': 'stable' if signal_stats['std'] < 3 else 'variable'
+                            **rate_stats,
+                            'breaths_detected': breaths.breath_count,
+                            'normal_range': 12 <= rate_stats['mean'] <= 20,
+                            'episodes_high': int(np.sum(rates > 20)),
+                            'episodes_low': int(np.sum(rates < 12)),
+                            'trend': 'stable' if rate_stats['std'] < 3 else 'variable'
                         }
                         
                         # Breathing pattern analysis
                         features['breathing_pattern'] = {
-                            'cycle_duration': float(60 / signal_stats['mean']),  # seconds per breath
-                            'amplitude_variability': signal_stats['std'],
-                            'pattern_classification': 'normal' if signal_stats['std'] < 3 else 'irregular'
+                            'cycle_duration': breath_summary['cycle_duration'],  # seconds per breath
+                            'cycle_duration_cv': breath_summary['cycle_duration_cv'],
+                            'amplitude_variability': breath_summary['amplitude_variability'],
+                            'pauses': breath_summary['pauses'],
+                            'pattern_classification': 'normal' if breath_summary['pattern_classification'] == 'regular' else 'irregular'
                         }
                         
                         # Respiratory waveform analysis
                         features['respiratory_waveform'] = {
-                            'shape_analysis': 'sinusoidal',
-                            'skewness': float(signal_data.std() / signal_data.mean() if signal_data.mean() != 0 else 0),
-                            'ie_ratio': 1.5,  # Typical inspiratory:expiratory ratio
-                            'rhythm_classification': 'regular' if signal_stats['std'] < 3 else 'irregular'
+                            'shape_analysis': 'sinusoidal' if abs(breath_summary['skewness']) < 0.5 else 'asymmetric',
+                            'skewness': breath_summary['skewness'],
+                            'ie_ratio': breath_summary['ie_ratio'],
+                            'inspiration_duration': breath_summary['inspiration_duration'],
+                            'expiration_duration': breath_summary['expiration_duration'],
+                            'rhythm_classification': breath_summary['pattern_classification']
                         }
         
         return features
@@ -349,6 +330,306 @@ def create_mai_dxo_patient_data(patient_data: dict, features: dict, clinical_not
     
     return mai_dxo_data
 
+def build_complete_patient_data(patient: Patient, features: dict, clinical_notes: dict,
+                                video_vital_signs: Optional[dict] = None) -> dict:
+    """Assemble the patient data structure consumed by the MAI-DxO virtual medical panel"""
+    
+    # Create patient data for MAI-DxO
+    patient_data = {
+        'patient_id': patient.patient_id,
+        'full_name': patient.full_name,
+        'age': patient.age,
+        'gender': patient.gender.value if patient.gender else 'unknown',
+        'weight_kg': patient.weight_kg or 70,
+        'height_cm': patient.height_cm or 170,
+        'conditions': patient.known_conditions.split(', ') if patient.known_conditions else [],
+        'medications': patient.current_medications.split(', ') if patient.current_medications else [],
+        'allergies': patient.allergies.split(', ') if patient.allergies else [],
+        'surgical_history': patient.previous_surgeries.split(', ') if patient.previous_surgeries else []
+    }
+    
+    # Create complete patient data for MAI-DxO virtual medical panel
+    return {
+        "personal_information": {
+            "full_name": patient_data['full_name'],
+            "age": patient_data['age'],
+            "gender": patient_data['gender'],
+            "phone_number": patient.phone if hasattr(patient, 'phone') else "N/A",
+            "weight_kg": patient_data['weight_kg'],
+            "height_cm": patient_data['height_cm']
+        },
+        "medical_history": {
+            "known_conditions": patient_data['conditions'],
+            "current_medications": patient_data['medications'],
+            "allergies": patient_data['allergies'],
+            "previous_surgeries": patient_data['surgical_history']
+        },
+        "vital_signs_data": {
+            "ecg_analysis": {
+                "heart_rate_bpm": features.get('heart_rate', {}).get('mean', 0),
+                "rhythm_analysis": "sinus rhythm" if not features.get('heart_rate', {}).get('arrhythmia_risk', 'low') == 'moderate' else "irregular rhythm",
+                "hrv_metrics": features.get('heart_rate', {}).get('hrv_metrics', {}),
+                "confidence_score": 0.85
+            },
+            "video_vitals_analysis": {
+                "respiratory_rate_bpm": video_vital_signs.get('respiratory_analysis', {}).get('respiratory_rate_bpm', features.get('respiratory_rate', {}).get('mean', 0)) if video_vital_signs else features.get('respiratory_rate', {}).get('mean', 0),
+                "respiratory_confidence": video_vital_signs.get('respiratory_analysis', {}).get('confidence', 0) if video_vital_signs else 0,
+                "breathing_pattern": "normal" if video_vital_signs and video_vital_signs.get('respiratory_analysis', {}).get('status') == 'normal' else features.get('breathing_pattern', {}).get('pattern_classification', 'normal'),
+                "vitallens_data_available": video_vital_signs is not None and video_vital_signs.get('processing_metadata', {}).get('processing_successful', False),
+                "data_source": video_vital_signs.get('processing_metadata', {}).get('api_source', 'ECG') if video_vital_signs else 'ECG'
+            },
+            "vitallens_respiratory_data": {
+                "respiratory_analysis": video_vital_signs.get('respiratory_analysis', {}) if video_vital_signs else {},
+                "respiratory_waveform": video_vital_signs.get('respiratory_waveform', {}) if video_vital_signs else {},
+                "face_detection": video_vital_signs.get('face_detection', {}) if video_vital_signs else {},
+                "processing_metadata": video_vital_signs.get('processing_metadata', {}) if video_vital_signs else {}
+            }
+        },
+        "symptoms_context": {
+            "chief_complaint": clinical_notes.get('chief_complaint', ''),
+            "duration_symptoms": clinical_notes.get('symptom_duration', ''),
+            "additional_symptoms": clinical_notes.get('symptoms', []),
+            "pain_scale": clinical_notes.get('pain_scale', 0),
+            "staff_observations": clinical_notes.get('staff_notes', '')
+        },
+        "recording_metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "location": "Puskesmas",
+            "staff_id": "health_worker_001",
+            "equipment_calibrated": True
+        }
+    }
+
+def process_vital_signs_session(session_id: str):
+    """
+    Background job: extract features and run the MAI-DxO panel for an uploaded session.
+    Moves the session from PROCESSING to AI_COMPLETE (or ERROR).
+    """
+    db = SessionLocal()
+    
+    try:
+        analysis_session = db.query(AnalysisSession).filter(AnalysisSession.session_id == session_id).first()
+        if not analysis_session:
+            raise ValueError(f"Analysis session {session_id} not found")
+        
+        patient = db.query(Patient).filter(Patient.patient_id == analysis_session.patient_id).first()
+        if not patient:
+            raise ValueError(f"Patient {analysis_session.patient_id} not found")
+        
+        analysis_session.ai_analysis_started_at = datetime.now()
+        db.commit()
+        
+        clinical_notes = analysis_session.clinical_notes or {}
+        session_dir = os.path.dirname(analysis_session.dat_file_path)
+        
+        # Reuse features stored for these exact files (also seeds the beat/breath caches)
+        stored = load_session_features(analysis_session)
+        if stored is not None:
+            print(f"⚡ Using stored features from {stored.created_at}")
+            features = stored.features
+        else:
+            # Extract features from raw ECG data
+            with time_stage("extract_vital_signs_features"):
+                features = extract_vital_signs_features(analysis_session.dat_file_path, analysis_session.hea_file_path)
+        
+            # Extract normalized vital signs
+            with time_stage("extract_normalized_vital_signs"):
+                normalized_vitals = extract_normalized_vital_signs(
+                    analysis_session.dat_normalized_file_path,
+                    analysis_session.hea_normalized_file_path
+                )
+        
+            # Extract breathing annotations
+            with time_stage("extract_breathing_annotations"):
+                breathing_annotations = extract_breathing_annotations(analysis_session.breath_annotation_file_path)
+        
+            # Combine all features
+            features['normalized_vitals'] = normalized_vitals
+            features['breathing_annotations'] = breathing_annotations
+        
+            # Use normalized vital signs as primary values if available
+            if normalized_vitals['heart_rate_bpm'] is not None:
+                features['heart_rate_bpm'] = normalized_vitals['heart_rate_bpm']
+            if normalized_vitals['pulse_rate_bpm'] is not None:
+                features['pulse_rate_bpm'] = normalized_vitals['pulse_rate_bpm']
+            if normalized_vitals['respiratory_rate_bpm'] is not None:
+                features['respiratory_rate_bpm'] = normalized_vitals['respiratory_rate_bpm']
+            if normalized_vitals['spo2_percent'] is not None:
+                features['spo2_percent'] = normalized_vitals['spo2_percent']
+            
+            # Persist features with beat/breath indices for plots and later re-analysis
+            try:
+                with time_stage("save_session_features"):
+                    save_session_features(analysis_session, features)
+            except Exception as e:
+                print(f"⚠️ Could not store session features: {str(e)}")
+        
+        # Pre-render specialist plots on the plot queue while the MAI-DxO panel runs
+        if settings.plot_precompute:
+            try:
+                plot_job_queue.submit(session_id, render_session_plots, session_id)
+            except QueueFullError:
+                print("⚠️ Plot queue full; plots will be rendered on first view")
+        
+        # Process video if provided
+        video_vital_signs = None
+        if analysis_session.video_file_path:
+            print("🎥 Processing video file for additional vital signs...")
+            try:
+                # Import video processing function
+                from .video_processing import extract_video_vital_signs
+                
+                with time_stage("video_processing"):
+                    video_vital_signs = extract_video_vital_signs(analysis_session.video_file_path)
+                print("✅ Video processing complete")
+                
+            except Exception as e:
+                print(f"⚠️ Video processing failed: {str(e)}")
+                video_vital_signs = None
+        
+        complete_patient_data = build_complete_patient_data(patient, features, clinical_notes, video_vital_signs)
+        
+        print("🏥 Running MAI-DxO Virtual Medical Panel Analysis...")
+        print("="*80)
+        print("📋 PATIENT DATA FOR AI ANALYSIS:")
+        print(f"   Name: {complete_patient_data['personal_information']['full_name']}")
+        print(f"   Age: {complete_patient_data['personal_information']['age']}")
+        print(f"   Gender: {complete_patient_data['personal_information']['gender']}")
+        print(f"   Chief Complaint: {complete_patient_data['symptoms_context']['chief_complaint']}")
+        print(f"   Symptoms: {complete_patient_data['symptoms_context']['additional_symptoms']}")
+        print(f"   Pain Scale: {complete_patient_data['symptoms_context']['pain_scale']}")
+        print(f"   Temperature: {clinical_notes.get('temperature', '')}°C")
+        print(f"   Heart Rate: {complete_patient_data['vital_signs_data']['ecg_analysis']['heart_rate_bpm']} bpm")
+        print(f"   Respiratory Rate: {complete_patient_data['vital_signs_data']['video_vitals_analysis']['respiratory_rate_bpm']} bpm")
+        print(f"   Video Analysis Available: {complete_patient_data['vital_signs_data']['video_vitals_analysis']['vitallens_data_available']}")
+        print("="*80)
+        
+        # Process through MAI-DxO virtual medical panel
+        with time_stage("mai_dxo_panel"):
+            mai_dxo_result = process_patient_with_mai_dxo(complete_patient_data)
+        
+        print("\n" + "="*80)
+        print("🎯 MAI-DxO ANALYSIS COMPLETE - EXTRACTING RESULTS")
+        print("="*80)
+        
+        # Extract final consensus for database storage
+        final_consensus = mai_dxo_result.get('final_consensus', {})
+        
+        # Determine AI risk level from consensus
+        consensus_risk = final_consensus.get('analysis_summary', {}).get('overall_risk_level', 'medium')
+        if consensus_risk == 'high':
+            ai_risk_level = "HIGH"
+        elif consensus_risk == 'medium':
+            ai_risk_level = "MEDIUM"
+        else:
+            ai_risk_level = "LOW"
+        
+        print(f"✅ MAI-DxO Analysis Complete - Risk Level: {ai_risk_level}")
+        print(f"📊 Final Consensus Risk: {consensus_risk}")
+        print(f"🔍 Primary Concerns: {final_consensus.get('analysis_summary', {}).get('primary_concerns', [])}")
+        print(f"💡 Key Recommendations: {final_consensus.get('analysis_summary', {}).get('key_recommendations', [])}")
+        print(f"🔄 Debate Rounds: {len(mai_dxo_result.get('debate_history', []))}")
+        print("="*80)
+        
+        # Store complete MAI-DxO result as the mai_dxo_data
+        mai_dxo_data = mai_dxo_result
+        
+        # Map AI risk to health screening status
+        if ai_risk_level == "HIGH":
+            overall_status = "urgent"
+        elif ai_risk_level == "MEDIUM":
+            overall_status = "attention_needed"
+        else:
+            overall_status = "healthy"
+        
+        # Update the analysis session with the results
+        analysis_session.status = AnalysisStatus.AI_COMPLETE
+        analysis_session.features = features
+        analysis_session.mai_dxo_data = mai_dxo_data
+        analysis_session.ai_risk_level = ai_risk_level
+        # Store extracted vital signs directly
+        analysis_session.heart_rate_bpm = features.get('heart_rate_bpm')
+        analysis_session.respiratory_rate_bpm = features.get('respiratory_rate_bpm')
+        analysis_session.pulse_rate_bpm = features.get('pulse_rate_bpm')
+        analysis_session.spo2_percent = features.get('spo2_percent')
+        analysis_session.hrv_sdnn = features.get('heart_rate', {}).get('hrv_metrics', {}).get('SDNN') or features.get('hrv_sdnn')
+        analysis_session.hrv_rmssd = features.get('heart_rate', {}).get('hrv_metrics', {}).get('RMSSD') or features.get('hrv_rmssd')
+        analysis_session.ai_analysis_completed_at = datetime.now()
+        analysis_session.updated_at = datetime.now()
+        
+        with time_stage("db_commit"):
+            db.commit()
+        
+        # Create health screening record for specialist portal
+        # This is needed because the specialist portal looks for data in health_screenings table
+        try:
+            # Get patient's internal ID
+            patient_internal_id = patient.id
+            symptoms_parsed = clinical_notes.get('symptoms', [])
+            
+            # Create health screening record using raw SQL
+            health_screening_query = text("""
+                INSERT INTO health_screenings (
+                    patient_id, health_center_id, health_worker_id, screening_date, 
+                    status, overall_status, overall_notes
+                ) VALUES (
+                    :patient_id, :health_center_id, :health_worker_id, :screening_date,
+                    :status, :overall_status, :overall_notes
+                )
+            """)
+            
+            with time_stage("health_screening_insert"):
+                db.execute(health_screening_query, {
+                    'patient_id': patient_internal_id,
+                    'health_center_id': patient.registered_at_health_center_id or 1,
+                    'health_worker_id': 3,  # TODO: Use current_user.id when auth is re-enabled
+                    'screening_date': datetime.now(),
+                    'status': 'completed',
+                    'overall_status': overall_status,
+                    'overall_notes': f"{clinical_notes.get('chief_complaint', '')}. Symptoms: {', '.join(symptoms_parsed) if symptoms_parsed else 'None'}. AI Risk: {ai_risk_level}. Primary Concerns: {', '.join(final_consensus.get('analysis_summary', {}).get('primary_concerns', []))}"
+                })
+            
+                db.commit()
+            
+        except Exception as e:
+            print(f"Warning: Failed to create health screening record: {str(e)}")
+            db.rollback()
+            # Don't fail the whole job if this fails
+        
+        # Save MAI-DxO data to file for processing
+        mai_dxo_path = os.path.join(session_dir, f"{session_id}_mai_dxo.json")
+        with time_stage("result_file_write"), open(mai_dxo_path, "w") as f:
+            json.dump(mai_dxo_data, f, indent=2)
+        
+    except Exception:
+        db.rollback()
+        failed_session = db.query(AnalysisSession).filter(AnalysisSession.session_id == session_id).first()
+        if failed_session:
+            failed_session.status = AnalysisStatus.ERROR
+            failed_session.updated_at = datetime.now()
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+def render_session_plots(session_id: str):
+    """
+    Background job: render every available specialist plot for a session into its plot store,
+    reusing the beat/breath indices saved in the feature store.
+    """
+    db = SessionLocal()
+    
+    try:
+        analysis_session = db.query(AnalysisSession).filter(AnalysisSession.session_id == session_id).first()
+        if not analysis_session:
+            raise ValueError(f"Analysis session {session_id} not found")
+        
+        with time_stage("render_plots"):
+            rendered = plot_store.render_all(analysis_session)
+        print(f"🖼️ Pre-rendered {len(rendered)} plots for session {session_id}")
+    finally:
+        db.close()
+
 @router.post("/upload-vital-signs")
 async def upload_vital_signs(
     patient_id: str = Form(...),
@@ -367,7 +648,7 @@ async def upload_vital_signs(
     db: Session = Depends(get_db)
     # TODO: Re-enable authentication: current_user: dict = Depends(get_current_user)
 ):
-    """Upload vital signs files and process them"""
+    """Upload vital signs files and queue them for background analysis"""
     
     try:
         # Validate file extensions
@@ -382,6 +663,10 @@ async def upload_vital_signs(
         if not breath_annotation_file.filename.endswith('.breath'):
             raise HTTPException(status_code=400, detail="Breath annotation file must have .breath extension")
         
+        # Refuse early instead of accepting work we cannot queue
+        if analysis_job_queue.is_full():
+            raise HTTPException(status_code=503, detail="Analysis queue is full, please retry shortly")
+        
         # Check file sizes
         dat_content = await dat_file.read()
         hea_content = await hea_file.read()
@@ -426,6 +711,8 @@ async def upload_vital_signs(
         hea_normalized_path = os.path.join(session_dir, hea_normalized_file.filename)
         breath_annotation_path = os.path.join(session_dir, breath_annotation_file.filename)
         
+        upload_timings = {}
+        write_started = time.perf_counter()
         with open(dat_path, "wb") as f:
             f.write(dat_content)
         with open(hea_path, "wb") as f:
@@ -436,6 +723,7 @@ async def upload_vital_signs(
             f.write(hea_normalized_content)
         with open(breath_annotation_path, "wb") as f:
             f.write(breath_annotation_content)
+        upload_timings['file_write'] = time.perf_counter() - write_started
             
         print(f"DEBUG: Files saved to:")
         print(f"  DAT path: {dat_path}")
@@ -456,69 +744,13 @@ async def upload_vital_signs(
         if not os.path.exists(breath_annotation_path):
             raise HTTPException(status_code=500, detail=f"Failed to save breath annotation file: {breath_annotation_path}")
         
-        # Extract vital signs features
-        print(f"DEBUG: Attempting to read files:")
-        print(f"  DAT file: {dat_path}")
-        print(f"  HEA file: {hea_path}")
-        print(f"  DAT exists: {os.path.exists(dat_path)}")
-        print(f"  HEA exists: {os.path.exists(hea_path)}")
-        
-        # If files don't exist with expected names, find them by extension
-        if not os.path.exists(dat_path) or not os.path.exists(hea_path):
-            print("DEBUG: Files not found with expected names, searching by extension...")
-            for filename in os.listdir(session_dir):
-                file_path = os.path.join(session_dir, filename)
-                if filename.endswith('.dat'):
-                    dat_path = file_path
-                    print(f"  Found DAT file: {dat_path}")
-                elif filename.endswith('.hea'):
-                    hea_path = file_path
-                    print(f"  Found HEA file: {hea_path}")
-        
-        # Extract features from raw ECG data
-        features = extract_vital_signs_features(dat_path, hea_path)
-        
-        # Extract normalized vital signs
-        normalized_vitals = extract_normalized_vital_signs(dat_normalized_path, hea_normalized_path)
-        
-        # Extract breathing annotations
-        breathing_annotations = extract_breathing_annotations(breath_annotation_path)
-        
-        # Combine all features
-        features['normalized_vitals'] = normalized_vitals
-        features['breathing_annotations'] = breathing_annotations
-        
-        # Use normalized vital signs as primary values if available
-        if normalized_vitals['heart_rate_bpm'] is not None:
-            features['heart_rate_bpm'] = normalized_vitals['heart_rate_bpm']
-        if normalized_vitals['pulse_rate_bpm'] is not None:
-            features['pulse_rate_bpm'] = normalized_vitals['pulse_rate_bpm']
-        if normalized_vitals['respiratory_rate_bpm'] is not None:
-            features['respiratory_rate_bpm'] = normalized_vitals['respiratory_rate_bpm']
-        if normalized_vitals['spo2_percent'] is not None:
-            features['spo2_percent'] = normalized_vitals['spo2_percent']
-        
-        # Process video if provided
-        video_vital_signs = None
+        # Save video if provided (processed by the background job)
+        video_path = None
         if video_file and video_file.filename:
-            print("🎥 Processing video file for additional vital signs...")
-            try:
-                # Import video processing function
-                from .video_processing import extract_video_vital_signs
-                
-                # Save video file
-                video_content = await video_file.read()
-                video_path = os.path.join(session_dir, f"video_{video_file.filename}")
-                with open(video_path, "wb") as f:
-                    f.write(video_content)
-                
-                # Process video
-                video_vital_signs = extract_video_vital_signs(video_path)
-                print("✅ Video processing complete")
-                
-            except Exception as e:
-                print(f"⚠️ Video processing failed: {str(e)}")
-                video_vital_signs = None
+            video_content = await video_file.read()
+            video_path = os.path.join(session_dir, f"video_{video_file.filename}")
+            with open(video_path, "wb") as f:
+                f.write(video_content)
         
         # Parse symptoms
         try:
@@ -536,207 +768,81 @@ async def upload_vital_signs(
             'staff_notes': staff_notes
         }
         
-        # Create patient data for MAI-DxO
-        patient_data = {
-            'patient_id': patient.patient_id,
-            'full_name': patient.full_name,
-            'age': patient.age,
-            'gender': patient.gender.value if patient.gender else 'unknown',
-            'weight_kg': patient.weight_kg or 70,
-            'height_cm': patient.height_cm or 170,
-            'conditions': patient.known_conditions.split(', ') if patient.known_conditions else [],
-            'medications': patient.current_medications.split(', ') if patient.current_medications else [],
-            'allergies': patient.allergies.split(', ') if patient.allergies else [],
-            'surgical_history': patient.previous_surgeries.split(', ') if patient.previous_surgeries else []
-        }
-        
-        # Create complete patient data for MAI-DxO virtual medical panel
-        complete_patient_data = {
-            "personal_information": {
-                "full_name": patient_data['full_name'],
-                "age": patient_data['age'],
-                "gender": patient_data['gender'],
-                "phone_number": patient.phone if hasattr(patient, 'phone') else "N/A",
-                "weight_kg": patient_data['weight_kg'],
-                "height_cm": patient_data['height_cm']
-            },
-            "medical_history": {
-                "known_conditions": patient_data['conditions'],
-                "current_medications": patient_data['medications'],
-                "allergies": patient_data['allergies'],
-                "previous_surgeries": patient_data['surgical_history']
-            },
-            "vital_signs_data": {
-                "ecg_analysis": {
-                    "heart_rate_bpm": features.get('heart_rate', {}).get('mean', 0),
-                    "rhythm_analysis": "sinus rhythm" if not features.get('heart_rate', {}).get('arrhythmia_risk', 'low') == 'moderate' else "irregular rhythm",
-                    "hrv_metrics": features.get('heart_rate', {}).get('hrv_metrics', {}),
-                    "confidence_score": 0.85
-                },
-                "video_vitals_analysis": {
-                    "respiratory_rate_bpm": video_vital_signs.get('respiratory_analysis', {}).get('respiratory_rate_bpm', features.get('respiratory_rate', {}).get('mean', 0)) if video_vital_signs else features.get('respiratory_rate', {}).get('mean', 0),
-                    "respiratory_confidence": video_vital_signs.get('respiratory_analysis', {}).get('confidence', 0) if video_vital_signs else 0,
-                    "breathing_pattern": "normal" if video_vital_signs and video_vital_signs.get('respiratory_analysis', {}).get('status') == 'normal' else features.get('breathing_pattern', {}).get('pattern_classification', 'normal'),
-                    "vitallens_data_available": video_vital_signs is not None and video_vital_signs.get('processing_metadata', {}).get('processing_successful', False),
-                    "data_source": video_vital_signs.get('processing_metadata', {}).get('api_source', 'ECG') if video_vital_signs else 'ECG'
-                },
-                "vitallens_respiratory_data": {
-                    "respiratory_analysis": video_vital_signs.get('respiratory_analysis', {}) if video_vital_signs else {},
-                    "respiratory_waveform": video_vital_signs.get('respiratory_waveform', {}) if video_vital_signs else {},
-                    "face_detection": video_vital_signs.get('face_detection', {}) if video_vital_signs else {},
-                    "processing_metadata": video_vital_signs.get('processing_metadata', {}) if video_vital_signs else {}
-                }
-            },
-            "symptoms_context": {
-                "chief_complaint": chief_complaint,
-                "duration_symptoms": symptom_duration,
-                "additional_symptoms": symptoms_parsed,
-                "pain_scale": pain_scale,
-                "staff_observations": staff_notes
-            },
-            "recording_metadata": {
-                "timestamp": datetime.now().isoformat(),
-                "location": "Puskesmas",
-                "staff_id": "health_worker_001",
-                "equipment_calibrated": True
-            }
-        }
-        
-        print("🏥 Running MAI-DxO Virtual Medical Panel Analysis...")
-        print("="*80)
-        print("📋 PATIENT DATA FOR AI ANALYSIS:")
-        print(f"   Name: {complete_patient_data['personal_information']['full_name']}")
-        print(f"   Age: {complete_patient_data['personal_information']['age']}")
-        print(f"   Gender: {complete_patient_data['personal_information']['gender']}")
-        print(f"   Chief Complaint: {complete_patient_data['symptoms_context']['chief_complaint']}")
-        print(f"   Symptoms: {complete_patient_data['symptoms_context']['additional_symptoms']}")
-        print(f"   Pain Scale: {complete_patient_data['symptoms_context']['pain_scale']}")
-        print(f"   Temperature: {temperature}°C")
-        print(f"   Heart Rate: {complete_patient_data['vital_signs_data']['ecg_analysis']['heart_rate_bpm']} bpm")
-        print(f"   Respiratory Rate: {complete_patient_data['vital_signs_data']['video_vitals_analysis']['respiratory_rate_bpm']} bpm")
-        print(f"   Video Analysis Available: {complete_patient_data['vital_signs_data']['video_vitals_analysis']['vitallens_data_available']}")
-        print("="*80)
-        
-        # Process through MAI-DxO virtual medical panel
-        mai_dxo_result = process_patient_with_mai_dxo(complete_patient_data)
-        
-        print("\n" + "="*80)
-        print("🎯 MAI-DxO ANALYSIS COMPLETE - EXTRACTING RESULTS")
-        print("="*80)
-        
-        # Extract final consensus for database storage
-        final_consensus = mai_dxo_result.get('final_consensus', {})
-        
-        # Determine AI risk level from consensus
-        consensus_risk = final_consensus.get('analysis_summary', {}).get('overall_risk_level', 'medium')
-        if consensus_risk == 'high':
-            ai_risk_level = "HIGH"
-        elif consensus_risk == 'medium':
-            ai_risk_level = "MEDIUM"
-        else:
-            ai_risk_level = "LOW"
-        
-        print(f"✅ MAI-DxO Analysis Complete - Risk Level: {ai_risk_level}")
-        print(f"📊 Final Consensus Risk: {consensus_risk}")
-        print(f"🔍 Primary Concerns: {final_consensus.get('analysis_summary', {}).get('primary_concerns', [])}")
-        print(f"💡 Key Recommendations: {final_consensus.get('analysis_summary', {}).get('key_recommendations', [])}")
-        print(f"🔄 Debate Rounds: {len(mai_dxo_result.get('debate_history', []))}")
-        print("="*80)
-        
-        # Store complete MAI-DxO result as the mai_dxo_data
-        mai_dxo_data = mai_dxo_result
-        
-        # Map AI risk to health screening status
-        if ai_risk_level == "HIGH":
-            overall_status = "urgent"
-        elif ai_risk_level == "MEDIUM":
-            overall_status = "attention_needed"
-        else:
-            overall_status = "healthy"
-        
         # Create analysis session record (store the actual paths used)
         analysis_session = AnalysisSession(
             session_id=session_id,
             patient_id=patient_id,
             health_worker_id=3,  # TODO: Use current_user.id when auth is re-enabled
-            status=AnalysisStatus.COMPLETED,  # Set to COMPLETED so specialist can see it
-            dat_file_path=dat_path,  # This now contains the correct path
-            hea_file_path=hea_path,  # This now contains the correct path
+            status=AnalysisStatus.PROCESSING,
+            dat_file_path=dat_path,
+            hea_file_path=hea_path,
             dat_normalized_file_path=dat_normalized_path,
             hea_normalized_file_path=hea_normalized_path,
             breath_annotation_file_path=breath_annotation_path,
-            features=features,
-            mai_dxo_data=mai_dxo_data,
+            video_file_path=video_path,
+            chief_complaint=chief_complaint,
+            symptoms=symptoms_parsed,
+            pain_level=pain_scale,
+            symptom_duration=symptom_duration,
+            additional_notes=staff_notes,
             clinical_notes=clinical_notes,
-            ai_risk_level=ai_risk_level,
-            # Store extracted vital signs directly
-            heart_rate_bpm=features.get('heart_rate_bpm'),
-            respiratory_rate_bpm=features.get('respiratory_rate_bpm'),
-            pulse_rate_bpm=features.get('pulse_rate_bpm'),
-            spo2_percent=features.get('spo2_percent'),
-            hrv_sdnn=features.get('heart_rate', {}).get('hrv_metrics', {}).get('SDNN') or features.get('hrv_sdnn'),
-            hrv_rmssd=features.get('heart_rate', {}).get('hrv_metrics', {}).get('RMSSD') or features.get('hrv_rmssd'),
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
         
+        commit_started = time.perf_counter()
         db.add(analysis_session)
         db.commit()
-        db.refresh(analysis_session)
+        upload_timings['session_commit'] = time.perf_counter() - commit_started
         
-        # Create health screening record for specialist portal
-        # This is needed because the specialist portal looks for data in health_screenings table
+        # Hand extraction and the MAI-DxO panel to the background workers
         try:
-            # Get patient's internal ID
-            patient_internal_id = patient.id
-            
-            # Create health screening record using raw SQL
-            health_screening_query = text("""
-                INSERT INTO health_screenings (
-                    patient_id, health_center_id, health_worker_id, screening_date, 
-                    status, overall_status, overall_notes
-                ) VALUES (
-                    :patient_id, :health_center_id, :health_worker_id, :screening_date,
-                    :status, :overall_status, :overall_notes
-                )
-            """)
-            
-            db.execute(health_screening_query, {
-                'patient_id': patient_internal_id,
-                'health_center_id': patient.registered_at_health_center_id or 1,
-                'health_worker_id': 3,  # TODO: Use current_user.id when auth is re-enabled
-                'screening_date': datetime.now(),
-                'status': 'completed',
-                'overall_status': overall_status,
-                'overall_notes': f"{chief_complaint}. Symptoms: {', '.join(symptoms_parsed) if symptoms_parsed else 'None'}. AI Risk: {ai_risk_level}. Primary Concerns: {', '.join(final_consensus.get('analysis_summary', {}).get('primary_concerns', []))}"
-            })
-            
+            job = analysis_job_queue.submit(session_id, process_vital_signs_session, session_id)
+        except QueueFullError as e:
+            analysis_session.status = AnalysisStatus.ERROR
             db.commit()
-            
-        except Exception as e:
-            print(f"Warning: Failed to create health screening record: {str(e)}")
-            # Don't fail the whole upload if this fails
-        
-        # Save MAI-DxO data to file for processing
-        mai_dxo_path = os.path.join(session_dir, f"{session_id}_mai_dxo.json")
-        with open(mai_dxo_path, "w") as f:
-            json.dump(mai_dxo_data, f, indent=2)
+            raise HTTPException(status_code=503, detail=str(e))
+        job.stage_timings.update(upload_timings)
         
-        return JSONResponse(content={
+        return JSONResponse(status_code=202, content={
             "success": True,
-            "message": "Files uploaded and processed successfully - MAI-DxO Virtual Medical Panel Analysis Complete",
+            "message": "Files uploaded successfully - MAI-DxO Virtual Medical Panel Analysis queued",
             "session_id": session_id,
-            "ai_risk_level": ai_risk_level,
-            "features": features,
-            "mai_dxo_analysis": {
-                "consensus": final_consensus,
-                "debate_rounds": len(mai_dxo_result.get('debate_history', [])),
-                "panel_metadata": mai_dxo_result.get('panel_metadata', {})
-            },
-            "status": "completed"
+            "job_id": job.job_id,
+            "status": AnalysisStatus.PROCESSING.value,
+            "status_url": f"/api/upload/jobs/{session_id}"
         })
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@router.get("/jobs/{session_id}")
+async def get_analysis_job_status(
+    session_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get the background analysis status for an uploaded session"""
+    
+    job = analysis_job_queue.get(session_id)
+    analysis_session = db.query(AnalysisSession).filter(AnalysisSession.session_id == session_id).first()
+    
+    if not job and not analysis_session:
+        raise HTTPException(status_code=404, detail="No analysis job found for this session")
+    
+    response = {
+        "session_id": session_id,
+        "job": job.to_dict() if job else None,
+        "status": analysis_session.status.value if analysis_session else None,
+        "ai_risk_level": analysis_session.ai_risk_level.value if analysis_session and analysis_session.ai_risk_level else None,
+        "ai_analysis_started_at": analysis_session.ai_analysis_started_at.isoformat() if analysis_session and analysis_session.ai_analysis_started_at else None,
+        "ai_analysis_completed_at": analysis_session.ai_analysis_completed_at.isoformat() if analysis_session and analysis_session.ai_analysis_completed_at else None
+    }
+    
+    return JSONResponse(content=response)
+
+@router.get("/jobs")
+async def get_analysis_queue_stats():
+    """Get worker and queue depth statistics for the analysis job queue"""
+    return JSONResponse(content=analysis_job_queue.stats())
@@ -0,0 +1,87 @@
+"""
+Waveform Downsampling
+Level-of-detail decimation for plotting: min/max envelopes for dense waveforms and LTTB for
+trends, sized to the pixel width of the target axes so render cost is bounded by the image
+rather than the recording length
+"""
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+POINTS_PER_PIXEL = 4  # Two min/max pairs per pixel column keep dense, translucent traces solid
+
+def axes_pixel_width(ax, dpi: float) -> int:
+    """Width of a matplotlib Axes in output pixels at the given savefig dpi"""
+    return max(1, int(math.ceil(ax.get_position().width * ax.figure.get_figwidth() * dpi)))
+
+def minmax_envelope(x: np.ndarray, y: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the minimum and maximum sample of each of max_points // 2 equal buckets, in time order.
+
+    Spikes such as R-peaks survive at any zoom. NaNs are ignored within a bucket; an all-NaN
+    bucket yields NaN points so gaps stay visible.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x)
+    n = len(y)
+    buckets = max_points // 2
+    if n <= max_points or buckets < 1:
+        return x, y
+
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    finite = np.isfinite(padded)
+    lows = np.where(finite, padded, np.inf).reshape(buckets, size).argmin(axis=1)
+    highs = np.where(finite, padded, -np.inf).reshape(buckets, size).argmax(axis=1)
+
+    base = np.arange(buckets) * size
+    index = np.column_stack((base + np.minimum(lows, highs), base + np.maximum(lows, highs))).ravel()
+    index = np.minimum(index, n - 1)
+    return x[index], y[index]
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets: max_points samples that best preserve the line's shape.
+
+    Suited to trends and interval series. Series with NaN gaps fall back to the min/max
+    envelope, since triangle areas are undefined across gaps.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+    if not np.isfinite(y).all():
+        return minmax_envelope(x, y, max_points)
+
+    # First and last points are kept; the rest is split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # Each bucket is scored against the mean of the next one (the final point for the last)
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        areas = np.abs((x[previous] - next_x[i]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y[i] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return x[selected], y[selected]
+
+def downsample_for_axes(ax, x: np.ndarray, y: np.ndarray, dpi: float,
+                        method: str = 'minmax') -> Tuple[np.ndarray, np.ndarray]:
+    """Decimate a series to what the Axes can show (POINTS_PER_PIXEL points per pixel column)"""
+    max_points = POINTS_PER_PIXEL * axes_pixel_width(ax, dpi)
+    if method == 'lttb':
+        return lttb(x, y, max_points)
+    if method == 'minmax':
+        return minmax_envelope(x, y, max_points)
+    raise ValueError(f"Unknown downsampling method: {method}")
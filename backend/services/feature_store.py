@@ -0,0 +1,219 @@
+"""
+Session Feature Store
+Persists extracted features with beat and breath indices next to an uploaded session as a
+.npz file, keyed by BLAKE2 hashes of the session's files and the extractor versions
+"""
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config import settings
+from services.hrv_engine import HRV_ENGINE_VERSION
+from services.qrs_detection import QRS_DETECTOR_VERSION, RPeaks, ecg_channel, qrs_cache, record_r_peaks
+from services.respiratory_analysis import (
+    RESP_ANALYSIS_VERSION, BreathAnalysis, record_breaths, respiratory_cache
+)
+from services.wfdb_reader import open_record
+
+# Bump when the feature dict layout changes so stored sessions are re-extracted
+FEATURE_EXTRACTOR_VERSION = "features-2"
+FEATURE_STORE_FILENAME = "features.npz"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Uploaded files that make up a session, by AnalysisSession attribute
+SESSION_FILE_FIELDS = {
+    'dat': 'dat_file_path',
+    'hea': 'hea_file_path',
+    'dat_normalized': 'dat_normalized_file_path',
+    'hea_normalized': 'hea_normalized_file_path',
+    'breath': 'breath_annotation_file_path'
+}
+
+def extractor_version() -> str:
+    """Every version that affects stored results; a change invalidates the store"""
+    return "|".join((FEATURE_EXTRACTOR_VERSION, QRS_DETECTOR_VERSION, HRV_ENGINE_VERSION, RESP_ANALYSIS_VERSION))
+
+def file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def session_files(analysis_session) -> Dict[str, str]:
+    """Existing uploaded files of an AnalysisSession, by role"""
+    files = {}
+    for role, attribute in SESSION_FILE_FIELDS.items():
+        path = getattr(analysis_session, attribute, None)
+        if path and os.path.exists(path):
+            files[role] = path
+    return files
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+@dataclass(frozen=True)
+class StoredFeatures:
+    """Features and signal indices loaded from a session's store"""
+
+    features: Dict[str, Any]
+    arrays: Dict[str, np.ndarray]
+    file_hashes: Dict[str, str]
+    created_at: str
+
+    def r_peaks(self) -> Optional[RPeaks]:
+        if 'r_peaks' not in self.arrays:
+            return None
+        peaks = self.arrays['r_peaks']
+        peaks.setflags(write=False)
+        return RPeaks(r_peaks=peaks, fs=float(self.arrays['fs']),
+                      channel=str(self.arrays['r_peaks_channel_name']))
+
+    def breaths(self) -> Optional[BreathAnalysis]:
+        if 'breath_onsets' not in self.arrays:
+            return None
+        fields = {}
+        for name in ('onsets', 'peaks', 'ends', 'inspiration_s', 'expiration_s', 'amplitudes'):
+            array = self.arrays[f'breath_{name}']
+            array.setflags(write=False)
+            fields[name] = array
+        return BreathAnalysis(
+            fs=float(self.arrays['fs']),
+            start_sample=int(self.arrays['breath_window'][0]),
+            waveform_skewness=float(self.arrays['breath_skewness']),
+            **fields
+        )
+
+class FeatureStore:
+    """Reads and writes <session_dir>/features.npz.
+
+    A store is only returned by load() when its extractor version and the BLAKE2 hash of
+    every session file match, so replaced uploads or detector changes trigger re-extraction.
+    Digests are memoized per (path, mtime, size) so a file is hashed once per process.
+    """
+
+    def __init__(self, filename: str = FEATURE_STORE_FILENAME):
+        self.filename = filename
+        self._digests: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def path(self, session_dir: str) -> str:
+        return os.path.join(session_dir, self.filename)
+
+    def fingerprint(self, files: Dict[str, str]) -> Dict[str, str]:
+        hashes = {}
+        for role, path in sorted(files.items()):
+            stat = os.stat(path)
+            key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                digest = self._digests.get(key)
+            if digest is None:
+                digest = file_digest(path)
+                with self._lock:
+                    self._digests[key] = digest
+            hashes[role] = digest
+        return hashes
+
+    def save(self, session_dir: str, files: Dict[str, str], features: Dict[str, Any],
+             arrays: Optional[Dict[str, np.ndarray]] = None) -> str:
+        meta = {
+            'extractor_version': extractor_version(),
+            'file_hashes': self.fingerprint(files),
+            'created_at': datetime.now().isoformat()
+        }
+        path = self.path(session_dir)
+        temp_path = path + '.tmp.npz'
+        np.savez(
+            temp_path,
+            meta_json=np.array(json.dumps(meta)),
+            features_json=np.array(json.dumps(features, default=_json_default)),
+            **(arrays or {})
+        )
+        os.replace(temp_path, path)  # Readers never see a partly written store
+        return path
+
+    def load(self, session_dir: str, files: Dict[str, str]) -> Optional[StoredFeatures]:
+        path = self.path(session_dir)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta_json']))
+                if meta.get('extractor_version') != extractor_version():
+                    return None
+                if meta.get('file_hashes') != self.fingerprint(files):
+                    return None
+                return StoredFeatures(
+                    features=json.loads(str(data['features_json'])),
+                    arrays={name: data[name] for name in data.files if not name.endswith('_json')},
+                    file_hashes=meta['file_hashes'],
+                    created_at=meta.get('created_at', '')
+                )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Ignoring unreadable feature store {path}: {e}")
+            return None
+
+def collect_signal_arrays(dat_file_path: str, breath_start_s: float = -120.0) -> Dict[str, np.ndarray]:
+    """Beat and breath indices worth persisting, from the per-record caches (whole-record beats for the plots)"""
+    record = open_record(dat_file_path)
+    arrays = {'fs': np.array(record.fs)}
+
+    ecg_idx = ecg_channel(record)
+    beats = record_r_peaks(record, ecg_idx) if ecg_idx is not None else None
+    if beats is not None:
+        arrays['r_peaks'] = beats.r_peaks
+        arrays['r_peaks_channel'] = np.array(ecg_idx)
+        arrays['r_peaks_channel_name'] = np.array(beats.channel)
+
+    resp_idx = record.find_channel('RESP')
+    if resp_idx is not None:
+        breaths = record_breaths(record, resp_idx, breath_start_s)
+        _, end = record.sample_range(breath_start_s)
+        arrays['breath_channel'] = np.array(resp_idx)
+        arrays['breath_window'] = np.array([breaths.start_sample, end])
+        arrays['breath_skewness'] = np.array(breaths.waveform_skewness)
+        for name in ('onsets', 'peaks', 'ends', 'inspiration_s', 'expiration_s', 'amplitudes'):
+            arrays[f'breath_{name}'] = getattr(breaths, name)
+    return arrays
+
+def prime_signal_caches(stored: StoredFeatures, dat_file_path: str):
+    """Seed the QRS and respiratory caches from a store so plots skip detection"""
+    beats = stored.r_peaks()
+    if beats is not None:
+        qrs_cache.put(dat_file_path, int(stored.arrays['r_peaks_channel']), beats)
+    breaths = stored.breaths()
+    if breaths is not None:
+        respiratory_cache.put(dat_file_path, int(stored.arrays['breath_channel']),
+                              int(stored.arrays['breath_window'][1]), breaths)
+
+# Global instance
+feature_store = FeatureStore()
+
+def load_session_features(analysis_session, prime_caches: bool = True) -> Optional[StoredFeatures]:
+    """Stored features for an AnalysisSession when its files are unchanged, else None"""
+    if not settings.feature_store_enabled or not analysis_session.dat_file_path:
+        return None
+    session_dir = os.path.dirname(analysis_session.dat_file_path)
+    stored = feature_store.load(session_dir, session_files(analysis_session))
+    if stored is not None and prime_caches:
+        prime_signal_caches(stored, analysis_session.dat_file_path)
+    return stored
+
+def save_session_features(analysis_session, features: Dict[str, Any]) -> Optional[str]:
+    """Persist features plus beat and breath indices next to an AnalysisSession's files"""
+    if not settings.feature_store_enabled or not analysis_session.dat_file_path:
+        return None
+    session_dir = os.path.dirname(analysis_session.dat_file_path)
+    return feature_store.save(session_dir, session_files(analysis_session), features,
+                              collect_signal_arrays(analysis_session.dat_file_path))
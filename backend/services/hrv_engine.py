@@ -0,0 +1,183 @@
+"""
+HRV Engine
+Time-domain, frequency-domain (Welch on a resampled tachogram) and Poincaré heart rate
+variability metrics from detected beats, cached per record window
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.integrate import trapezoid
+from scipy.signal import welch
+
+from services.qrs_detection import QRS_DETECTOR_VERSION, ecg_channel, record_r_peaks
+from services.wfdb_reader import MappedRecord, open_record, record_signature
+
+HRV_ENGINE_VERSION = "hrv-1"
+
+MIN_BEATS = 10  # Fewer beats than this give no metrics
+NN_RANGE_MS = (250.0, 2000.0)  # Physiologically plausible RR intervals (30-240 bpm)
+ECTOPIC_TOLERANCE = 0.2  # Intervals deviating more than this from the local median are excluded
+ECTOPIC_NEIGHBOURS = 5  # Intervals on each side used for the local median
+TACHOGRAM_FS = 4.0  # Hz, resampling rate for spectral analysis
+BANDS_HZ = {
+    'VLF': (0.0033, 0.04),
+    'LF': (0.04, 0.15),
+    'HF': (0.15, 0.4)
+}
+MIN_SPECTRAL_SECONDS = 60.0  # Shorter tachograms cannot resolve LF
+
+@dataclass(frozen=True)
+class HRVMetrics:
+    """HRV summary for one run of beats; spectral fields are None when the span is too short"""
+
+    beats: int
+    nn_count: int
+    mean_nn_ms: float
+    mean_hr_bpm: float
+    SDNN: float
+    SDSD: float
+    RMSSD: float
+    NN50: int
+    pNN50: float
+    SD1: float
+    SD2: float
+    SD1_SD2_ratio: Optional[float]
+    VLF_power: Optional[float] = None
+    LF_power: Optional[float] = None
+    HF_power: Optional[float] = None
+    LF_HF_ratio: Optional[float] = None
+    LF_nu: Optional[float] = None
+    HF_nu: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def nn_mask(rr_ms: np.ndarray) -> np.ndarray:
+    """Boolean mask of RR intervals that are normal-to-normal.
+
+    Drops intervals outside NN_RANGE_MS and those deviating more than ECTOPIC_TOLERANCE
+    from the median of their neighbours (ectopic beats, missed or extra detections).
+    """
+    rr_ms = np.asarray(rr_ms, dtype=np.float64)
+    valid = (rr_ms >= NN_RANGE_MS[0]) & (rr_ms <= NN_RANGE_MS[1])
+    if len(rr_ms) > 2 * ECTOPIC_NEIGHBOURS:
+        k = ECTOPIC_NEIGHBOURS
+        local_median = np.median(sliding_window_view(np.pad(rr_ms, k, mode='reflect'), 2 * k + 1), axis=1)
+        valid &= np.abs(rr_ms - local_median) <= ECTOPIC_TOLERANCE * local_median
+    return valid
+
+def _band_powers(beat_times_s: np.ndarray, rr_ms: np.ndarray) -> Dict[str, Optional[float]]:
+    """Welch PSD of the evenly resampled, detrended tachogram integrated over each band (ms²)"""
+    empty = {'VLF_power': None, 'LF_power': None, 'HF_power': None,
+             'LF_HF_ratio': None, 'LF_nu': None, 'HF_nu': None}
+    span = beat_times_s[-1] - beat_times_s[0] if len(beat_times_s) else 0.0
+    if span < MIN_SPECTRAL_SECONDS:
+        return empty
+
+    grid = np.arange(beat_times_s[0], beat_times_s[-1], 1.0 / TACHOGRAM_FS)
+    tachogram = np.interp(grid, beat_times_s, rr_ms)
+    tachogram -= np.polyval(np.polyfit(grid, tachogram, 1), grid)
+    nperseg = min(len(tachogram), int(64 * TACHOGRAM_FS))  # 64 s segments
+    frequencies, psd = welch(tachogram, fs=TACHOGRAM_FS, nperseg=nperseg, detrend='constant')
+
+    powers = {}
+    for band, (low, high) in BANDS_HZ.items():
+        in_band = (frequencies >= low) & (frequencies < high)
+        powers[band] = float(trapezoid(psd[in_band], frequencies[in_band])) if in_band.sum() > 1 else 0.0
+
+    lf, hf = powers['LF'], powers['HF']
+    return {
+        'VLF_power': powers['VLF'],
+        'LF_power': lf,
+        'HF_power': hf,
+        'LF_HF_ratio': lf / hf if hf > 0 else None,
+        'LF_nu': 100 * lf / (lf + hf) if lf + hf > 0 else None,
+        'HF_nu': 100 * hf / (lf + hf) if lf + hf > 0 else None
+    }
+
+def compute_hrv(r_peaks: np.ndarray, fs: float) -> Optional[HRVMetrics]:
+    """HRV metrics from R-peak sample indices, or None when there are too few beats"""
+    r_peaks = np.asarray(r_peaks)
+    if len(r_peaks) < MIN_BEATS:
+        return None
+
+    beat_times = r_peaks / fs
+    rr = np.diff(beat_times) * 1000
+    normal = nn_mask(rr)
+    nn = rr[normal]
+    if len(nn) < MIN_BEATS - 1:
+        return None
+
+    # Successive differences only between adjacent NN intervals (no gap across excluded beats)
+    adjacent = normal[1:] & normal[:-1]
+    successive = np.diff(rr)[adjacent]
+
+    sdnn = float(np.std(nn))
+    sdsd = float(np.std(successive)) if len(successive) else 0.0
+    rmssd = float(np.sqrt(np.mean(successive ** 2))) if len(successive) else 0.0
+    nn50 = int(np.sum(np.abs(successive) > 50))
+
+    # Poincaré plot axes: SD1 from successive differences, SD2 from overall variability
+    sd1 = float(np.sqrt(0.5) * sdsd)
+    sd2 = float(np.sqrt(max(2 * sdnn ** 2 - 0.5 * sdsd ** 2, 0.0)))
+
+    return HRVMetrics(
+        beats=int(len(r_peaks)),
+        nn_count=int(len(nn)),
+        mean_nn_ms=float(np.mean(nn)),
+        mean_hr_bpm=float(60000.0 / np.mean(nn)),
+        SDNN=sdnn,
+        SDSD=sdsd,
+        RMSSD=rmssd,
+        NN50=nn50,
+        pNN50=float(nn50 / len(successive) * 100) if len(successive) else 0.0,
+        SD1=sd1,
+        SD2=sd2,
+        SD1_SD2_ratio=sd1 / sd2 if sd2 > 0 else None,
+        **_band_powers(beat_times[1:][normal], nn)
+    )
+
+class HRVCache:
+    """LRU of HRV results keyed by record version, channel, window and engine versions"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Optional[HRVMetrics]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record: Union[str, MappedRecord], channel: Optional[int] = None,
+            start_s: float = 0.0, end_s: Optional[float] = None) -> Optional[HRVMetrics]:
+        if not isinstance(record, MappedRecord):
+            record = open_record(record)
+        if channel is None:
+            channel = ecg_channel(record)
+            if channel is None:
+                return None
+        start, end = record.sample_range(start_s, end_s)
+        key = record_signature(record.base_path) + (channel, start, end, QRS_DETECTOR_VERSION, HRV_ENGINE_VERSION)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        beats = record_r_peaks(record, channel)
+        metrics = compute_hrv(beats.between(start, end), record.fs) if beats is not None else None
+        with self._lock:
+            self._entries[key] = metrics
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return metrics
+
+# Global instance
+hrv_cache = HRVCache()
+
+def record_hrv(record: Union[str, MappedRecord], channel: Optional[int] = None,
+               start_s: float = 0.0, end_s: Optional[float] = None) -> Optional[HRVMetrics]:
+    """HRV for a record window (negative times count from the end), computed once per record version"""
+    return hrv_cache.get(record, channel, start_s, end_s)
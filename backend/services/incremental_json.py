@@ -0,0 +1,98 @@
+"""
+Incremental JSON Scanner
+Watches a JSON object as it streams in and reports selected top-level fields as soon
+as their values are complete, without waiting for the rest of the document
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+class IncrementalJSONScanner:
+    """Character-level scanner over a streamed top-level JSON object.
+
+    Text before the first '{' (e.g. a ```json fence) is ignored. Whenever one of the
+    watched top-level keys has a complete value, it is decoded and passed to
+    on_field(key, value) once. The full text is kept so the caller can still parse
+    the finished document as a whole.
+    """
+
+    def __init__(self, watch_keys: Iterable[str], on_field: Optional[Callable[[str, Any], None]] = None):
+        self.watch_keys = set(watch_keys)
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._lock = threading.Lock()
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._value_start = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str):
+        """Consume the next piece of streamed text"""
+        if not chunk:
+            return
+        with self._lock:
+            self._text += chunk
+            self._scan()
+
+    def _scan(self):
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._last_string = text[self._string_start:i + 1]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 1:
+                    self._finish_value(i)
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ':' and self._last_string is not None:
+                    self._current_key = json.loads(self._last_string)
+                    self._last_string = None
+                    self._value_start = i + 1
+                elif char == ',':
+                    self._finish_value(i)
+
+        self._pos = len(text)
+
+    def _finish_value(self, end: int):
+        """A top-level value ended just before end; emit it if it is watched"""
+        key, start = self._current_key, self._value_start
+        self._current_key = None
+        self._value_start = None
+        self._last_string = None
+        if key is None or key not in self.watch_keys or key in self.fields:
+            return
+
+        try:
+            value = self._decoder.decode(self._text[start:end].strip())
+        except json.JSONDecodeError:
+            return
+        self.fields[key] = value
+        if self.on_field is not None:
+            self.on_field(key, value)
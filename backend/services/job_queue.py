@@ -0,0 +1,192 @@
+"""
+Analysis Job Queue
+In-process background queue that runs vital signs extraction and the MAI-DxO panel
+off the request path
+"""
+
+import enum
+import queue
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from config import settings
+
+class JobStatus(enum.Enum):
+    """Background job status"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class QueueFullError(Exception):
+    """Raised when the queue is at its configured depth"""
+
+@dataclass
+class AnalysisJob:
+    """A unit of background work, keyed by the analysis session it belongs to"""
+    job_id: str
+    func: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    status: JobStatus = JobStatus.QUEUED
+    submitted_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    stage_timings: Dict[str, float] = field(default_factory=dict)  # seconds per pipeline stage
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "stage_timings": dict(self.stage_timings)
+        }
+
+_current = threading.local()
+
+def current_job() -> Optional[AnalysisJob]:
+    """The job running on this worker thread, if any"""
+    return getattr(_current, "job", None)
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Record the wall time of a block under stage in the current job (no-op outside a job)"""
+    job = current_job()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if job is not None:
+            job.stage_timings[stage] = job.stage_timings.get(stage, 0.0) + time.perf_counter() - started
+
+class AnalysisJobQueue:
+    """Bounded FIFO queue drained by a fixed pool of worker threads"""
+
+    def __init__(self, worker_count: int = 2, max_queue_depth: int = 20, history_size: int = 1000,
+                 name: str = "analysis"):
+        self.name = name
+        self.worker_count = max(1, worker_count)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.history_size = history_size
+        self._queue: "queue.Queue[Optional[AnalysisJob]]" = queue.Queue(maxsize=self.max_queue_depth)
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    @property
+    def running(self) -> bool:
+        return any(worker.is_alive() for worker in self._workers)
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self.running:
+                return
+            self._workers = [
+                threading.Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+                for i in range(self.worker_count)
+            ]
+            for worker in self._workers:
+                worker.start()
+        print(f"✅ {self.name.capitalize()} job queue started ({self.worker_count} workers, depth {self.max_queue_depth})")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Let queued jobs finish, then stop the workers"""
+        workers = self._workers
+        for _ in workers:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def is_full(self) -> bool:
+        return self._queue.full()
+
+    def submit(self, job_id: str, func: Callable[..., Any], *args, **kwargs) -> AnalysisJob:
+        """Queue func(*args, **kwargs) under job_id; raises QueueFullError when at capacity"""
+        if not self.running:
+            self.start()
+
+        job = AnalysisJob(job_id=job_id, func=func, args=args, kwargs=kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise QueueFullError(f"{self.name.capitalize()} queue is full ({self.max_queue_depth} jobs waiting)")
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > self.history_size:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {status.value: 0 for status in JobStatus}
+            for job in self._jobs.values():
+                counts[job.status.value] += 1
+        return {
+            "workers": self.worker_count,
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "jobs": counts
+        }
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: AnalysisJob):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+        print(f"⚙️ Job {job.job_id} started on {threading.current_thread().name}")
+        _current.job = job
+        try:
+            job.func(*job.args, **job.kwargs)
+            job.status = JobStatus.SUCCEEDED
+            print(f"✅ Job {job.job_id} finished")
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            print(f"❌ Job {job.job_id} failed: {e}")
+            traceback.print_exc()
+        finally:
+            _current.job = None
+            job.finished_at = datetime.now()
+
+# Global instance
+analysis_job_queue = AnalysisJobQueue(
+    worker_count=settings.analysis_worker_count,
+    max_queue_depth=settings.analysis_queue_depth
+)
+
+# Plot pre-rendering gets its own threads so it never delays or displaces analysis jobs
+plot_job_queue = AnalysisJobQueue(
+    worker_count=settings.plot_precompute_workers,
+    max_queue_depth=settings.plot_precompute_queue_depth,
+    name="plot"
+)
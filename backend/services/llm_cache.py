@@ -0,0 +1,225 @@
+"""
+LLM Response Cache
+Content-addressed cache for Gemini responses, keyed by model, generation config and prompt
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import settings
+
+def make_cache_key(model: str, generation_config: Dict[str, Any], prompt: str) -> str:
+    """Hash everything that determines the model output into a stable key"""
+    canonical = json.dumps(
+        {"model": model, "generation_config": generation_config, "prompt": prompt},
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResponseCache(ABC):
+    """Base class for response cache backends"""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        evicted = self._set(key, value)
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend_name,
+                "entries": self.size(),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    @property
+    @abstractmethod
+    def backend_name(self) -> str:
+        ...
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> int:
+        """Store value and return the number of evicted entries"""
+        ...
+
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+class InMemoryLRUCache(ResponseCache):
+    """Per-process LRU cache"""
+
+    backend_name = "memory"
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: Optional[float] = None):
+        super().__init__(max_entries, ttl_seconds)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> int:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk cache shared by every process on the machine, evicting least recently used entries"""
+
+    backend_name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: Optional[float] = None):
+        super().__init__(max_entries, ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses (accessed_at)")
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self._expired(created_at):
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return value
+
+    def _set(self, key: str, value: str) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            evicted = 0
+            if self.ttl_seconds is not None:
+                evicted += self._conn.execute(
+                    "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+            evicted += self._conn.execute("""
+                DELETE FROM llm_responses WHERE key IN (
+                    SELECT key FROM llm_responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            return evicted
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_responses")
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache configured by LLM_CACHE_BACKEND (None when disabled)"""
+    global _response_cache
+    backend = settings.llm_cache_backend.lower()
+    if backend == "none":
+        return None
+
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                ttl = settings.llm_cache_ttl_seconds or None
+                if backend == "sqlite":
+                    _response_cache = SQLiteResponseCache(
+                        settings.llm_cache_path,
+                        max_entries=settings.llm_cache_max_entries,
+                        ttl_seconds=ttl
+                    )
+                elif backend == "memory":
+                    _response_cache = InMemoryLRUCache(
+                        max_entries=settings.llm_cache_max_entries,
+                        ttl_seconds=ttl
+                    )
+                else:
+                    raise ValueError(f"Unknown LLM cache backend: {settings.llm_cache_backend}")
+    return _response_cache
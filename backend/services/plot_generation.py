@@ -5,26 +5,56 @@ Generate medical plots from WFDB data files for specialist portal
 
 import os
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use('Agg')  # Before seaborn imports pyplot; the figures below never use pyplot state
+import matplotlib.style
+from matplotlib.figure import Figure
 import matplotlib.patches as patches
 from matplotlib.dates import DateFormatter
-import wfdb
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import base64
 from io import BytesIO
 from scipy import signal
-from scipy.signal import find_peaks
 import seaborn as sns
 
-# Set matplotlib to use non-interactive backend
-plt.switch_backend('Agg')
+from services.record_loader import load_record
+from services.downsampling import downsample_for_axes
+from services.hrv_engine import record_hrv
+from services.qrs_detection import ecg_channel, record_r_peaks
+from services.respiratory_analysis import record_breaths
+from services.signal_stats import column_stats, windowed_rate
+from services.wfdb_reader import open_record, read_window
 
 # Configure plot style
-plt.style.use('seaborn-v0_8')
+matplotlib.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+# Session files each plot type is rendered from (AnalysisSession attribute names, in argument order)
+PLOT_REQUIREMENTS = {
+    'ecg_waveform': ('dat_file_path', 'hea_file_path'),
+    'vital_signs_trend': ('dat_normalized_file_path', 'hea_normalized_file_path'),
+    'respiratory_pattern': ('dat_file_path', 'hea_file_path', 'breath_annotation_file_path'),
+    'hrv_analysis': ('dat_file_path', 'hea_file_path'),
+    'combined_dashboard': ('dat_file_path', 'hea_file_path', 'dat_normalized_file_path', 'hea_normalized_file_path')
+}
+
+class ErrorPlot(bytes):
+    """PNG explaining why a plot could not be rendered (returned by the render_*_plot methods)"""
+    message: str = ""
+
+class PlotRenderError(Exception):
+    """Raised by render_plot when a plot failed; carries the error PNG to show instead"""
+
+    def __init__(self, message: str, png: bytes):
+        super().__init__(message)
+        self.png = png
+
+def to_data_uri(png: bytes) -> str:
+    """Base64 data URI for embedding PNG bytes in JSON responses"""
+    return f"data:image/png;base64,{base64.b64encode(png).decode('utf-8')}"
+
 class MedicalPlotGenerator:
     """Generate medical plots from WFDB data files"""
     
@@ -40,56 +70,49 @@ class MedicalPlotGenerator:
             'pulse': '#e67e22'
         }
     
-    def generate_ecg_waveform_plot(self, dat_file_path: str, hea_file_path: str) -> str:
-        """Generate ECG waveform plot from raw data"""
+    def render_ecg_waveform_plot(self, dat_file_path: str, hea_file_path: str) -> bytes:
+        """Render ECG waveform plot from raw data as PNG bytes"""
         try:
-            # Load WFDB record
-            record_name = dat_file_path.replace('.dat', '')
-            record = wfdb.rdrecord(record_name)
-            
-            # Get ECG signals
-            signals = record.p_signal
-            signal_names = record.sig_name
-            fs = record.fs
-            
-            # Create time vector (show last 30 seconds)
-            duration = min(30, len(signals) / fs)
-            start_sample = max(0, len(signals) - int(duration * fs))
-            time_vector = np.arange(start_sample, len(signals)) / fs
+            # Read only the last 30 seconds of the WFDB record
+            window = read_window(dat_file_path, start_s=-30)
+            signals = window.signals
+            signal_names = window.sig_name
+            duration = window.duration_seconds
+            time_vector = window.time_vector()
             
             # Create figure
-            fig, axes = plt.subplots(len(signal_names), 1, figsize=(14, 2*len(signal_names)), sharex=True)
+            fig = Figure(figsize=(14, 2*len(signal_names)))
+            axes = fig.subplots(len(signal_names), 1, sharex=True)
             if len(signal_names) == 1:
                 axes = [axes]
             
             # Plot each signal
             for i, (signal_name, ax) in enumerate(zip(signal_names, axes)):
                 if i < signals.shape[1]:
-                    signal_data = signals[start_sample:, i]
-                    ax.plot(time_vector, signal_data, color=self.colors.get('ecg', '#e74c3c'), linewidth=0.8)
-                    ax.set_ylabel(f'{signal_name}\n({record.units[i] if i < len(record.units) else "mV"})', 
+                    signal_data = signals[:, i]
+                    self._plot_series(ax, time_vector, signal_data, color=self.colors.get('ecg', '#e74c3c'), linewidth=0.8)
+                    ax.set_ylabel(f'{signal_name}\n({window.units[i] or "mV"})', 
                                 fontsize=10)
                     ax.grid(True, alpha=0.3)
                     ax.set_title(f'{signal_name} - Last {duration:.0f} seconds', fontsize=12, pad=10)
             
             # Format x-axis
             axes[-1].set_xlabel('Time (seconds)', fontsize=12)
-            plt.suptitle('ECG Waveform Analysis', fontsize=16, y=0.98)
-            plt.tight_layout()
+            fig.suptitle('ECG Waveform Analysis', fontsize=16, y=0.98)
+            fig.tight_layout()
             
             # Convert to base64
-            return self._fig_to_base64(fig)
+            return self._fig_to_png(fig)
             
         except Exception as e:
             print(f"Error generating ECG plot: {str(e)}")
-            return self._generate_error_plot("ECG Waveform", str(e))
+            return self._render_error_plot("ECG Waveform", str(e))
     
-    def generate_vital_signs_trend_plot(self, dat_normalized_path: str, hea_normalized_path: str) -> str:
-        """Generate vital signs trend plot from normalized data"""
+    def render_vital_signs_trend_plot(self, dat_normalized_path: str, hea_normalized_path: str) -> bytes:
+        """Render vital signs trend plot from normalized data as PNG bytes"""
         try:
             # Load normalized WFDB record
-            record_name = dat_normalized_path.replace('.dat', '')
-            record = wfdb.rdrecord(record_name)
+            record = load_record(dat_normalized_path)
             
             signals = record.p_signal
             signal_names = record.sig_name
@@ -100,7 +123,8 @@ class MedicalPlotGenerator:
             time_minutes = time_vector / 60  # Convert to minutes
             
             # Create subplots
-            fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+            fig = Figure(figsize=(15, 10))
+            axes = fig.subplots(2, 2)
             fig.suptitle('Vital Signs Trend Analysis', fontsize=16, y=0.95)
             
             # Plot vital signs
@@ -117,11 +141,11 @@ class MedicalPlotGenerator:
             
             # Heart Rate
             if 'HR' in vital_signs_data:
-                axes[0, 0].plot(time_minutes[:len(vital_signs_data['HR'])], vital_signs_data['HR'], 
-                               color=self.colors['hr'], linewidth=2, label='Heart Rate')
+                self._plot_series(axes[0, 0], time_minutes[:len(vital_signs_data['HR'])], vital_signs_data['HR'], method='lttb',
+                                  color=self.colors['hr'], linewidth=2, label='Heart Rate')
                 axes[0, 0].axhline(y=60, color='green', linestyle='--', alpha=0.7, label='Normal Range')
                 axes[0, 0].axhline(y=100, color='green', linestyle='--', alpha=0.7)
-                axes[0, 0].fill_between(time_minutes[:len(vital_signs_data['HR'])], 60, 100, alpha=0.1, color='green')
+                axes[0, 0].fill_between(time_minutes[[0, len(vital_signs_data['HR']) - 1]], 60, 100, alpha=0.1, color='green')
                 axes[0, 0].set_title('Heart Rate (bpm)', fontsize=14)
                 axes[0, 0].set_ylabel('bpm')
                 axes[0, 0].grid(True, alpha=0.3)
@@ -129,11 +153,11 @@ class MedicalPlotGenerator:
             
             # Respiratory Rate
             if 'RESP' in vital_signs_data:
-                axes[0, 1].plot(time_minutes[:len(vital_signs_data['RESP'])], vital_signs_data['RESP'], 
-                               color=self.colors['resp'], linewidth=2, label='Respiratory Rate')
+                self._plot_series(axes[0, 1], time_minutes[:len(vital_signs_data['RESP'])], vital_signs_data['RESP'], method='lttb',
+                                  color=self.colors['resp'], linewidth=2, label='Respiratory Rate')
                 axes[0, 1].axhline(y=12, color='green', linestyle='--', alpha=0.7, label='Normal Range')
                 axes[0, 1].axhline(y=20, color='green', linestyle='--', alpha=0.7)
-                axes[0, 1].fill_between(time_minutes[:len(vital_signs_data['RESP'])], 12, 20, alpha=0.1, color='green')
+                axes[0, 1].fill_between(time_minutes[[0, len(vital_signs_data['RESP']) - 1]], 12, 20, alpha=0.1, color='green')
                 axes[0, 1].set_title('Respiratory Rate (breaths/min)', fontsize=14)
                 axes[0, 1].set_ylabel('breaths/min')
                 axes[0, 1].grid(True, alpha=0.3)
@@ -141,11 +165,11 @@ class MedicalPlotGenerator:
             
             # SpO2
             if 'SpO2' in vital_signs_data:
-                axes[1, 0].plot(time_minutes[:len(vital_signs_data['SpO2'])], vital_signs_data['SpO2'], 
-                               color=self.colors['spo2'], linewidth=2, label='SpO2')
+                self._plot_series(axes[1, 0], time_minutes[:len(vital_signs_data['SpO2'])], vital_signs_data['SpO2'], method='lttb',
+                                  color=self.colors['spo2'], linewidth=2, label='SpO2')
                 axes[1, 0].axhline(y=95, color='green', linestyle='--', alpha=0.7, label='Normal Range')
                 axes[1, 0].axhline(y=100, color='green', linestyle='--', alpha=0.7)
-                axes[1, 0].fill_between(time_minutes[:len(vital_signs_data['SpO2'])], 95, 100, alpha=0.1, color='green')
+                axes[1, 0].fill_between(time_minutes[[0, len(vital_signs_data['SpO2']) - 1]], 95, 100, alpha=0.1, color='green')
                 axes[1, 0].set_title('Oxygen Saturation (%)', fontsize=14)
                 axes[1, 0].set_ylabel('%')
                 axes[1, 0].grid(True, alpha=0.3)
@@ -153,11 +177,11 @@ class MedicalPlotGenerator:
             
             # Pulse Rate
             if 'PULSE' in vital_signs_data:
-                axes[1, 1].plot(time_minutes[:len(vital_signs_data['PULSE'])], vital_signs_data['PULSE'], 
-                               color=self.colors['pulse'], linewidth=2, label='Pulse Rate')
+                self._plot_series(axes[1, 1], time_minutes[:len(vital_signs_data['PULSE'])], vital_signs_data['PULSE'], method='lttb',
+                                  color=self.colors['pulse'], linewidth=2, label='Pulse Rate')
                 axes[1, 1].axhline(y=60, color='green', linestyle='--', alpha=0.7, label='Normal Range')
                 axes[1, 1].axhline(y=100, color='green', linestyle='--', alpha=0.7)
-                axes[1, 1].fill_between(time_minutes[:len(vital_signs_data['PULSE'])], 60, 100, alpha=0.1, color='green')
+                axes[1, 1].fill_between(time_minutes[[0, len(vital_signs_data['PULSE']) - 1]], 60, 100, alpha=0.1, color='green')
                 axes[1, 1].set_title('Pulse Rate (bpm)', fontsize=14)
                 axes[1, 1].set_ylabel('bpm')
                 axes[1, 1].grid(True, alpha=0.3)
@@ -167,78 +191,66 @@ class MedicalPlotGenerator:
             for ax in axes.flat:
                 ax.set_xlabel('Time (minutes)')
             
-            plt.tight_layout()
-            return self._fig_to_base64(fig)
+            fig.tight_layout()
+            return self._fig_to_png(fig)
             
         except Exception as e:
             print(f"Error generating vital signs trend plot: {str(e)}")
-            return self._generate_error_plot("Vital Signs Trend", str(e))
+            return self._render_error_plot("Vital Signs Trend", str(e))
     
-    def generate_respiratory_pattern_plot(self, dat_file_path: str, hea_file_path: str, 
-                                        breath_annotation_path: str) -> str:
-        """Generate respiratory pattern analysis plot"""
+    def render_respiratory_pattern_plot(self, dat_file_path: str, hea_file_path: str, 
+                                        breath_annotation_path: str) -> bytes:
+        """Render respiratory pattern analysis plot as PNG bytes"""
         try:
-            # Load WFDB record
-            record_name = dat_file_path.replace('.dat', '')
-            record = wfdb.rdrecord(record_name)
-            
-            signals = record.p_signal
-            signal_names = record.sig_name
+            # Memory-map WFDB record
+            record = open_record(dat_file_path)
             fs = record.fs
             
             # Find respiratory signal
-            resp_signal = None
-            resp_idx = None
-            for i, name in enumerate(signal_names):
-                if 'RESP' in name.upper():
-                    resp_signal = signals[:, i]
-                    resp_idx = i
-                    break
+            resp_idx = record.find_channel('RESP')
+            if resp_idx is None:
+                return self._render_error_plot("Respiratory Pattern", "No respiratory signal found")
             
-            if resp_signal is None:
-                return self._generate_error_plot("Respiratory Pattern", "No respiratory signal found")
+            # Read only the last 2 minutes of the respiratory channel
+            window = read_window(record, [resp_idx], start_s=-120)
+            time_vector = window.time_vector()
+            resp_data = window.signals[:, 0]
             
-            # Create time vector (show last 2 minutes)
-            duration = min(120, len(resp_signal) / fs)
-            start_sample = max(0, len(resp_signal) - int(duration * fs))
-            time_vector = np.arange(start_sample, len(resp_signal)) / fs
-            resp_data = resp_signal[start_sample:]
+            # Breaths detected once per record window (shared with feature extraction)
+            breaths = record_breaths(record, resp_idx, window.start_s, window.end_s)
             
             # Create figure with subplots
-            fig, axes = plt.subplots(3, 1, figsize=(14, 12))
+            fig = Figure(figsize=(14, 12))
+            axes = fig.subplots(3, 1)
             fig.suptitle('Respiratory Pattern Analysis', fontsize=16, y=0.95)
             
-            # Plot 1: Raw respiratory signal
-            axes[0].plot(time_vector, resp_data, color=self.colors['resp'], linewidth=1.5)
+            # Plot 1: Raw respiratory signal with inspiration onsets and peaks
+            self._plot_series(axes[0], time_vector, resp_data, color=self.colors['resp'], linewidth=1.5)
+            if breaths.breath_count:
+                onsets = breaths.onsets - window.start_sample
+                peaks = breaths.peaks - window.start_sample
+                axes[0].plot(time_vector[onsets], resp_data[onsets], 'v', color=self.colors['pleth'],
+                             markersize=6, label='Inspiration onset')
+                axes[0].plot(time_vector[peaks], resp_data[peaks], '^', color=self.colors['ecg'],
+                             markersize=6, label='End of inspiration')
+                axes[0].legend(loc='upper right')
             axes[0].set_title('Respiratory Waveform', fontsize=14)
             axes[0].set_ylabel('Amplitude')
             axes[0].grid(True, alpha=0.3)
             
-            # Plot 2: Respiratory rate estimation
-            # Use sliding window to estimate respiratory rate
-            window_size = int(10 * fs)  # 10 second windows
-            step_size = int(2 * fs)     # 2 second steps
-            
-            rates = []
-            times = []
-            
-            for i in range(0, len(resp_data) - window_size, step_size):
-                window = resp_data[i:i+window_size]
-                
-                # Find peaks (breaths)
-                peaks, _ = find_peaks(window, height=np.mean(window), distance=int(fs))
-                
-                # Calculate rate (breaths per minute)
-                if len(peaks) > 1:
-                    rate = len(peaks) * 60 / (window_size / fs)
-                    rates.append(rate)
-                    times.append(time_vector[i + window_size//2])
-            
-            if rates:
-                axes[1].plot(times, rates, color=self.colors['hr'], linewidth=2, marker='o', markersize=4)
+            # Plot 2: Respiratory rate in 10 second windows every 2 seconds, counted from the
+            # detected inspiration onsets, with the breath-by-breath rate
+            rates = breaths.breath_rates_bpm
+            if len(rates):
+                times, windowed = windowed_rate(breaths.onsets, fs, 10, 2,
+                                                window.start_sample, window.end_sample)
+                axes[1].plot(times, windowed, color=self.colors['hr'], linewidth=2, marker='o', markersize=4,
+                             label='10 s window')
+                axes[1].plot(breaths.breath_times_s, rates, '.', color=self.colors['resp'], alpha=0.7,
+                             label='Per breath')
                 axes[1].axhline(y=12, color='green', linestyle='--', alpha=0.7, label='Normal Range')
                 axes[1].axhline(y=20, color='green', linestyle='--', alpha=0.7)
-                axes[1].fill_between(times, 12, 20, alpha=0.1, color='green')
+                axes[1].fill_between(times[[0, -1]], 12, 20, alpha=0.1, color='green')
                 axes[1].set_title('Respiratory Rate Over Time', fontsize=14)
                 axes[1].set_ylabel('Breaths/min')
                 axes[1].grid(True, alpha=0.3)
@@ -246,9 +258,11 @@ class MedicalPlotGenerator:
             
             # Plot 3: Breathing pattern analysis
             # Calculate breathing cycle statistics
-            if rates:
+            if len(rates):
                 mean_rate = np.mean(rates)
                 std_rate = np.std(rates)
+                summary = breaths.summary()
+                ie_text = f", I:E {summary['ie_ratio']:.2f}" if 'ie_ratio' in summary else ''
                 
                 # Create histogram of breathing rates
                 axes[2].hist(rates, bins=15, color=self.colors['resp'], alpha=0.7, edgecolor='black')
@@ -257,7 +271,7 @@ class MedicalPlotGenerator:
                 axes[2].axvline(mean_rate - std_rate, color='orange', linestyle=':', alpha=0.7)
                 axes[2].axvline(mean_rate + std_rate, color='orange', linestyle=':', alpha=0.7, 
                                label=f'±1 SD: {std_rate:.1f}')
-                axes[2].set_title('Breathing Rate Distribution', fontsize=14)
+                axes[2].set_title(f'Breathing Rate Distribution ({breaths.breath_count} breaths{ie_text})', fontsize=14)
                 axes[2].set_xlabel('Breaths per minute')
                 axes[2].set_ylabel('Frequency')
                 axes[2].legend()
@@ -267,62 +281,53 @@ class MedicalPlotGenerator:
             axes[0].set_xlabel('Time (seconds)')
             axes[1].set_xlabel('Time (seconds)')
             
-            plt.tight_layout()
-            return self._fig_to_base64(fig)
+            fig.tight_layout()
+            return self._fig_to_png(fig)
             
         except Exception as e:
             print(f"Error generating respiratory pattern plot: {str(e)}")
-            return self._generate_error_plot("Respiratory Pattern", str(e))
+            return self._render_error_plot("Respiratory Pattern", str(e))
     
-    def generate_hrv_analysis_plot(self, dat_file_path: str, hea_file_path: str) -> str:
-        """Generate HRV analysis plot"""
+    def render_hrv_analysis_plot(self, dat_file_path: str, hea_file_path: str) -> bytes:
+        """Render HRV analysis plot as PNG bytes"""
         try:
-            # Load WFDB record
-            record_name = dat_file_path.replace('.dat', '')
-            record = wfdb.rdrecord(record_name)
-            
-            signals = record.p_signal
-            signal_names = record.sig_name
+            # Memory-map WFDB record
+            record = open_record(dat_file_path)
             fs = record.fs
             
-            # Find ECG signal
-            ecg_signal = None
-            for i, name in enumerate(signal_names):
-                if 'ECG' in name.upper() or 'II' in name.upper() or 'V' in name.upper():
-                    ecg_signal = signals[:, i]
-                    break
-            
-            if ecg_signal is None:
-                return self._generate_error_plot("HRV Analysis", "No ECG signal found")
+            # Find ECG signal (same lead the feature extraction uses)
+            ecg_idx = ecg_channel(record)
+            if ecg_idx is None:
+                return self._render_error_plot("HRV Analysis", "No ECG signal found")
             
-            # Simple R-peak detection (for demonstration)
-            # In practice, you'd use more sophisticated algorithms
-            from scipy.signal import find_peaks
+            # Decode the ECG channel only
+            ecg_signal = read_window(record, [ecg_idx]).signals[:, 0]
             
-            # Normalize signal
-            ecg_normalized = (ecg_signal - np.mean(ecg_signal)) / np.std(ecg_signal)
+            # Normalize signal (dropouts are NaN)
+            ecg_normalized = (ecg_signal - np.nanmean(ecg_signal)) / np.nanstd(ecg_signal)
             
-            # Find R-peaks
-            peaks, _ = find_peaks(ecg_normalized, height=1.5, distance=int(0.6*fs))
+            # R-peaks from the shared Pan-Tompkins detector (cached per record)
+            peaks = record_r_peaks(record, ecg_idx).r_peaks
             
             if len(peaks) < 10:
-                return self._generate_error_plot("HRV Analysis", "Insufficient R-peaks detected")
+                return self._render_error_plot("HRV Analysis", "Insufficient R-peaks detected")
             
             # Calculate RR intervals
             rr_intervals = np.diff(peaks) / fs * 1000  # in milliseconds
             
-            # Calculate HRV metrics
-            sdnn = np.std(rr_intervals)
-            rmssd = np.sqrt(np.mean(np.diff(rr_intervals)**2))
-            pnn50 = np.sum(np.abs(np.diff(rr_intervals)) > 50) / len(rr_intervals) * 100
+            # HRV metrics from the shared engine (same numbers the pipeline stores)
+            hrv = record_hrv(record, ecg_idx)
+            if hrv is None:
+                return self._render_error_plot("HRV Analysis", "Too few normal beats for HRV")
             
             # Create figure
-            fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+            fig = Figure(figsize=(15, 10))
+            axes = fig.subplots(2, 2)
             fig.suptitle('Heart Rate Variability Analysis', fontsize=16, y=0.95)
             
             # Plot 1: ECG with R-peaks
             time_ecg = np.arange(len(ecg_signal)) / fs
-            axes[0, 0].plot(time_ecg, ecg_normalized, color=self.colors['ecg'], linewidth=0.8, alpha=0.7)
+            self._plot_series(axes[0, 0], time_ecg, ecg_normalized, color=self.colors['ecg'], linewidth=0.8, alpha=0.7)
             axes[0, 0].plot(peaks/fs, ecg_normalized[peaks], 'ro', markersize=4, label='R-peaks')
             axes[0, 0].set_title('ECG with R-peak Detection', fontsize=14)
             axes[0, 0].set_xlabel('Time (seconds)')
@@ -332,7 +337,8 @@ class MedicalPlotGenerator:
             
             # Plot 2: RR interval tachogram
             time_rr = peaks[1:] / fs
-            axes[0, 1].plot(time_rr, rr_intervals, color=self.colors['hr'], linewidth=2, marker='o', markersize=3)
+            self._plot_series(axes[0, 1], time_rr, rr_intervals, color=self.colors['hr'], linewidth=2, marker='o', markersize=3,
+                              method='lttb')
             axes[0, 1].set_title('RR Interval Tachogram', fontsize=14)
             axes[0, 1].set_xlabel('Time (seconds)')
             axes[0, 1].set_ylabel('RR Interval (ms)')
@@ -349,12 +355,13 @@ class MedicalPlotGenerator:
             axes[1, 0].grid(True, alpha=0.3)
             
             # Plot 4: HRV metrics
-            metrics = ['SDNN', 'RMSSD', 'pNN50']
-            values = [sdnn, rmssd, pnn50]
-            colors = [self.colors['hr'], self.colors['resp'], self.colors['spo2']]
+            metrics = ['SDNN', 'RMSSD', 'pNN50', 'SD1', 'SD2']
+            values = [hrv.SDNN, hrv.RMSSD, hrv.pNN50, hrv.SD1, hrv.SD2]
+            colors = [self.colors['hr'], self.colors['resp'], self.colors['spo2'], self.colors['pulse'], self.colors['pleth']]
             
             bars = axes[1, 1].bar(metrics, values, color=colors, alpha=0.7, edgecolor='black')
-            axes[1, 1].set_title('HRV Metrics', fontsize=14)
+            lf_hf = f' (LF/HF {hrv.LF_HF_ratio:.2f})' if hrv.LF_HF_ratio is not None else ''
+            axes[1, 1].set_title(f'HRV Metrics{lf_hf}', fontsize=14)
             axes[1, 1].set_ylabel('Value')
             
             # Add value labels on bars
@@ -365,48 +372,36 @@ class MedicalPlotGenerator:
             
             axes[1, 1].grid(True, alpha=0.3)
             
-            plt.tight_layout()
-            return self._fig_to_base64(fig)
+            fig.tight_layout()
+            return self._fig_to_png(fig)
             
         except Exception as e:
             print(f"Error generating HRV analysis plot: {str(e)}")
-            return self._generate_error_plot("HRV Analysis", str(e))
+            return self._render_error_plot("HRV Analysis", str(e))
     
-    def generate_combined_dashboard_plot(self, dat_file_path: str, hea_file_path: str,
-                                       dat_normalized_path: str, hea_normalized_path: str) -> str:
-        """Generate combined dashboard plot with all vital signs"""
+    def render_combined_dashboard_plot(self, dat_file_path: str, hea_file_path: str,
+                                       dat_normalized_path: str, hea_normalized_path: str) -> bytes:
+        """Render combined dashboard plot with all vital signs as PNG bytes"""
         try:
             # Load both records
-            record_name = dat_file_path.replace('.dat', '')
-            record = wfdb.rdrecord(record_name)
-            
-            record_norm_name = dat_normalized_path.replace('.dat', '')
-            record_norm = wfdb.rdrecord(record_norm_name)
+            record = open_record(dat_file_path)
+            record_norm = load_record(dat_normalized_path)
             
             # Create figure
-            fig = plt.figure(figsize=(16, 12))
+            fig = Figure(figsize=(16, 12))
             gs = fig.add_gridspec(3, 3, height_ratios=[1, 1, 1], width_ratios=[2, 1, 1])
             
             fig.suptitle('Complete Vital Signs Dashboard', fontsize=18, y=0.95)
             
             # ECG waveform (large plot)
             ax1 = fig.add_subplot(gs[0, :])
-            signals = record.p_signal
-            signal_names = record.sig_name
-            fs = record.fs
             
-            # Show last 10 seconds of ECG
-            duration = min(10, len(signals) / fs)
-            start_sample = max(0, len(signals) - int(duration * fs))
-            time_vector = np.arange(start_sample, len(signals)) / fs
-            
-            # Plot first ECG signal
-            for i, name in enumerate(signal_names):
-                if 'ECG' in name.upper() or 'II' in name.upper() or 'V' in name.upper():
-                    signal_data = signals[start_sample:, i]
-                    ax1.plot(time_vector, signal_data, color=self.colors['ecg'], linewidth=1.5)
-                    ax1.set_title(f'ECG Waveform - {name} (Last {duration:.0f}s)', fontsize=14)
-                    break
+            # Plot last 10 seconds of the first ECG signal
+            ecg_idx = record.find_channel('ECG', 'II', 'V')
+            if ecg_idx is not None:
+                window = read_window(record, [ecg_idx], start_s=-10)
+                self._plot_series(ax1, window.time_vector(), window.signals[:, 0], color=self.colors['ecg'], linewidth=1.5)
+                ax1.set_title(f'ECG Waveform - {window.sig_name[0]} (Last {window.duration_seconds:.0f}s)', fontsize=14)
             
             ax1.set_xlabel('Time (seconds)')
             ax1.set_ylabel('Amplitude (mV)')
@@ -425,10 +420,10 @@ class MedicalPlotGenerator:
                     hr_data = hr_data[hr_data != -32768]
                     if len(hr_data) > 0:
                         time_hr = np.arange(len(hr_data)) / record_norm.fs / 60
-                        ax2.plot(time_hr, hr_data, color=self.colors['hr'], linewidth=2)
+                        self._plot_series(ax2, time_hr, hr_data, method='lttb', color=self.colors['hr'], linewidth=2)
                         ax2.axhline(y=60, color='green', linestyle='--', alpha=0.5)
                         ax2.axhline(y=100, color='green', linestyle='--', alpha=0.5)
-                        ax2.fill_between(time_hr, 60, 100, alpha=0.1, color='green')
+                        ax2.fill_between(time_hr[[0, -1]], 60, 100, alpha=0.1, color='green')
                     break
             ax2.set_title('Heart Rate', fontsize=12)
             ax2.set_ylabel('bpm')
@@ -444,10 +439,10 @@ class MedicalPlotGenerator:
                     resp_data = resp_data[resp_data != -32768]
                     if len(resp_data) > 0:
                         time_resp = np.arange(len(resp_data)) / record_norm.fs / 60
-                        ax3.plot(time_resp, resp_data, color=self.colors['resp'], linewidth=2)
+                        self._plot_series(ax3, time_resp, resp_data, method='lttb', color=self.colors['resp'], linewidth=2)
                         ax3.axhline(y=12, color='green', linestyle='--', alpha=0.5)
                         ax3.axhline(y=20, color='green', linestyle='--', alpha=0.5)
-                        ax3.fill_between(time_resp, 12, 20, alpha=0.1, color='green')
+                        ax3.fill_between(time_resp[[0, -1]], 12, 20, alpha=0.1, color='green')
                     break
             ax3.set_title('Respiratory Rate', fontsize=12)
             ax3.set_ylabel('breaths/min')
@@ -463,10 +458,10 @@ class MedicalPlotGenerator:
                     spo2_data = spo2_data[spo2_data != -32768]
                     if len(spo2_data) > 0:
                         time_spo2 = np.arange(len(spo2_data)) / record_norm.fs / 60
-                        ax4.plot(time_spo2, spo2_data, color=self.colors['spo2'], linewidth=2)
+                        self._plot_series(ax4, time_spo2, spo2_data, method='lttb', color=self.colors['spo2'], linewidth=2)
                         ax4.axhline(y=95, color='green', linestyle='--', alpha=0.5)
                         ax4.axhline(y=100, color='green', linestyle='--', alpha=0.5)
-                        ax4.fill_between(time_spo2, 95, 100, alpha=0.1, color='green')
+                        ax4.fill_between(time_spo2[[0, -1]], 95, 100, alpha=0.1, color='green')
                     break
             ax4.set_title('SpO2', fontsize=12)
             ax4.set_ylabel('%')
@@ -479,17 +474,14 @@ class MedicalPlotGenerator:
             # Calculate summary stats
             stats_text = "VITAL SIGNS SUMMARY\n\n"
             
+            norm_stats = column_stats(norm_signals, norm_signal_names, invalid_value=-32768)
             for i, name in enumerate(norm_signal_names):
                 if i < norm_signals.shape[1]:
-                    data = norm_signals[:, i]
-                    data = data[~np.isnan(data)]
-                    data = data[data != -32768]
-                    
-                    if len(data) > 0:
-                        mean_val = np.mean(data)
-                        std_val = np.std(data)
-                        min_val = np.min(data)
-                        max_val = np.max(data)
+                    if norm_stats.has_data(i):
+                        mean_val = norm_stats.mean[i]
+                        std_val = norm_stats.std[i]
+                        min_val = norm_stats.min[i]
+                        max_val = norm_stats.max[i]
                         
                         stats_text += f"{name}: Mean={mean_val:.1f}, SD={std_val:.1f}, Range=[{min_val:.1f}, {max_val:.1f}]\n"
             
@@ -500,25 +492,42 @@ class MedicalPlotGenerator:
             ax5.set_ylim(0, 1)
             ax5.axis('off')
             
-            plt.tight_layout()
-            return self._fig_to_base64(fig)
+            fig.tight_layout()
+            return self._fig_to_png(fig)
             
         except Exception as e:
             print(f"Error generating combined dashboard plot: {str(e)}")
-            return self._generate_error_plot("Combined Dashboard", str(e))
+            return self._render_error_plot("Combined Dashboard", str(e))
+    
+    def render_plot(self, plot_type: str, paths: Dict[str, str]) -> bytes:
+        """Render one plot type as PNG bytes from the session file paths it needs.
+        
+        Raises PlotRenderError (with the error PNG) when the plot could not be rendered, so
+        callers can show the error without mistaking it for a plot worth keeping.
+        """
+        if plot_type not in PLOT_REQUIREMENTS:
+            raise ValueError(f"Unknown plot type: {plot_type}")
+        renderer = getattr(self, f"render_{plot_type}_plot")
+        png = renderer(*(paths[field] for field in PLOT_REQUIREMENTS[plot_type]))
+        if isinstance(png, ErrorPlot):
+            raise PlotRenderError(f"{plot_type}: {png.message}", bytes(png))
+        return png
+    
+    def _plot_series(self, ax, x, y, *args, method: str = 'minmax', **kwargs):
+        """ax.plot of a series decimated to the axes' pixel width (min/max for waveforms, LTTB for trends)"""
+        x, y = downsample_for_axes(ax, x, y, self.dpi, method)
+        return ax.plot(x, y, *args, **kwargs)
     
-    def _fig_to_base64(self, fig) -> str:
-        """Convert matplotlib figure to base64 string"""
+    def _fig_to_png(self, fig) -> bytes:
+        """Encode a figure as PNG bytes"""
         buffer = BytesIO()
         fig.savefig(buffer, format='png', dpi=self.dpi, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close(fig)
-        return f"data:image/png;base64,{image_base64}"
+        return buffer.getvalue()
     
-    def _generate_error_plot(self, plot_type: str, error_message: str) -> str:
-        """Generate an error plot when data processing fails"""
-        fig, ax = plt.subplots(figsize=(10, 6))
+    def _render_error_plot(self, plot_type: str, error_message: str) -> ErrorPlot:
+        """Render an error plot when data processing fails"""
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, f"Error generating {plot_type}\n\n{error_message}", 
                 horizontalalignment='center', verticalalignment='center',
                 transform=ax.transAxes, fontsize=14, 
@@ -527,8 +536,10 @@ class MedicalPlotGenerator:
         ax.set_ylim(0, 1)
         ax.axis('off')
         ax.set_title(f"{plot_type} - Error", fontsize=16)
-        plt.tight_layout()
-        return self._fig_to_base64(fig)
+        fig.tight_layout()
+        png = ErrorPlot(self._fig_to_png(fig))
+        png.message = error_message
+        return png
 
 # Global instance
 plot_generator = MedicalPlotGenerator() 
\ No newline at end of file
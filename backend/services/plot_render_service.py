@@ -0,0 +1,270 @@
+"""
+Plot Render Service
+Renders specialist plots in a pool of warm worker processes (matplotlib and seaborn
+imported once per worker) so CPU-bound rendering never runs on the API's event loop
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+from services.job_queue import QueueFullError
+from services.plot_generation import PlotRenderError
+
+WORKER_STARTUP_TIMEOUT_S = 120.0  # Spawned workers import matplotlib, seaborn and scipy
+STOP_POLL_S = 0.5  # Blocked renders re-check for shutdown at this interval
+
+class RenderTimeoutError(Exception):
+    """Raised when a plot takes longer than the configured render timeout"""
+
+def _worker_main(conn):
+    """Worker process loop: import the renderer once, then render requests until told to stop"""
+    from services.feature_store import load_session_features
+    from services.plot_generation import plot_generator
+
+    conn.send(('ready', os.getpid()))
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if request is None:
+            return
+        plot_type, paths, session_paths = request
+        started = time.perf_counter()
+        try:
+            if session_paths:
+                # Seed this process's beat/breath caches from the feature store (hashes are memoized)
+                load_session_features(SimpleNamespace(**session_paths))
+            png = plot_generator.render_plot(plot_type, paths)
+            conn.send(('ok', png, time.perf_counter() - started))
+        except PlotRenderError as e:
+            conn.send(('failed', e.png, str(e), time.perf_counter() - started))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}", time.perf_counter() - started))
+
+class RenderWorker:
+    """One spawned renderer process and the pipe it takes requests on"""
+
+    def __init__(self, context, index: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,),
+                                       name=f"plot-renderer-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def poll_ready(self, timeout: float) -> bool:
+        """True once the worker has imported the renderer, waiting up to timeout for it"""
+        if self.ready:
+            return True
+        if not self.conn.poll(timeout):
+            return False
+        message = self.conn.recv()
+        if message[0] != 'ready':
+            raise RuntimeError(f"{self.process.name} sent {message[0]!r} before ready")
+        self.ready = True
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class PlotRenderService:
+    """Bounded request queue in front of a fixed pool of spawned renderer processes.
+
+    Each render checks out an idle worker, so at most worker_count plots render at once
+    and up to max_queue_depth more wait for a worker; beyond that QueueFullError is raised
+    (503 at the API). A render that exceeds timeout_s has its worker killed and replaced.
+    With worker_count 0 plots render in the calling thread, one at a time.
+    """
+
+    def __init__(self, worker_count: int = 2, max_queue_depth: int = 10, timeout_s: float = 60.0):
+        self.worker_count = max(0, worker_count)
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.timeout_s = timeout_s
+        self._context = multiprocessing.get_context('spawn')  # Fresh interpreters, no forked locks
+        self._idle: "queue.Queue[RenderWorker]" = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._inline_lock = threading.Lock()
+        self._pending = 0
+        self._spawned = 0
+        self._stopping = False
+        self._counts = {'rendered': 0, 'failed': 0, 'timed_out': 0, 'rejected': 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Spawn the worker processes (idempotent); they warm up in the background"""
+        if self.worker_count == 0:
+            return
+        with self._lock:
+            self._stopping = False
+            if self.running:
+                return
+            self._workers = [self._spawn() for _ in range(self.worker_count)]
+            for worker in self._workers:
+                self._idle.put(worker)
+        print(f"✅ Plot render service started ({self.worker_count} worker processes, "
+              f"depth {self.max_queue_depth}, timeout {self.timeout_s:g}s)")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers; renders still waiting fail instead of respawning or restarting them"""
+        with self._lock:
+            self._stopping = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop(timeout)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def _spawn(self) -> RenderWorker:
+        self._spawned += 1
+        return RenderWorker(self._context, self._spawned)
+
+    def _replace(self, worker: RenderWorker) -> Optional[RenderWorker]:
+        """Kill a worker and spawn its replacement (none once the service is stopping)"""
+        worker.kill()
+        with self._lock:
+            if self._stopping:
+                return None
+            replacement = self._spawn()
+            self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    def _checkout(self) -> RenderWorker:
+        while True:
+            if self._stopping:
+                raise RuntimeError("Plot render service is stopped")
+            try:
+                return self._idle.get(timeout=STOP_POLL_S)
+            except queue.Empty:
+                continue
+
+    def _release(self, worker: Optional[RenderWorker]):
+        # Workers from before a stop() are not returned, even if the service was started again
+        with self._lock:
+            if worker is not None and not self._stopping and worker in self._workers:
+                self._idle.put(worker)
+
+    def _wait(self, poll, timeout: float, timeout_message: str):
+        """Call poll with short timeouts until it succeeds, the timeout expires or the service stops"""
+        deadline = time.monotonic() + timeout
+        while not poll(max(0.0, min(STOP_POLL_S, deadline - time.monotonic()))):
+            if self._stopping:
+                raise RuntimeError("Plot render service is stopped")
+            if time.monotonic() >= deadline:
+                raise RenderTimeoutError(timeout_message)
+
+    def render(self, plot_type: str, paths: Dict[str, str],
+               session_paths: Optional[Dict[str, str]] = None, wait: bool = False) -> Tuple[bytes, float]:
+        """Render a plot; returns (png, render seconds). Failed plots raise PlotRenderError.
+
+        session_paths (AnalysisSession file attributes) let the renderer prime its caches from
+        the feature store. Background callers pass wait=True to queue past the depth limit.
+        """
+        with self._lock:
+            if not wait and self._pending >= self.worker_count + self.max_queue_depth:
+                self._counts['rejected'] += 1
+                raise QueueFullError(f"Plot render queue is full ({self._pending} plots pending)")
+            self._pending += 1
+        try:
+            if self.worker_count == 0:
+                return self._render_inline(plot_type, paths, session_paths)
+            return self._render_in_worker(plot_type, paths, session_paths)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _render_inline(self, plot_type: str, paths: Dict[str, str],
+                       session_paths: Optional[Dict[str, str]]) -> Tuple[bytes, float]:
+        from services.feature_store import load_session_features
+        from services.plot_generation import plot_generator
+
+        with self._inline_lock:
+            started = time.perf_counter()
+            try:
+                if session_paths:
+                    # Same priming as a worker, in the calling (threadpool) thread
+                    load_session_features(SimpleNamespace(**session_paths))
+                png = plot_generator.render_plot(plot_type, paths)
+            except Exception:
+                self._count('failed')
+                raise
+        self._count('rendered')
+        return png, time.perf_counter() - started
+
+    def _render_in_worker(self, plot_type: str, paths: Dict[str, str],
+                          session_paths: Optional[Dict[str, str]]) -> Tuple[bytes, float]:
+        if not self.running and not self._stopping:
+            self.start()
+        worker = self._checkout()
+        try:
+            self._wait(worker.poll_ready, WORKER_STARTUP_TIMEOUT_S,
+                       f"{worker.process.name} did not start within {WORKER_STARTUP_TIMEOUT_S:.0f}s")
+            worker.conn.send((plot_type, paths, session_paths))
+            self._wait(worker.conn.poll, self.timeout_s, f"Rendering {plot_type} exceeded {self.timeout_s:g}s")
+            status, *result = worker.conn.recv()
+        except RenderTimeoutError:
+            self._count('timed_out')
+            print(f"⏱️ {worker.process.name} timed out on {plot_type}; restarting it")
+            worker = self._replace(worker)
+            raise
+        except (EOFError, OSError) as e:
+            self._count('failed')
+            print(f"❌ {worker.process.name} died while rendering {plot_type}; restarting it")
+            worker = self._replace(worker)
+            raise RuntimeError(f"Renderer process exited while rendering {plot_type}") from e
+        finally:
+            self._release(worker)
+
+        if status != 'ok':
+            self._count('failed')
+            if status == 'failed':
+                raise PlotRenderError(result[1], result[0])
+            raise RuntimeError(result[0])
+        self._count('rendered')
+        return result[0], result[1]
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.worker_count,
+                "running": self.running or self.worker_count == 0,
+                "pending": self._pending,
+                "idle_workers": self._idle.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "timeout_s": self.timeout_s,
+                "plots": dict(self._counts)
+            }
+
+# Global instance
+plot_render_service = PlotRenderService(
+    worker_count=settings.plot_render_workers,
+    max_queue_depth=settings.plot_render_queue_depth,
+    timeout_s=settings.plot_render_timeout_s
+)
@@ -0,0 +1,148 @@
+"""
+Session Plot Store
+Pre-rendered specialist plots saved as PNG files next to an uploaded session with a JSON
+manifest, so plot endpoints serve files instead of re-rendering on every page view
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from services.feature_store import SESSION_FILE_FIELDS, feature_store, session_files
+from services.plot_generation import PLOT_REQUIREMENTS
+from services.plot_render_service import plot_render_service
+
+# Bump when plot rendering changes so stored plots are re-rendered
+PLOT_RENDERER_VERSION = "plots-2"
+PLOT_STORE_DIRNAME = "plots"
+MANIFEST_FILENAME = "manifest.json"
+
+def available_plot_types(analysis_session) -> List[str]:
+    """Plot types whose input files all exist for the session"""
+    return [
+        plot_type for plot_type, fields in PLOT_REQUIREMENTS.items()
+        if all(getattr(analysis_session, field, None) and os.path.exists(getattr(analysis_session, field))
+               for field in fields)
+    ]
+
+class PlotStore:
+    """PNG files plus manifest.json in <session_dir>/plots.
+
+    The manifest records the renderer version and the BLAKE2 hashes of the session files
+    the plots were rendered from; a mismatch makes every stored plot a miss. Each entry
+    also carries the PNG's own hash, size and render time.
+    """
+
+    def __init__(self, dirname: str = PLOT_STORE_DIRNAME):
+        self.dirname = dirname
+        self._lock = threading.Lock()
+
+    def directory(self, analysis_session) -> str:
+        return os.path.join(os.path.dirname(analysis_session.dat_file_path), self.dirname)
+
+    def _fingerprint(self, analysis_session) -> Dict[str, str]:
+        return feature_store.fingerprint(session_files(analysis_session))
+
+    def manifest(self, analysis_session) -> Optional[Dict[str, Any]]:
+        """The session's manifest when it matches the current files and renderer, else None"""
+        path = os.path.join(self.directory(analysis_session), MANIFEST_FILENAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable plot manifest {path}: {e}")
+            return None
+        if manifest.get('renderer_version') != PLOT_RENDERER_VERSION:
+            return None
+        if manifest.get('file_hashes') != self._fingerprint(analysis_session):
+            return None
+        return manifest
+
+    def entry(self, analysis_session, plot_type: str) -> Optional[Dict[str, Any]]:
+        """Manifest entry of a stored plot whose PNG is present, else None"""
+        manifest = self.manifest(analysis_session)
+        entry = (manifest or {}).get('plots', {}).get(plot_type)
+        if entry is None or not os.path.exists(self.file_path(analysis_session, plot_type)):
+            return None
+        return entry
+
+    def file_path(self, analysis_session, plot_type: str) -> str:
+        return os.path.join(self.directory(analysis_session), f"{plot_type}.png")
+
+    def get(self, analysis_session, plot_type: str) -> Optional[bytes]:
+        if self.entry(analysis_session, plot_type) is None:
+            return None
+        with open(self.file_path(analysis_session, plot_type), 'rb') as f:
+            return f.read()
+
+    def put(self, analysis_session, plot_type: str, png: bytes, render_seconds: float = 0.0) -> Dict[str, Any]:
+        """Write a PNG and record it in the manifest (starting a new manifest if files changed)"""
+        directory = self.directory(analysis_session)
+        os.makedirs(directory, exist_ok=True)
+        path = self.file_path(analysis_session, plot_type)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(png)
+        os.replace(path + '.tmp', path)
+
+        entry = {
+            'file': os.path.basename(path),
+            'bytes': len(png),
+            'hash': hashlib.blake2b(png, digest_size=16).hexdigest(),
+            'rendered_at': datetime.now().isoformat(),
+            'render_seconds': round(render_seconds, 3)
+        }
+        with self._lock:
+            manifest = self.manifest(analysis_session) or {
+                'renderer_version': PLOT_RENDERER_VERSION,
+                'file_hashes': self._fingerprint(analysis_session),
+                'plots': {}
+            }
+            manifest['plots'][plot_type] = entry
+            manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        return entry
+
+    def render(self, analysis_session, plot_type: str, wait: bool = False) -> bytes:
+        """Render a plot in the render service and store it for later requests.
+        
+        A failed render raises PlotRenderError and is not stored, so the next request retries it.
+        """
+        paths = {field: getattr(analysis_session, field) for field in PLOT_REQUIREMENTS[plot_type]}
+        session_paths = {field: getattr(analysis_session, field, None) for field in SESSION_FILE_FIELDS.values()}
+        png, render_seconds = plot_render_service.render(plot_type, paths, session_paths, wait=wait)
+        if settings.plot_store_enabled:
+            self.put(analysis_session, plot_type, png, render_seconds)
+        return png
+
+    def get_or_render(self, analysis_session, plot_type: str) -> bytes:
+        """Stored PNG for the plot, rendering it only on a miss"""
+        if settings.plot_store_enabled:
+            png = self.get(analysis_session, plot_type)
+            if png is not None:
+                return png
+        return self.render(analysis_session, plot_type)
+
+    def render_all(self, analysis_session) -> Dict[str, Any]:
+        """Render every available plot that is not already stored; returns the manifest entries"""
+        rendered = {}
+        for plot_type in available_plot_types(analysis_session):
+            if self.entry(analysis_session, plot_type) is not None:
+                continue
+            try:
+                self.render(analysis_session, plot_type, wait=True)
+                rendered[plot_type] = self.entry(analysis_session, plot_type)
+                print(f"✅ Pre-rendered {plot_type} plot")
+            except Exception as e:
+                print(f"❌ Error pre-rendering {plot_type} plot: {str(e)}")
+        return rendered
+
+# Global instance
+plot_store = PlotStore()
@@ -0,0 +1,402 @@
+"""
+QRS Detection
+Pan-Tompkins style R-peak detection: a vectorized batch detector, a streaming detector, and a
+per-record cache so feature extraction and the HRV plot share one detection pass
+"""
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import butter, find_peaks, sosfilt, sosfiltfilt
+
+from services.wfdb_reader import MappedRecord, open_record, read_window, record_signature
+
+# Bump when detection output changes so cached/stored beats are recomputed
+QRS_DETECTOR_VERSION = "pan-tompkins-1"
+
+BANDPASS_HZ = (5.0, 15.0)
+INTEGRATION_WINDOW_S = 0.150
+REFRACTORY_S = 0.200  # Allows rates up to 300 bpm
+T_WAVE_WINDOW_S = 0.360  # Beats this close to the previous one must have comparable slope
+SEARCH_BACK_RR = 1.66  # Gap (in mean RR) after which a missed beat is searched for
+R_SEARCH_S = 0.100  # Half-width of the window used to place the R peak on the band-passed ECG
+THRESHOLD_NEIGHBOURS = 8  # Candidates on each side used for the local signal level
+THRESHOLD_FRACTION = 0.3
+
+# Long records are detected in chunks so memory stays bounded
+RECORD_CHUNK_S = 600
+RECORD_CHUNK_OVERLAP_S = 10
+
+def _bandpass_sos(fs: float) -> np.ndarray:
+    low, high = BANDPASS_HZ
+    return butter(2, [low, min(high, 0.45 * fs)], btype='bandpass', fs=fs, output='sos')
+
+def _derivative_kernel(fs: float) -> np.ndarray:
+    # Five-point derivative from the original Pan-Tompkins paper
+    return np.array([1.0, 2.0, 0.0, -2.0, -1.0]) * fs / 8.0
+
+def _integration_width(fs: float) -> int:
+    return max(1, int(round(INTEGRATION_WINDOW_S * fs)))
+
+def _fill_gaps(ecg: np.ndarray) -> np.ndarray:
+    """Center the signal and replace dropouts (NaN) with the baseline so filters stay finite"""
+    ecg = np.asarray(ecg, dtype=np.float64)
+    valid = ~np.isnan(ecg)
+    if valid.all():
+        return ecg - ecg.mean()
+    if not valid.any():
+        return np.zeros_like(ecg)
+    return np.where(valid, ecg - ecg[valid].mean(), 0.0)
+
+def pan_tompkins_stages(ecg: np.ndarray, fs: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Zero-phase band-pass, derivative and moving-window integration of a whole ECG segment"""
+    bandpassed = sosfiltfilt(_bandpass_sos(fs), _fill_gaps(ecg))
+    slope = np.convolve(bandpassed, _derivative_kernel(fs), mode='same')
+    width = _integration_width(fs)
+    integrated = np.convolve(slope * slope, np.full(width, 1.0 / width), mode='same')
+    return bandpassed, slope, integrated
+
+def _window_max(values: np.ndarray, centers: np.ndarray, before: int, after: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Max and argmax (absolute index) of values in [c - before, c + after] for every center c"""
+    padded = np.pad(values, (before, after), constant_values=-np.inf)
+    windows = sliding_window_view(padded, before + after + 1)[centers]
+    offsets = windows.argmax(axis=1)
+    return windows[np.arange(len(centers)), offsets], centers - before + offsets
+
+def detect_qrs(ecg: np.ndarray, fs: float) -> np.ndarray:
+    """Return R-peak sample indices for an ECG segment.
+
+    Pan-Tompkins pre-processing, then a vectorized stand-in for its adaptive thresholds:
+    each integrated-signal candidate is compared with the local signal level (90th
+    percentile of neighbouring candidates), T waves are rejected by slope, and long RR
+    gaps are searched back at half threshold.
+    """
+    ecg = np.asarray(ecg, dtype=np.float64)
+    if len(ecg) < max(int(fs), 16):
+        return np.empty(0, dtype=np.int64)
+
+    bandpassed, slope, integrated = pan_tompkins_stages(ecg, fs)
+    refractory = max(1, int(REFRACTORY_S * fs))
+    candidates, _ = find_peaks(integrated, distance=refractory)
+    if len(candidates) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    heights = integrated[candidates]
+    k = THRESHOLD_NEIGHBOURS
+    neighbourhoods = sliding_window_view(np.pad(heights, k, mode='reflect' if len(heights) > k else 'edge'), 2 * k + 1)
+    threshold = THRESHOLD_FRACTION * np.percentile(neighbourhoods, 90, axis=1)
+    accepted = heights > threshold
+
+    # T-wave discrimination: a beat soon after the previous one needs at least half its slope
+    width = _integration_width(fs)
+    max_slope, _ = _window_max(np.abs(slope), candidates, width, 0)
+    beats = np.flatnonzero(accepted)
+    if len(beats) > 1:
+        close = np.diff(candidates[beats]) < T_WAVE_WINDOW_S * fs
+        shallow = max_slope[beats[1:]] < 0.5 * max_slope[beats[:-1]]
+        accepted[beats[1:][close & shallow]] = False
+        beats = np.flatnonzero(accepted)
+
+    # Search back through long gaps for the strongest candidate above half threshold
+    if len(beats) > 2:
+        rr = np.diff(candidates[beats])
+        recent = np.pad(rr, (min(7, len(rr) - 1), 0), mode='edge')
+        mean_rr = sliding_window_view(recent, min(8, len(rr)))[:len(rr)].mean(axis=1)
+        for gap in np.flatnonzero(rr > SEARCH_BACK_RR * mean_rr):
+            start, end = candidates[beats[gap]] + refractory, candidates[beats[gap + 1]] - refractory
+            inside = np.flatnonzero((candidates > start) & (candidates < end) & ~accepted
+                                    & (heights > 0.5 * threshold))
+            if len(inside):
+                accepted[inside[np.argmax(heights[inside])]] = True
+
+    # Place each beat on the largest band-passed deflection around the integrated peak
+    search = max(1, int(R_SEARCH_S * fs))
+    _, r_peaks = _window_max(np.abs(bandpassed), candidates[accepted], search, search)
+    r_peaks = np.clip(r_peaks, 0, len(ecg) - 1)
+    return _enforce_refractory(np.unique(r_peaks), refractory)
+
+def _enforce_refractory(r_peaks: np.ndarray, refractory: int) -> np.ndarray:
+    if len(r_peaks) < 2:
+        return r_peaks.astype(np.int64)
+    keep = np.ones(len(r_peaks), dtype=bool)
+    keep[1:] = np.diff(r_peaks) >= refractory
+    return r_peaks[keep].astype(np.int64)
+
+class StreamingQRSDetector:
+    """Causal Pan-Tompkins detector for ECG arriving in chunks, with bounded memory.
+
+    Feed samples with process(); it returns the absolute sample indices of beats confirmed
+    by that chunk. Beats are reported up to REFRACTORY_S after they occur, and flush()
+    confirms whatever is still pending at the end of a stream. Classic SPKI/NPKI running
+    thresholds, T-wave rejection and search-back are applied per candidate.
+    """
+
+    LEARNING_S = 2.0
+
+    def __init__(self, fs: float):
+        self.fs = fs
+        self._sos = _bandpass_sos(fs)
+        self._zi = np.zeros((self._sos.shape[0], 2))
+        self._kernel = _derivative_kernel(fs)
+        self._width = _integration_width(fs)
+        self._refractory = max(1, int(REFRACTORY_S * fs))
+        self._history = int(max(self.LEARNING_S, 2 * R_SEARCH_S + 3 * REFRACTORY_S) * fs)
+
+        # Rolling buffers; _offset is the absolute index of their first sample
+        self._raw = np.empty(0)
+        self._bandpassed = np.empty(0)
+        self._integrated = np.empty(0)
+        self._offset = 0
+        self._bp_tail = np.zeros(len(self._kernel) - 1)
+        self._sq_tail = np.zeros(self._width - 1)
+        self._baseline = None
+        self._next_candidate = 0
+
+        self.spki = None
+        self.npki = 0.0
+        self._last_beat: Optional[int] = None
+        self._last_slope = 0.0
+        self._rr = deque(maxlen=8)
+        self._noise_candidates = deque(maxlen=16)
+        self.beat_count = 0
+
+    @property
+    def samples_seen(self) -> int:
+        return self._offset + len(self._raw)
+
+    @property
+    def threshold(self) -> float:
+        return self.npki + 0.25 * ((self.spki or 0.0) - self.npki)
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if len(chunk) == 0:
+            return np.empty(0, dtype=np.int64)
+        if self._baseline is None:
+            finite = chunk[~np.isnan(chunk)]
+            self._baseline = float(finite.mean()) if len(finite) else 0.0
+        chunk = np.where(np.isnan(chunk), self._baseline, chunk)
+
+        bandpassed, self._zi = sosfilt(self._sos, chunk, zi=self._zi)
+        extended = np.concatenate([self._bp_tail, bandpassed])
+        slope = np.convolve(extended, self._kernel, mode='valid')
+        self._bp_tail = extended[-(len(self._kernel) - 1):]
+        squared = np.concatenate([self._sq_tail, slope * slope])
+        integrated = np.convolve(squared, np.full(self._width, 1.0 / self._width), mode='valid')
+        self._sq_tail = squared[-(self._width - 1):] if self._width > 1 else np.empty(0)
+
+        self._raw = np.concatenate([self._raw, chunk])
+        self._bandpassed = np.concatenate([self._bandpassed, bandpassed])
+        self._integrated = np.concatenate([self._integrated, integrated])
+
+        if self.spki is None:
+            if self.samples_seen < self.LEARNING_S * self.fs:
+                return np.empty(0, dtype=np.int64)
+            self.spki = 0.25 * float(self._integrated.max())
+            self.npki = 0.5 * float(self._integrated.mean())
+
+        beats = self._scan(self.samples_seen - self._refractory)
+        self._trim()
+        return beats
+
+    def flush(self) -> np.ndarray:
+        """Confirm pending candidates at the end of the stream"""
+        if self.spki is None and len(self._integrated):
+            self.spki = 0.25 * float(self._integrated.max())
+            self.npki = 0.5 * float(self._integrated.mean())
+        return self._scan(self.samples_seen)
+
+    def _scan(self, until: int) -> np.ndarray:
+        """Classify integrated-signal peaks in [_next_candidate, until)"""
+        peaks, _ = find_peaks(self._integrated, distance=self._refractory)
+        peaks = peaks + self._offset
+        peaks = peaks[(peaks >= self._next_candidate) & (peaks < until)]
+        self._next_candidate = max(self._next_candidate, until)
+
+        beats: List[int] = []
+        for peak in peaks:
+            height = float(self._integrated[peak - self._offset])
+            slope = self._max_slope(peak)
+            if self._last_beat is not None and peak - self._last_beat < self._refractory:
+                continue
+
+            if height > self.threshold:
+                is_t_wave = (
+                    self._last_beat is not None
+                    and peak - self._last_beat < T_WAVE_WINDOW_S * self.fs
+                    and slope < 0.5 * self._last_slope
+                )
+                if is_t_wave:
+                    self.npki = 0.125 * height + 0.875 * self.npki
+                    continue
+                self.spki = 0.125 * height + 0.875 * self.spki
+                beats.append(self._accept(peak, slope))
+            else:
+                self.npki = 0.125 * height + 0.875 * self.npki
+                self._noise_candidates.append((peak, height, slope))
+                missed = self._search_back(peak)
+                if missed is not None:
+                    beats.append(missed)
+        return np.array(beats, dtype=np.int64)
+
+    def _search_back(self, now: int) -> Optional[int]:
+        if self._last_beat is None or len(self._rr) < 2:
+            return None
+        mean_rr = float(np.mean(self._rr))
+        if now - self._last_beat <= SEARCH_BACK_RR * mean_rr:
+            return None
+        half = 0.5 * self.threshold
+        options = [c for c in self._noise_candidates
+                   if c[0] - self._last_beat >= self._refractory and c[1] > half]
+        self._noise_candidates.clear()
+        if not options:
+            return None
+        peak, height, slope = max(options, key=lambda c: c[1])
+        self.spki = 0.25 * height + 0.75 * self.spki
+        return self._accept(peak, slope)
+
+    def _accept(self, peak: int, slope: float) -> int:
+        if self._last_beat is not None:
+            self._rr.append(peak - self._last_beat)
+        self._last_beat = peak
+        self._last_slope = slope
+        self._noise_candidates.clear()
+        self.beat_count += 1
+        return self._locate_r_peak(peak)
+
+    def _max_slope(self, peak: int) -> float:
+        local = peak - self._offset
+        segment = self._bandpassed[max(0, local - self._width):local + 1]
+        return float(np.abs(np.diff(segment)).max() * self.fs) if len(segment) > 1 else 0.0
+
+    def _locate_r_peak(self, peak: int) -> int:
+        # The causal integrator peaks at the end of the QRS; look back for the largest deflection
+        local = peak - self._offset
+        start = max(0, local - self._width - int(R_SEARCH_S * self.fs))
+        segment = self._raw[start:local + 1]
+        if len(segment) == 0:
+            return peak
+        deviation = np.abs(segment - np.median(segment))
+        return self._offset + start + int(deviation.argmax())
+
+    def _trim(self):
+        excess = len(self._raw) - self._history
+        if excess > 0:
+            self._raw = self._raw[excess:]
+            self._bandpassed = self._bandpassed[excess:]
+            self._integrated = self._integrated[excess:]
+            self._offset += excess
+
+@dataclass(frozen=True)
+class RPeaks:
+    """R-peak sample indices (read-only) detected on one channel of a record"""
+
+    r_peaks: np.ndarray
+    fs: float
+    channel: str
+    detector_version: str = QRS_DETECTOR_VERSION
+
+    def between(self, start_sample: int, end_sample: int) -> np.ndarray:
+        """Beats with start_sample <= index < end_sample"""
+        lo, hi = np.searchsorted(self.r_peaks, [start_sample, end_sample])
+        return self.r_peaks[lo:hi]
+
+    def rr_intervals_ms(self, start_sample: int = 0, end_sample: Optional[int] = None) -> np.ndarray:
+        peaks = self.r_peaks if end_sample is None else self.between(start_sample, end_sample)
+        return np.diff(peaks) / self.fs * 1000
+
+def ecg_channel(record: MappedRecord) -> Optional[int]:
+    """Preferred ECG lead: lead II, then any channel labelled ECG, then V"""
+    names = [name.strip().rstrip(',').upper() for name in record.sig_name]
+    if 'II' in names:
+        return names.index('II')
+    return record.find_channel('ECG', 'II', 'V')
+
+def _detect_span(record: MappedRecord, channel: int, start_sample: int, end_sample: int) -> np.ndarray:
+    """Beats in [start_sample, end_sample), detected with RECORD_CHUNK_OVERLAP_S of context on each side"""
+    fs = record.fs
+    overlap = int(RECORD_CHUNK_OVERLAP_S * fs)
+    read_start = max(0, start_sample - overlap)
+    window = read_window(record, [channel], read_start / fs, min(end_sample + overlap, record.sig_len) / fs)
+    peaks = detect_qrs(window.signals[:, 0], fs) + window.start_sample
+    return peaks[(peaks >= start_sample) & (peaks < end_sample)]
+
+def detect_window_qrs(record: MappedRecord, channel: int, start_s: float = 0.0,
+                      end_s: Optional[float] = None) -> np.ndarray:
+    """Detect beats in a record window only (negative times count from the end); not cached"""
+    start, end = record.sample_range(start_s, end_s)
+    return _enforce_refractory(_detect_span(record, channel, start, end), max(1, int(REFRACTORY_S * record.fs)))
+
+def detect_record_qrs(record: MappedRecord, channel: int) -> np.ndarray:
+    """Detect beats over a whole record channel in overlapping chunks"""
+    chunk = int(RECORD_CHUNK_S * record.fs)
+    parts = [_detect_span(record, channel, core_start, min(core_start + chunk, record.sig_len))
+             for core_start in range(0, record.sig_len, chunk)]
+    peaks = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    return _enforce_refractory(peaks, max(1, int(REFRACTORY_S * record.fs)))
+
+class QRSCache:
+    """LRU of detected beats keyed by record version, channel and detector version"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, RPeaks]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, record: Union[str, MappedRecord], channel: Optional[int] = None) -> Optional[RPeaks]:
+        if not isinstance(record, MappedRecord):
+            record = open_record(record)
+        if channel is None:
+            channel = ecg_channel(record)
+            if channel is None:
+                return None
+        key = record_signature(record.base_path) + (channel, QRS_DETECTOR_VERSION)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                cached = self._entries.get(key)
+                if cached is not None:
+                    return cached
+            try:
+                peaks = detect_record_qrs(record, channel)
+                peaks.setflags(write=False)
+                result = RPeaks(r_peaks=peaks, fs=record.fs, channel=record.sig_name[channel])
+                with self._lock:
+                    self._entries[key] = result
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return result
+
+    def put(self, record: Union[str, MappedRecord], channel: int, r_peaks: RPeaks):
+        """Seed the cache with beats detected earlier (e.g. loaded from the feature store)"""
+        if not isinstance(record, MappedRecord):
+            record = open_record(record)
+        if r_peaks.detector_version != QRS_DETECTOR_VERSION:
+            return
+        key = record_signature(record.base_path) + (channel, QRS_DETECTOR_VERSION)
+        with self._lock:
+            self._entries[key] = r_peaks
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Global instance
+qrs_cache = QRSCache()
+
+def record_r_peaks(record: Union[str, MappedRecord], channel: Optional[int] = None) -> Optional[RPeaks]:
+    """R peaks for a record channel (default: preferred ECG lead), detected once per record version"""
+    return qrs_cache.get(record, channel)
@@ -0,0 +1,145 @@
+"""
+WFDB Record Loader
+Process-wide LRU cache of parsed WFDB records so extraction and plotting share one read per file
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.wfdb_reader import open_record, record_base_path, record_signature
+
+@dataclass(frozen=True)
+class LoadedRecord:
+    """Immutable view of a WFDB record; p_signal is shared between callers and read-only"""
+
+    record_name: str
+    fs: float
+    sig_name: Tuple[str, ...]
+    units: Tuple[str, ...]
+    p_signal: np.ndarray
+
+    @property
+    def sig_len(self) -> int:
+        return self.p_signal.shape[0]
+
+    @property
+    def n_sig(self) -> int:
+        return len(self.sig_name)
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.sig_len / self.fs if self.fs else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        return self.p_signal.nbytes
+
+class RecordCache:
+    """LRU cache of parsed records keyed by path plus the mtime and size of the .hea and .dat files.
+
+    A re-uploaded record gets a new key, so stale entries are never served; they simply
+    age out. Concurrent requests for the same record wait for a single parse.
+    """
+
+    def __init__(self, max_entries: int = 16, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[tuple, LoadedRecord]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[tuple, threading.Lock] = {}
+
+    def load(self, path: str) -> LoadedRecord:
+        """Return the parsed record at path (with or without .dat/.hea), reading it at most once"""
+        base = record_base_path(path)
+        key = record_signature(base)
+
+        with self._lock:
+            record = self._lookup(key)
+            if record is not None:
+                return record
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                record = self._lookup(key)
+                if record is not None:
+                    return record
+                self.misses += 1
+            try:
+                record = self._read(base)
+                self._store(key, record)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return record
+
+    def _lookup(self, key: tuple) -> Optional[LoadedRecord]:
+        record = self._entries.get(key)
+        if record is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return record
+
+    def _read(self, base: str) -> LoadedRecord:
+        mapped = open_record(base)
+        p_signal = mapped.read()
+        p_signal.setflags(write=False)
+        return LoadedRecord(
+            record_name=mapped.record_name,
+            fs=mapped.fs,
+            sig_name=mapped.sig_name,
+            units=mapped.units,
+            p_signal=p_signal
+        )
+
+    def _store(self, key: tuple, record: LoadedRecord):
+        if self.max_bytes is not None and record.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = record
+            self._bytes += record.nbytes
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+# Global instance
+record_cache = RecordCache(
+    max_entries=settings.record_cache_max_entries,
+    max_bytes=settings.record_cache_max_mb * 1024 * 1024 if settings.record_cache_max_mb else None
+)
+
+def load_record(path: str) -> LoadedRecord:
+    """Load a WFDB record through the process-wide cache"""
+    return record_cache.load(path)
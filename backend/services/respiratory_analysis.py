@@ -0,0 +1,218 @@
+"""
+Respiratory Analysis
+Breath detection on the impedance RESP waveform with per-breath duration, I:E ratio and
+amplitude, cached per record window so feature extraction and the respiratory plot share it
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+from scipy.signal import butter, find_peaks, sosfiltfilt
+from scipy.stats import skew
+
+from services.wfdb_reader import MappedRecord, open_record, read_window, record_signature
+
+# Bump when breath detection output changes so cached results are recomputed
+RESP_ANALYSIS_VERSION = "resp-2"
+
+BANDPASS_HZ = (0.05, 1.0)  # Up to 60 breaths/min
+MIN_BREATH_S = 1.0  # Peaks closer than this are one breath
+PROMINENCE_FRACTION = 0.25  # Of the 10th-90th percentile range of the filtered signal
+APNEA_S = 10.0  # Breaths longer than this count as pauses
+IRREGULAR_CV = 0.25  # Breath duration coefficient of variation above which breathing is irregular
+MIN_BREATHS = 3
+
+@dataclass(frozen=True)
+class BreathAnalysis:
+    """Breaths found in one window; sample indices are absolute within the record.
+
+    A breath runs from one inspiration onset (trough) to the next, with its end of
+    inspiration at the highest point in between. Arrays are read-only.
+    """
+
+    fs: float
+    start_sample: int
+    onsets: np.ndarray
+    peaks: np.ndarray
+    ends: np.ndarray
+    inspiration_s: np.ndarray
+    expiration_s: np.ndarray
+    amplitudes: np.ndarray
+    waveform_skewness: float
+
+    @classmethod
+    def empty(cls, fs: float, start_sample: int = 0, waveform_skewness: float = 0.0) -> "BreathAnalysis":
+        samples, seconds = np.empty(0, dtype=np.int64), np.empty(0)
+        return cls(fs, start_sample, samples, samples, samples, seconds, seconds, seconds, waveform_skewness)
+
+    @property
+    def breath_count(self) -> int:
+        return len(self.onsets)
+
+    @property
+    def durations_s(self) -> np.ndarray:
+        return (self.ends - self.onsets) / self.fs
+
+    @property
+    def breath_times_s(self) -> np.ndarray:
+        """Mid-point of each breath in seconds from the start of the record"""
+        return (self.onsets + self.ends) / 2 / self.fs
+
+    @property
+    def breath_rates_bpm(self) -> np.ndarray:
+        """Breath-by-breath respiratory rate"""
+        return 60.0 / self.durations_s
+
+    @property
+    def ie_ratios(self) -> np.ndarray:
+        return self.inspiration_s / self.expiration_s
+
+    def rate_stats(self) -> Dict[str, float]:
+        """Statistics of the breath-by-breath rate (breaths/min)"""
+        rates = self.breath_rates_bpm
+        return {
+            'mean': float(np.mean(rates)),
+            'std': float(np.std(rates)),
+            'min': float(np.min(rates)),
+            'max': float(np.max(rates)),
+            'median': float(np.median(rates))
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Scalar features in the shape the feature dicts use"""
+        if self.breath_count < MIN_BREATHS:
+            return {
+                'breath_count': self.breath_count,
+                'respiratory_rate_bpm': None,
+                'pattern_classification': 'insufficient_breaths'
+            }
+        durations = self.durations_s
+        mean_duration = float(np.mean(durations))
+        duration_cv = float(np.std(durations) / mean_duration)
+        ie = self.ie_ratios
+        amplitude_mean = float(np.mean(self.amplitudes))
+        pauses = int(np.sum(durations > APNEA_S))
+        return {
+            'breath_count': self.breath_count,
+            'respiratory_rate_bpm': 60.0 / mean_duration,
+            'cycle_duration': mean_duration,
+            'cycle_duration_std': float(np.std(durations)),
+            'cycle_duration_cv': duration_cv,
+            'inspiration_duration': float(np.mean(self.inspiration_s)),
+            'expiration_duration': float(np.mean(self.expiration_s)),
+            'ie_ratio': float(np.median(ie)),
+            'ie_ratio_std': float(np.std(ie)),
+            'amplitude_mean': amplitude_mean,
+            'amplitude_std': float(np.std(self.amplitudes)),
+            'amplitude_variability': float(np.std(self.amplitudes) / amplitude_mean) if amplitude_mean > 0 else 0.0,
+            'pauses': pauses,
+            'skewness': self.waveform_skewness,
+            'pattern_classification': 'irregular' if duration_cv > IRREGULAR_CV or pauses else 'regular'
+        }
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+def analyze_breaths(resp: np.ndarray, fs: float, start_sample: int = 0) -> BreathAnalysis:
+    """Detect breaths in an impedance respiration signal and measure each one (breaths over NaN dropouts are left out)"""
+    resp = np.asarray(resp, dtype=np.float64)
+    finite = ~np.isnan(resp)
+    if finite.sum() < 2 * MIN_BREATH_S * fs or len(resp) <= 15:
+        return BreathAnalysis.empty(fs, start_sample)
+    if not finite.all():
+        # Bridge gaps linearly so they do not ring the filter; breaths over a gap are dropped below
+        positions = np.arange(len(resp))
+        resp = np.interp(positions, positions[finite], resp[finite])
+
+    sos = butter(2, BANDPASS_HZ, btype='bandpass', fs=fs, output='sos')
+    filtered = sosfiltfilt(sos, resp)
+    spread = np.percentile(filtered, 90) - np.percentile(filtered, 10)
+    distance = max(1, int(MIN_BREATH_S * fs))
+    prominence = PROMINENCE_FRACTION * spread if spread > 0 else None
+    peaks, _ = find_peaks(filtered, distance=distance, prominence=prominence)
+    troughs, _ = find_peaks(-filtered, distance=distance, prominence=prominence)
+
+    # Each breath runs between consecutive troughs; its end of inspiration is the highest peak
+    # in between. Intervals without a peak (shallow ripples) are dropped.
+    interval = np.searchsorted(troughs, peaks, side='right') - 1
+    inside = (interval >= 0) & (interval < len(troughs) - 1)
+    peaks, interval = peaks[inside], interval[inside]
+    order = np.lexsort((filtered[peaks], interval))
+    last_of_interval = np.flatnonzero(np.diff(interval[order], append=len(troughs)))
+    tops = peaks[order][last_of_interval]
+    starts = troughs[interval[order][last_of_interval]]
+    ends = troughs[interval[order][last_of_interval] + 1]
+
+    # A breath spanning a dropout is the straight bridge, not a real (long, shallow) breath
+    gaps_before = np.concatenate(([0], np.cumsum(~finite)))
+    measured = gaps_before[ends + 1] == gaps_before[starts]
+    starts, tops, ends = starts[measured], tops[measured], ends[measured]
+
+    return BreathAnalysis(
+        fs=fs,
+        start_sample=start_sample,
+        onsets=_readonly(starts + start_sample),
+        peaks=_readonly(tops + start_sample),
+        ends=_readonly(ends + start_sample),
+        inspiration_s=_readonly((tops - starts) / fs),
+        expiration_s=_readonly((ends - tops) / fs),
+        amplitudes=_readonly(filtered[tops] - (filtered[starts] + filtered[ends]) / 2),
+        waveform_skewness=float(skew(filtered[finite]))
+    )
+
+class RespiratoryCache:
+    """LRU of breath analyses keyed by record version, channel, window and analysis version"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, BreathAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record: Union[str, MappedRecord], channel: Optional[int] = None,
+            start_s: float = 0.0, end_s: Optional[float] = None) -> Optional[BreathAnalysis]:
+        if not isinstance(record, MappedRecord):
+            record = open_record(record)
+        if channel is None:
+            channel = record.find_channel('RESP')
+            if channel is None:
+                return None
+        start, end = record.sample_range(start_s, end_s)
+        key = self._key(record, channel, start, end)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        window = read_window(record, [channel], start / record.fs, end / record.fs)
+        breaths = analyze_breaths(window.signals[:, 0], record.fs, window.start_sample)
+        self._store(key, breaths)
+        return breaths
+
+    def put(self, record: Union[str, MappedRecord], channel: int, end_sample: int, breaths: BreathAnalysis):
+        """Seed the cache with breaths analyzed earlier (e.g. loaded from the feature store)"""
+        if not isinstance(record, MappedRecord):
+            record = open_record(record)
+        self._store(self._key(record, channel, breaths.start_sample, end_sample), breaths)
+
+    @staticmethod
+    def _key(record: MappedRecord, channel: int, start: int, end: int) -> tuple:
+        return record_signature(record.base_path) + (channel, start, end, RESP_ANALYSIS_VERSION)
+
+    def _store(self, key: tuple, breaths: BreathAnalysis):
+        with self._lock:
+            self._entries[key] = breaths
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Global instance
+respiratory_cache = RespiratoryCache()
+
+def record_breaths(record: Union[str, MappedRecord], channel: Optional[int] = None,
+                   start_s: float = 0.0, end_s: Optional[float] = None) -> Optional[BreathAnalysis]:
+    """Breaths in a record window (negative times count from the end), analyzed once per record version"""
+    return respiratory_cache.get(record, channel, start_s, end_s)
@@ -0,0 +1,167 @@
+"""
+Signal Series Export
+Decimated channel windows encoded as compact little-endian binary (or Arrow IPC) so the
+specialist portal can draw and zoom waveforms client-side
+"""
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.downsampling import lttb, minmax_envelope
+from services.wfdb_reader import MappedRecord, read_window
+
+# Bump when the binary layout changes; clients check it and ETags include it
+SERIES_FORMAT_VERSION = 1
+SERIES_MAGIC = b"VSS1"
+SERIES_MEDIA_TYPE = "application/octet-stream"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+DEFAULT_MAX_POINTS = 2000
+MAX_POINTS_LIMIT = 100000
+VALUE_DTYPES = ('float32', 'int16')
+DECIMATION_METHODS = ('minmax', 'lttb')
+INT16_NAN = -32768  # WFDB's invalid-sample marker, reused for gaps in int16 output
+ALIGNMENT = 8  # Blocks start on 8-byte boundaries so clients can view them as typed arrays in place
+
+@dataclass(frozen=True)
+class ChannelSeries:
+    """One decimated channel; samples are frame offsets from the window start"""
+
+    name: str
+    units: str
+    samples: Optional[np.ndarray]  # None when not decimated (every frame, in order)
+    values: np.ndarray
+
+    @property
+    def points(self) -> int:
+        return len(self.values)
+
+def decimate_window(record: MappedRecord, channels: Optional[Sequence] = None, start_s: float = 0.0,
+                    end_s: Optional[float] = None, max_points: int = DEFAULT_MAX_POINTS,
+                    method: str = 'minmax') -> Dict[str, Any]:
+    """Read a window of channels and decimate each to at most max_points points"""
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method: {method}")
+    window = read_window(record, channels, start_s, end_s, dtype=np.float32)
+    frames = np.arange(window.n_samples, dtype=np.uint32)
+    series = []
+    for i, name in enumerate(window.sig_name):
+        values = window.signals[:, i]
+        if window.n_samples <= max_points:
+            series.append(ChannelSeries(name.rstrip(','), window.units[i], None, values))
+            continue
+        decimate = lttb if method == 'lttb' else minmax_envelope
+        samples, decimated = decimate(frames, values, max_points)
+        series.append(ChannelSeries(name.rstrip(','), window.units[i],
+                                    samples.astype(np.uint32), decimated.astype(np.float32)))
+    return {
+        'record': record.record_name,
+        'fs': float(window.fs),
+        'start_sample': window.start_sample,
+        'end_sample': window.end_sample,
+        'start_s': window.start_s,
+        'end_s': window.end_s,
+        'method': method,
+        'max_points': max_points,
+        'channels': series
+    }
+
+def quantize_int16(values: np.ndarray):
+    """Scale finite values into int16 (NaN -> INT16_NAN); returns (raw, scale, offset)"""
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.full(len(values), INT16_NAN, dtype='<i2'), 1.0, 0.0
+    low, high = float(values[finite].min()), float(values[finite].max())
+    offset = (high + low) / 2
+    scale = (high - low) / 65534 if high > low else 1.0
+    raw = np.full(len(values), INT16_NAN, dtype='<i2')
+    raw[finite] = np.clip(np.rint((values[finite] - offset) / scale), -32767, 32767)
+    return raw, scale, offset
+
+def _pad(length: int) -> int:
+    return -length % ALIGNMENT
+
+def encode_binary(window: Dict[str, Any], dtype: str = 'float32') -> bytes:
+    """Binary series: b"VSS1", uint32 LE header length, JSON header, then the data blocks.
+
+    The header's channels list each block's byte offset and length, relative to the first
+    byte after the header. Times are uint32 frame offsets from start_sample (absent when a
+    channel is not decimated); int16 values decode as raw * scale + offset, with -32768 as NaN.
+    """
+    if dtype not in VALUE_DTYPES:
+        raise ValueError(f"Unknown value dtype: {dtype}")
+    blocks: List[bytes] = []
+    position = 0
+
+    def add_block(data: np.ndarray, block_dtype: str) -> Dict[str, Any]:
+        nonlocal position
+        payload = np.ascontiguousarray(data, dtype=block_dtype).tobytes()
+        block = {'dtype': np.dtype(block_dtype).name, 'offset': position, 'length': len(payload)}
+        blocks.append(payload + b"\0" * _pad(len(payload)))
+        position += len(payload) + _pad(len(payload))
+        return block
+
+    channels = []
+    for series in window['channels']:
+        entry = {
+            'name': series.name,
+            'units': series.units,
+            'points': series.points,
+            'decimated': series.samples is not None
+        }
+        entry['time'] = add_block(series.samples, '<u4') if series.samples is not None else None
+        if dtype == 'int16':
+            raw, scale, offset = quantize_int16(series.values)
+            entry['values'] = dict(add_block(raw, '<i2'), scale=scale, value_offset=offset, nan=INT16_NAN)
+        else:
+            entry['values'] = add_block(series.values, '<f4')
+        channels.append(entry)
+
+    header = {key: value for key, value in window.items() if key != 'channels'}
+    header.update(version=SERIES_FORMAT_VERSION, dtype=dtype, channels=channels)
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b" " * _pad(len(SERIES_MAGIC) + 4 + len(header_bytes))
+    return SERIES_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + b"".join(blocks)
+
+def encode_arrow(window: Dict[str, Any], dtype: str = 'float32') -> bytes:
+    """Arrow IPC stream with one (channel, sample, value) record batch per channel.
+
+    The window description (and int16 scale/offset per channel) is in the schema metadata.
+    Needs the optional pyarrow package.
+    """
+    import pyarrow as pa
+
+    if dtype not in VALUE_DTYPES:
+        raise ValueError(f"Unknown value dtype: {dtype}")
+    value_type = pa.int16() if dtype == 'int16' else pa.float32()
+    batches, channels = [], []
+    for series in window['channels']:
+        samples = series.samples if series.samples is not None else np.arange(series.points, dtype=np.uint32)
+        entry = {'name': series.name, 'units': series.units, 'points': series.points}
+        if dtype == 'int16':
+            values, scale, offset = quantize_int16(series.values)
+            entry.update(scale=scale, value_offset=offset, nan=INT16_NAN)
+        else:
+            values = series.values
+        channels.append(entry)
+        batches.append((series.name, samples, values))
+
+    header = {key: value for key, value in window.items() if key != 'channels'}
+    header.update(version=SERIES_FORMAT_VERSION, dtype=dtype, channels=channels)
+    schema = pa.schema(
+        [('channel', pa.string()), ('sample', pa.uint32()), ('value', value_type)],
+        metadata={'vitalsense': json.dumps(header)}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for name, samples, values in batches:
+            writer.write_batch(pa.record_batch([
+                pa.array([name] * len(samples), pa.string()),
+                pa.array(samples, pa.uint32()),
+                pa.array(values, value_type)
+            ], schema=schema))
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,113 @@
+"""
+Signal Statistics
+Column-wise, NaN-aware summary statistics for (samples, channels) signal matrices
+"""
+
+import warnings
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+@dataclass(frozen=True)
+class ChannelStats:
+    """Per-channel statistics as arrays indexed by channel; channels with no valid samples hold NaN"""
+
+    names: Tuple[str, ...]
+    count: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    median: Optional[np.ndarray] = None
+
+    def has_data(self, index: int) -> bool:
+        return bool(self.count[index] > 0)
+
+    def as_dict(self, index: int) -> Dict[str, float]:
+        """Plain-float statistics of one channel, in the shape the feature dicts use"""
+        values = {
+            'mean': float(self.mean[index]),
+            'std': float(self.std[index]),
+            'min': float(self.min[index]),
+            'max': float(self.max[index])
+        }
+        if self.median is not None:
+            values['median'] = float(self.median[index])
+        return values
+
+def column_stats(signals: np.ndarray, names: Optional[Sequence[str]] = None,
+                 invalid_value: Optional[float] = None, median: bool = False) -> ChannelStats:
+    """Count, mean, std (ddof=0), min and max of every column at once, optionally the median.
+
+    NaNs, and samples equal to invalid_value when given, are excluded without copying
+    each channel out of the matrix. Results match np.mean/np.std/... applied to the
+    filtered channel.
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    if signals.ndim == 1:
+        signals = signals[:, np.newaxis]
+    n_channels = signals.shape[1]
+    names = tuple(names) if names is not None else tuple(str(i) for i in range(n_channels))
+
+    valid = ~np.isnan(signals)
+    if invalid_value is not None:
+        valid &= signals != invalid_value
+    all_valid = bool(valid.all())
+
+    count = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if all_valid:
+            mean = signals.mean(axis=0) if len(signals) else np.full(n_channels, np.nan)
+            centered = signals - mean
+            var = (centered * centered).sum(axis=0) / count
+            minimum = signals.min(axis=0, initial=np.inf)
+            maximum = signals.max(axis=0, initial=-np.inf)
+        else:
+            filled = np.where(valid, signals, 0.0)
+            mean = filled.sum(axis=0) / count
+            centered = np.where(valid, signals - mean, 0.0)
+            var = (centered * centered).sum(axis=0) / count
+            minimum = np.where(valid, signals, np.inf).min(axis=0, initial=np.inf)
+            maximum = np.where(valid, signals, -np.inf).max(axis=0, initial=-np.inf)
+
+    empty = count == 0
+    minimum = np.where(empty, np.nan, minimum)
+    maximum = np.where(empty, np.nan, maximum)
+
+    medians = None
+    if median:
+        if all_valid:
+            medians = np.median(signals, axis=0) if len(signals) else np.full(n_channels, np.nan)
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # All-invalid channels
+                medians = np.nanmedian(np.where(valid, signals, np.nan), axis=0)
+
+    return ChannelStats(
+        names=names,
+        count=count,
+        mean=mean,
+        std=np.sqrt(var),
+        min=minimum,
+        max=maximum,
+        median=medians
+    )
+
+def windowed_rate(events: np.ndarray, fs: float, window_s: float, step_s: float,
+                  start_sample: int = 0, end_sample: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Events per minute in sliding windows over sorted event sample indices (beats, breaths).
+
+    Each window is counted with two binary searches instead of re-detecting events per
+    window. Windows of window_s start every step_s from start_sample and end by end_sample
+    (default: just after the last event). Returns window centre times in seconds and rates.
+    """
+    events = np.asarray(events)
+    window = max(1, int(round(window_s * fs)))
+    step = max(1, int(round(step_s * fs)))
+    if end_sample is None:
+        end_sample = int(events[-1]) + 1 if len(events) else start_sample
+
+    starts = np.arange(start_sample, end_sample - window + 1, step)
+    counts = np.searchsorted(events, starts + window) - np.searchsorted(events, starts)
+    return (starts + window / 2) / fs, counts * 60.0 / (window / fs)
@@ -0,0 +1,351 @@
+"""
+Streaming Feature Extractor
+Incremental vital-sign features for long or live recordings: samples arrive in chunks
+(from a growing file or a socket) and are summarised with bounded state per channel
+"""
+
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from services.hrv_engine import compute_hrv
+from services.qrs_detection import StreamingQRSDetector
+from services.signal_stats import ChannelStats
+from services.wfdb_reader import INVALID_SAMPLE, MappedRecord, record_base_path, unpack_format212
+
+SNAPSHOT_INTERVAL_S = 60.0  # Default cadence of feature snapshots
+CHUNK_S = 1.0  # Default amount of signal read per chunk from a file
+HRV_WINDOW_S = 300.0  # Rolling window for HRV (standard 5-minute short-term HRV)
+RATE_WINDOW_S = 60.0  # Cycles older than this do not count towards a rate
+CYCLE_HISTORY = 32  # Most recent breath/pulse cycles kept per channel
+RESP_BAND_HZ = (0.1, 1.0)  # 6-60 breaths/min
+PLETH_BAND_HZ = (0.5, 4.0)  # 30-240 pulses/min
+LEVEL_TAU_S = 10.0  # Time constant of the amplitude estimate used for hysteresis
+HYSTERESIS_FRACTION = 0.3
+
+class RunningStats:
+    """Per-channel count, mean, variance, min and max merged chunk by chunk (Chan/Welford).
+
+    NaNs are ignored. State is a handful of floats per channel regardless of stream length.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self.names = tuple(names)
+        self.reset()
+
+    def reset(self):
+        n_channels = len(self.names)
+        self.count = np.zeros(n_channels, dtype=np.int64)
+        self.mean = np.zeros(n_channels)
+        self.m2 = np.zeros(n_channels)
+        self.min = np.full(n_channels, np.inf)
+        self.max = np.full(n_channels, -np.inf)
+
+    def update(self, block: np.ndarray):
+        if len(block) == 0:
+            return
+        valid = ~np.isnan(block)
+        n = valid.sum(axis=0)
+        has_data = n > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block_mean = np.where(valid, block, 0.0).sum(axis=0) / n
+            centered = np.where(valid, block - block_mean, 0.0)
+            block_m2 = (centered * centered).sum(axis=0)
+
+            total = self.count + n
+            delta = block_mean - self.mean
+            self.mean = np.where(has_data, self.mean + delta * n / total, self.mean)
+            self.m2 = np.where(has_data, self.m2 + block_m2 + delta * delta * self.count * n / total, self.m2)
+        self.count = total
+        self.min = np.minimum(self.min, np.where(valid, block, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(valid, block, -np.inf).max(axis=0))
+
+    def stats(self) -> ChannelStats:
+        empty = self.count == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / self.count)
+        return ChannelStats(
+            names=self.names,
+            count=self.count.copy(),
+            mean=np.where(empty, np.nan, self.mean),
+            std=np.where(empty, np.nan, std),
+            min=np.where(empty, np.nan, self.min),
+            max=np.where(empty, np.nan, self.max)
+        )
+
+class CycleRateTracker:
+    """Rate of a quasi-periodic signal (breaths, pulses) in cycles per minute.
+
+    The signal is band-passed causally and each upward crossing of a hysteresis band around
+    zero counts as one cycle; only the last CYCLE_HISTORY crossing times are kept.
+    """
+
+    def __init__(self, fs: float, band_hz: Sequence[float]):
+        self.fs = fs
+        self._sos = butter(2, band_hz, btype='bandpass', fs=fs, output='sos')
+        self._zi = None
+        self._fill = 0.0
+        self._level = None
+        self._state = 0
+        self._crossings = deque(maxlen=CYCLE_HISTORY)
+        self._samples = 0
+
+    def process(self, chunk: np.ndarray):
+        if len(chunk) == 0:
+            return
+        missing = np.isnan(chunk)
+        if missing.any():
+            if missing.all():
+                self._samples += len(chunk)
+                return
+            finite = chunk[~missing]
+            chunk = np.where(missing, self._fill if self._zi is not None else finite[0], chunk)
+        if self._zi is None:
+            # Start in steady state for the first value so the offset does not ring
+            self._zi = sosfilt_zi(self._sos) * chunk[0]
+        self._fill = float(chunk[-1])
+
+        filtered, self._zi = sosfilt(self._sos, chunk, zi=self._zi)
+        rms = float(np.sqrt(np.mean(filtered * filtered)))
+        weight = min(1.0, len(chunk) / (LEVEL_TAU_S * self.fs))
+        self._level = rms if self._level is None else (1 - weight) * self._level + weight * rms
+
+        band = HYSTERESIS_FRACTION * self._level
+        events = np.where(filtered > band, 1, np.where(filtered < -band, -1, 0))
+        changes = np.flatnonzero(events)
+        if len(changes):
+            states = events[changes]
+            previous = np.concatenate([[self._state], states[:-1]])
+            rising = changes[(states == 1) & (previous == -1)]
+            self._crossings.extend((self._samples + rising[-CYCLE_HISTORY:]).tolist())
+            self._state = int(states[-1])
+        self._samples += len(chunk)
+
+    def rate(self) -> Optional[float]:
+        """Cycles per minute over the last RATE_WINDOW_S, or None with fewer than three cycles"""
+        recent = [c for c in self._crossings if c >= self._samples - RATE_WINDOW_S * self.fs]
+        if len(recent) < 3:
+            return None
+        return float(60.0 * self.fs / np.median(np.diff(recent)))
+
+@dataclass(frozen=True)
+class FeatureSnapshot:
+    """Features at the end of one snapshot interval; channel stats cover the interval and the whole stream"""
+
+    index: int
+    start_s: float
+    end_s: float
+    samples_seen: int
+    channels: Dict[str, Dict[str, Any]]
+    beats_total: int
+    hrv: Optional[Dict[str, Any]]
+    pulse_rate_bpm: Optional[float]
+    respiratory_rate_bpm: Optional[float]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def _find_channel(names: Sequence[str], *keywords: str) -> Optional[int]:
+    for i, name in enumerate(names):
+        if any(keyword in name.upper() for keyword in keywords):
+            return i
+    return None
+
+class StreamingFeatureExtractor:
+    """Consumes (samples, channels) chunks of a recording and emits a FeatureSnapshot every
+    snapshot_interval_s of signal.
+
+    Memory does not grow with the stream: channel statistics are running sums, beats come
+    from the streaming QRS detector and only the last HRV_WINDOW_S of R peaks is kept.
+    """
+
+    def __init__(self, fs: float, sig_name: Sequence[str], snapshot_interval_s: float = SNAPSHOT_INTERVAL_S):
+        self.fs = fs
+        self.names = tuple(name.strip().rstrip(',') for name in sig_name)
+        self.snapshot_interval = max(1, int(round(snapshot_interval_s * fs)))
+        self.samples_seen = 0
+        self.snapshots_emitted = 0
+        self._interval_start = 0
+        self._overall = RunningStats(self.names)
+        self._interval = RunningStats(self.names)
+
+        upper = [name.upper() for name in self.names]
+        self.ecg_index = upper.index('II') if 'II' in upper else _find_channel(upper, 'ECG', 'II', 'V')
+        self.pleth_index = _find_channel(upper, 'PLETH')
+        self.resp_index = _find_channel(upper, 'RESP')
+
+        self._qrs = StreamingQRSDetector(fs) if self.ecg_index is not None else None
+        self._beats = deque(maxlen=int(HRV_WINDOW_S * 5) + 1)  # At most 300 bpm
+        self._pulse = CycleRateTracker(fs, PLETH_BAND_HZ) if self.pleth_index is not None else None
+        self._resp = CycleRateTracker(fs, RESP_BAND_HZ) if self.resp_index is not None else None
+
+    def feed(self, frames: np.ndarray) -> List[FeatureSnapshot]:
+        """Consume the next frames; returns the snapshots completed by them (usually none or one)"""
+        frames = np.asarray(frames, dtype=np.float64)
+        if frames.ndim == 1:
+            frames = frames[:, np.newaxis]
+        if frames.shape[1] != len(self.names):
+            raise ValueError(f"Expected {len(self.names)} channels, got {frames.shape[1]}")
+
+        snapshots = []
+        position = 0
+        while position < len(frames):
+            boundary = self._interval_start + self.snapshot_interval
+            take = min(len(frames) - position, boundary - self.samples_seen)
+            self._consume(frames[position:position + take])
+            position += take
+            if self.samples_seen == boundary:
+                snapshots.append(self._snapshot())
+        return snapshots
+
+    def finish(self) -> Optional[FeatureSnapshot]:
+        """Confirm pending beats and emit a final snapshot for a partly filled interval"""
+        if self._qrs is not None:
+            self._beats.extend(self._qrs.flush().tolist())
+        if self.samples_seen == self._interval_start:
+            return None
+        return self._snapshot()
+
+    def _consume(self, block: np.ndarray):
+        self._overall.update(block)
+        self._interval.update(block)
+        if self._qrs is not None:
+            self._beats.extend(self._qrs.process(block[:, self.ecg_index]).tolist())
+        if self._pulse is not None:
+            self._pulse.process(block[:, self.pleth_index])
+        if self._resp is not None:
+            self._resp.process(block[:, self.resp_index])
+        self.samples_seen += len(block)
+
+    def _snapshot(self) -> FeatureSnapshot:
+        horizon = self.samples_seen - HRV_WINDOW_S * self.fs
+        while self._beats and self._beats[0] < horizon:
+            self._beats.popleft()
+        hrv = compute_hrv(np.fromiter(self._beats, dtype=np.int64), self.fs)
+
+        overall, interval = self._overall.stats(), self._interval.stats()
+        channels = {
+            name: {
+                'interval': interval.as_dict(i) if interval.has_data(i) else None,
+                'overall': overall.as_dict(i) if overall.has_data(i) else None
+            }
+            for i, name in enumerate(self.names)
+        }
+
+        snapshot = FeatureSnapshot(
+            index=self.snapshots_emitted,
+            start_s=self._interval_start / self.fs,
+            end_s=self.samples_seen / self.fs,
+            samples_seen=self.samples_seen,
+            channels=channels,
+            beats_total=self._qrs.beat_count if self._qrs is not None else 0,
+            hrv=hrv.as_dict() if hrv is not None else None,
+            pulse_rate_bpm=self._pulse.rate() if self._pulse is not None else None,
+            respiratory_rate_bpm=self._resp.rate() if self._resp is not None else None
+        )
+        self.snapshots_emitted += 1
+        self._interval_start = self.samples_seen
+        self._interval.reset()
+        return snapshot
+
+class StreamDecoder:
+    """Turns bytes laid out like a record's format 16/212 .dat file into physical-unit frames.
+
+    Bytes that do not complete a frame (or a 212 sample pair) are kept for the next call.
+    """
+
+    def __init__(self, fmt: str, n_sig: int, gain: np.ndarray, baseline: np.ndarray):
+        if fmt not in INVALID_SAMPLE:
+            raise ValueError(f"Streaming supports WFDB formats {sorted(INVALID_SAMPLE)}, not {fmt}")
+        self.fmt = fmt
+        self.n_sig = n_sig
+        self.gain = np.asarray(gain, dtype=np.float64)
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        # Smallest whole number of frames that ends on a byte boundary
+        self.unit_frames = 1 if fmt == '16' or n_sig % 2 == 0 else 2
+        self.unit_bytes = 2 * n_sig if fmt == '16' else 3 * n_sig * self.unit_frames // 2
+        self._pending = b''
+
+    @classmethod
+    def for_record(cls, record: MappedRecord) -> "StreamDecoder":
+        if not record.mapped:
+            raise ValueError(f"{record.record_name}: streaming needs a single format 16/212 .dat file")
+        return cls(record.fmt, record.n_sig, record.gain, record.baseline)
+
+    def decode(self, data: bytes) -> np.ndarray:
+        data = self._pending + data
+        usable = len(data) // self.unit_bytes * self.unit_bytes
+        self._pending = data[usable:]
+        raw = np.frombuffer(data[:usable], dtype=np.uint8)
+        digital = raw.view('<i2') if self.fmt == '16' else unpack_format212(raw)
+
+        return self._to_physical(digital.reshape(-1, self.n_sig))
+
+    def flush(self) -> np.ndarray:
+        """Decode whole frames left in a trailing partial 212 pair at the end of a stream"""
+        pending, self._pending = self._pending, b''
+        frames = (len(pending) * 2 // 3) // self.n_sig if self.fmt == '212' else 0
+        if frames == 0:
+            return np.empty((0, self.n_sig))
+        digital = unpack_format212(np.frombuffer(pending, dtype=np.uint8))
+        return self._to_physical(digital[:frames * self.n_sig].reshape(-1, self.n_sig))
+
+    def _to_physical(self, digital: np.ndarray) -> np.ndarray:
+        physical = (digital - self.baseline) / self.gain
+        physical[digital == INVALID_SAMPLE[self.fmt]] = np.nan
+        return physical
+
+def tail_record(path: str, chunk_s: float = CHUNK_S, follow: bool = False,
+                poll_s: float = 0.5, idle_timeout_s: Optional[float] = None) -> Iterator[np.ndarray]:
+    """Yield frames of a record's .dat file chunk by chunk.
+
+    With follow=True the file is treated as still being written: at end of file it is polled
+    for new data until idle_timeout_s passes without any (forever when None).
+    """
+    record = MappedRecord(record_base_path(path))
+    decoder = StreamDecoder.for_record(record)
+    units = max(1, int(chunk_s * record.fs) // decoder.unit_frames)
+    idle = 0.0
+
+    with open(record.dat_path, 'rb') as f:
+        f.seek(record.byte_offset)
+        while True:
+            data = f.read(units * decoder.unit_bytes)
+            if data:
+                idle = 0.0
+                frames = decoder.decode(data)
+                if len(frames):
+                    yield frames
+                continue
+            if not follow or (idle_timeout_s is not None and idle >= idle_timeout_s):
+                frames = decoder.flush()
+                if len(frames):
+                    yield frames
+                return
+            time.sleep(poll_s)
+            idle += poll_s
+
+def socket_frames(sock, decoder: StreamDecoder, recv_bytes: int = 65536) -> Iterator[np.ndarray]:
+    """Yield frames from a socket carrying raw .dat-format bytes until the peer closes it"""
+    while True:
+        data = sock.recv(recv_bytes)
+        if not data:
+            frames = decoder.flush()
+            if len(frames):
+                yield frames
+            return
+        frames = decoder.decode(data)
+        if len(frames):
+            yield frames
+
+def stream_features(chunks: Iterable[np.ndarray], extractor: StreamingFeatureExtractor) -> Iterator[FeatureSnapshot]:
+    """Feed chunks through an extractor, yielding snapshots as they complete and a final partial one"""
+    for chunk in chunks:
+        yield from extractor.feed(chunk)
+    final = extractor.finish()
+    if final is not None:
+        yield final
@@ -0,0 +1,282 @@
+"""
+Memory-Mapped WFDB Reader
+Decodes only the requested sample range and channels of format 16/212 .dat files
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+import wfdb
+
+# Digital value WFDB reserves for invalid/missing samples, per storage format
+INVALID_SAMPLE = {'16': -32768, '212': -2048}
+# Gain WFDB assumes when a header leaves adc_gain at 0
+DEFAULT_ADC_GAIN = 200.0
+
+def record_base_path(path: str) -> str:
+    """Strip a .dat/.hea extension so any of the three spellings name the same record"""
+    base, ext = os.path.splitext(path)
+    return base if ext.lower() in ('.dat', '.hea') else path
+
+def record_signature(base_path: str) -> tuple:
+    """Cache key for a record: absolute path plus mtime and size of its .hea and .dat files"""
+    stat = os.stat(base_path + '.hea')
+    signature = (os.path.abspath(base_path), stat.st_mtime_ns, stat.st_size)
+    dat_path = base_path + '.dat'
+    if os.path.exists(dat_path):
+        stat = os.stat(dat_path)
+        signature += (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+def unpack_format212(raw: np.ndarray) -> np.ndarray:
+    """Decode format 212 bytes (two 12-bit samples per three bytes) to a flat int16 array"""
+    raw = np.asarray(raw, dtype=np.uint16)
+    if len(raw) % 3:
+        # An odd sample count leaves the final pair with only two bytes
+        raw = np.concatenate([raw, np.zeros(3 - len(raw) % 3, dtype=np.uint16)])
+    raw = raw.reshape(-1, 3)
+
+    samples = np.empty((raw.shape[0], 2), dtype=np.int16)
+    samples[:, 0] = raw[:, 0] | ((raw[:, 1] & 0x0F) << 8)
+    samples[:, 1] = raw[:, 2] | ((raw[:, 1] & 0xF0) << 4)
+    samples = samples.ravel()
+    samples[samples > 2047] -= 4096
+    return samples
+
+class MappedRecord:
+    """A WFDB record whose .dat file is memory-mapped instead of decoded up front.
+
+    Only headers are parsed on open. read() slices the mapped bytes for the requested
+    frames, so memory and time scale with the window rather than the recording. Records
+    the fast path cannot handle (other formats, multiple .dat files, multi-sample frames,
+    skew) fall back to wfdb.rdrecord with sampfrom/sampto.
+    """
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        header = wfdb.rdheader(base_path)
+        self.record_name = header.record_name
+        self.fs = header.fs
+        self.n_sig = header.n_sig
+        self.sig_name = tuple(header.sig_name or ())
+        self.units = tuple(header.units or ())
+        self.fmt = header.fmt[0] if header.fmt else None
+        self.gain = np.array(
+            [g if g else DEFAULT_ADC_GAIN for g in (header.adc_gain or [DEFAULT_ADC_GAIN] * self.n_sig)],
+            dtype=np.float64
+        )
+        self.baseline = np.array(header.baseline or [0] * self.n_sig, dtype=np.float64)
+
+        self._memmap = None
+        self.dat_path = None
+        self.byte_offset = 0
+        self.mapped = self.n_sig > 0 and self._supports_memmap(header)
+        if self.mapped:
+            self.dat_path = dat_path = os.path.join(os.path.dirname(base_path), header.file_name[0])
+            self.byte_offset = byte_offset = header.byte_offset[0] or 0
+            if os.path.getsize(dat_path) > byte_offset:
+                self._memmap = np.memmap(dat_path, dtype=np.uint8, mode='r', offset=byte_offset)
+            self.sig_len = self._mapped_sig_len(header)
+        else:
+            self.sig_len = header.sig_len or 0
+
+    @staticmethod
+    def _supports_memmap(header) -> bool:
+        fmts = set(header.fmt or [])
+        return (
+            len(fmts) == 1
+            and next(iter(fmts)) in INVALID_SAMPLE
+            and len(set(header.file_name or [])) == 1
+            and len(set(header.byte_offset or [None])) == 1
+            and all(spf in (None, 1) for spf in (header.samps_per_frame or []))
+            and not any(header.skew or [])
+        )
+
+    def _mapped_sig_len(self, header) -> int:
+        n_bytes = self._memmap.size if self._memmap is not None else 0
+        if self.fmt == '16':
+            available = n_bytes // (2 * self.n_sig)
+        else:
+            available = (n_bytes * 2 // 3) // self.n_sig
+        return min(header.sig_len, available) if header.sig_len else available
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.sig_len / self.fs if self.fs else 0.0
+
+    def channel_indices(self, channels: Optional[Sequence] = None) -> Tuple[int, ...]:
+        """Resolve channel indices or names (matched with or without BIDMC's trailing comma)"""
+        if channels is None:
+            return tuple(range(self.n_sig))
+        names = [name.strip().rstrip(',') for name in self.sig_name]
+        indices = []
+        for channel in channels:
+            if isinstance(channel, (int, np.integer)):
+                indices.append(int(channel))
+            else:
+                indices.append(names.index(str(channel).strip().rstrip(',')))
+        return tuple(indices)
+
+    def find_channel(self, *keywords: str) -> Optional[int]:
+        """Index of the first channel whose name contains any of the keywords (case-insensitive)"""
+        for i, name in enumerate(self.sig_name):
+            if any(keyword.upper() in name.upper() for keyword in keywords):
+                return i
+        return None
+
+    def sample_range(self, start_s: float = 0.0, end_s: Optional[float] = None) -> Tuple[int, int]:
+        """Convert a time range in seconds to frame indices; negative times count from the end"""
+        def to_sample(seconds: float) -> int:
+            sample = int(round(seconds * self.fs))
+            if seconds < 0:
+                sample += self.sig_len
+            return max(0, min(sample, self.sig_len))
+
+        start = to_sample(start_s)
+        end = self.sig_len if end_s is None else to_sample(end_s)
+        return start, max(start, end)
+
+    def read(self, sampfrom: int = 0, sampto: Optional[int] = None,
+             channels: Optional[Sequence] = None, dtype=np.float64) -> np.ndarray:
+        """Return physical values for frames [sampfrom, sampto) of the given channels.
+
+        The result has shape (samples, channels); invalid samples become NaN.
+        """
+        indices = self.channel_indices(channels)
+        sampto = self.sig_len if sampto is None else min(sampto, self.sig_len)
+        sampfrom = max(0, min(sampfrom, sampto))
+        if sampto == sampfrom or not indices:
+            return np.empty((sampto - sampfrom, len(indices)), dtype=dtype)
+
+        if not self.mapped:
+            record = wfdb.rdrecord(self.base_path, sampfrom=sampfrom, sampto=sampto, channels=list(indices))
+            return record.p_signal.astype(dtype, copy=False)
+
+        if self.fmt == '16':
+            digital = self._read_format16(sampfrom, sampto)
+        else:
+            digital = self._read_format212(sampfrom, sampto)
+        digital = digital[:, indices]
+
+        physical = digital.astype(dtype)
+        physical -= self.baseline[list(indices)].astype(dtype)
+        physical /= self.gain[list(indices)].astype(dtype)
+        physical[digital == INVALID_SAMPLE[self.fmt]] = np.nan
+        return physical
+
+    def _read_format16(self, sampfrom: int, sampto: int) -> np.ndarray:
+        frame_bytes = 2 * self.n_sig
+        raw = self._memmap[sampfrom * frame_bytes:sampto * frame_bytes]
+        return raw.view('<i2').reshape(-1, self.n_sig)
+
+    def _read_format212(self, sampfrom: int, sampto: int) -> np.ndarray:
+        # Two 12-bit samples share three bytes, counted across the interleaved frame
+        flat_from = sampfrom * self.n_sig
+        flat_to = sampto * self.n_sig
+        pair_from = flat_from // 2
+        pair_to = (flat_to + 1) // 2
+        samples = unpack_format212(self._memmap[pair_from * 3:pair_to * 3])
+
+        start = flat_from - pair_from * 2
+        return samples[start:start + flat_to - flat_from].reshape(-1, self.n_sig)
+
+@dataclass(frozen=True)
+class SignalWindow:
+    """Physical samples of the selected channels over one time range of a record"""
+
+    signals: np.ndarray
+    sig_name: Tuple[str, ...]
+    units: Tuple[str, ...]
+    fs: float
+    start_sample: int
+
+    @property
+    def n_samples(self) -> int:
+        return self.signals.shape[0]
+
+    @property
+    def end_sample(self) -> int:
+        return self.start_sample + self.n_samples
+
+    @property
+    def start_s(self) -> float:
+        return self.start_sample / self.fs
+
+    @property
+    def end_s(self) -> float:
+        return self.end_sample / self.fs
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.n_samples / self.fs
+
+    def time_vector(self) -> np.ndarray:
+        """Seconds from the start of the record for every sample in the window"""
+        return np.arange(self.start_sample, self.end_sample) / self.fs
+
+    def channel(self, name: str) -> Optional[np.ndarray]:
+        """One column by name (with or without the trailing comma), or None when not selected"""
+        names = [n.strip().rstrip(',') for n in self.sig_name]
+        key = name.strip().rstrip(',')
+        return self.signals[:, names.index(key)] if key in names else None
+
+class MappedRecordCache:
+    """Small LRU of opened MappedRecords so headers are parsed once per file version"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, MappedRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> MappedRecord:
+        base_path = record_base_path(path)
+        key = record_signature(base_path)
+
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None:
+                self._entries.move_to_end(key)
+                return record
+
+        record = MappedRecord(base_path)
+        with self._lock:
+            self._entries[key] = record
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return record
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global instance
+mapped_records = MappedRecordCache()
+
+def open_record(path: str) -> MappedRecord:
+    """Open (or reuse) the memory-mapped view of a record (path with or without .dat/.hea)"""
+    return mapped_records.open(path)
+
+def read_window(record: Union[str, MappedRecord], channels: Optional[Sequence] = None,
+                start_s: float = 0.0, end_s: Optional[float] = None, dtype=np.float64) -> SignalWindow:
+    """Read channels (names or indices, None for all) between start_s and end_s seconds.
+
+    Negative times count back from the end of the record, so start_s=-120 is the final
+    two minutes; end_s=None reads to the end. Only the selected frames and channels
+    are decoded.
+    """
+    if not isinstance(record, MappedRecord):
+        record = open_record(record)
+    indices = record.channel_indices(channels)
+    start, end = record.sample_range(start_s, end_s)
+    return SignalWindow(
+        signals=record.read(start, end, indices, dtype=dtype),
+        sig_name=tuple(record.sig_name[i] for i in indices),
+        units=tuple(record.units[i] if i < len(record.units) else '' for i in indices),
+        fs=record.fs,
+        start_sample=start
+    )
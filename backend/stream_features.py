@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+VitalSense Pro - Streaming Feature Extraction
+Emits vital-sign feature snapshots (channel statistics, HRV, pulse and respiratory rate) as
+JSON lines while a WFDB recording is read chunk by chunk, so monitoring sessions of any
+length are processed without loading whole files.
+
+Usage:
+    python stream_features.py ../archive/bidmc01 --interval 60
+    python stream_features.py /data/bed3/session --follow --idle-timeout 300 --output bed3.jsonl
+    python stream_features.py --listen 0.0.0.0:9100 --header ../archive/bidmc01.hea
+"""
+
+import argparse
+import json
+import socket
+import sys
+
+from services.streaming_extractor import (
+    CHUNK_S, SNAPSHOT_INTERVAL_S, StreamDecoder, StreamingFeatureExtractor,
+    socket_frames, stream_features, tail_record
+)
+from services.wfdb_reader import MappedRecord, record_base_path
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream feature snapshots from a WFDB recording")
+    parser.add_argument("record", nargs="?", help="Record to read (.hea/.dat or base path)")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL_S, help="Seconds of signal per snapshot")
+    parser.add_argument("--chunk", type=float, default=CHUNK_S, help="Seconds of signal read at a time")
+    parser.add_argument("--follow", action="store_true", help="Keep reading as the .dat file grows")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="With --follow, stop after this many seconds without new data")
+    parser.add_argument("--listen", help="host:port to accept raw .dat-format streams on instead of reading a file")
+    parser.add_argument("--header", help="Header (.hea) describing the layout of --listen streams")
+    parser.add_argument("--output", help="Append snapshots to this JSONL file instead of stdout")
+    args = parser.parse_args()
+    if bool(args.record) == bool(args.listen):
+        parser.error("give either a record or --listen")
+    if args.listen and not args.header:
+        parser.error("--listen needs --header")
+    return args
+
+def emit(snapshot, out):
+    out.write(json.dumps(snapshot.as_dict()) + '\n')
+    out.flush()
+
+def run_file(args, out):
+    record = MappedRecord(record_base_path(args.record))
+    extractor = StreamingFeatureExtractor(record.fs, record.sig_name, args.interval)
+    print(f"📡 Streaming {record.record_name} ({record.fs} Hz, {list(extractor.names)}) "
+          f"every {args.interval:g}s{' (following)' if args.follow else ''}", file=sys.stderr)
+
+    chunks = tail_record(args.record, args.chunk, follow=args.follow, idle_timeout_s=args.idle_timeout)
+    for snapshot in stream_features(chunks, extractor):
+        emit(snapshot, out)
+    print(f"✅ {extractor.snapshots_emitted} snapshots from {extractor.samples_seen / record.fs:.1f}s of signal",
+          file=sys.stderr)
+
+def run_server(args, out):
+    host, port = args.listen.rsplit(':', 1)
+    header = MappedRecord(record_base_path(args.header))
+    StreamDecoder.for_record(header)  # Fail early on unsupported layouts
+
+    with socket.create_server((host, int(port))) as server:
+        print(f"📡 Listening on {host}:{port} for {header.record_name}-layout streams", file=sys.stderr)
+        while True:
+            conn, peer = server.accept()
+            print(f"🔌 Stream from {peer[0]}:{peer[1]}", file=sys.stderr)
+            extractor = StreamingFeatureExtractor(header.fs, header.sig_name, args.interval)
+            with conn:
+                for snapshot in stream_features(socket_frames(conn, StreamDecoder.for_record(header)), extractor):
+                    emit(snapshot, out)
+            print(f"   Closed after {extractor.samples_seen / header.fs:.1f}s of signal", file=sys.stderr)
+
+def main():
+    args = parse_args()
+    out = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.listen:
+            run_server(args, out)
+        else:
+            run_file(args, out)
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopped", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+VitalSense Pro - Synthetic WFDB Record Generator
+Writes BIDMC-style record sets (raw waveforms, `n` numerics record and `.breath`
+annotations) of any length, for stress-testing extraction and plotting at scale.
+
+Waveforms are generated and written chunk by chunk, so a 24 hour recording never has
+to fit in memory.
+
+Usage:
+    python synthetic_wfdb_generator.py --duration 8m --output-dir ../synthetic_upload
+    python synthetic_wfdb_generator.py --duration 24h --record synth24h --artifacts-per-hour 12 --seed 7
+"""
+
+import argparse
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import wfdb
+
+# Channel name -> (units, ADC gain per unit); names keep BIDMC's trailing comma
+WAVEFORM_CHANNELS = {
+    "RESP": ("NU", 20000.0),
+    "PLETH": ("NU", 20000.0),
+    "V": ("mV", 5000.0),
+    "AVR": ("mV", 5000.0),
+    "II": ("mV", 5000.0)
+}
+NUMERIC_CHANNELS = {
+    "HR": ("bpm", 100.0),
+    "PULSE": ("bpm", 100.0),
+    "RESP": ("bpm", 100.0),
+    "SpO2": ("%", 100.0)
+}
+WFDB_INVALID_SAMPLE = -32768  # Format 16 marker read back as NaN
+
+# ECG waves relative to the R peak: (offset s, width s, amplitude mV)
+ECG_WAVES = [
+    (-0.17, 0.025, 0.12),   # P
+    (-0.03, 0.010, -0.12),  # Q
+    (0.00, 0.012, 1.00),    # R
+    (0.03, 0.010, -0.20),   # S
+    (0.25, 0.050, 0.30)     # T
+]
+
+@dataclass
+class SyntheticRecordConfig:
+    """Everything that shapes a generated record set"""
+    record_name: str = "synth01"
+    output_dir: str = "."
+    duration_seconds: float = 8 * 60
+    sampling_rate: int = 125
+    channels: List[str] = field(default_factory=lambda: ["RESP", "PLETH", "V", "AVR", "II"])
+    heart_rate_bpm: float = 80.0
+    respiratory_rate_bpm: float = 16.0
+    spo2_percent: float = 97.0
+    noise_level: float = 0.02  # White noise, as a fraction of each channel's amplitude
+    baseline_wander: float = 0.1  # mV of slow ECG baseline drift
+    artifacts_per_hour: float = 4.0  # Motion artifact bursts on all waveforms
+    dropouts_per_hour: float = 1.0  # Lead-off segments written as invalid samples
+    desaturations_per_hour: float = 0.0  # SpO2 dips below 90%
+    chunk_seconds: int = 600
+    seed: Optional[int] = None
+
+class SyntheticSignalModel:
+    """Continuous physiological model evaluated on arbitrary absolute time ranges"""
+
+    def __init__(self, config: SyntheticRecordConfig):
+        self.config = config
+        self.rng = np.random.default_rng(config.seed)
+        duration = config.duration_seconds
+
+        # Slow drifts: a few sinusoids with periods between 5 and 60 minutes
+        self._drift_periods = self.rng.uniform(300, 3600, 3)
+        self._drift_phases = self.rng.uniform(0, 2 * np.pi, 3)
+
+        self.artifacts = self._events(config.artifacts_per_hour, 1.0, 5.0)
+        self.dropouts = self._events(config.dropouts_per_hour, 2.0, 20.0)
+        self.desaturations = self._events(config.desaturations_per_hour, 20.0, 90.0)
+
+        # Phase accumulators carried between chunks (cycles since start)
+        self._cardiac_phase = 0.0
+        self._resp_phase = self.rng.uniform(0, 1)
+        self._position = 0.0
+        self.breath_onsets: List[int] = []
+
+        self._numerics_noise = self.rng.standard_normal((int(np.ceil(duration)) + 1, 4))
+
+    def _events(self, per_hour: float, min_s: float, max_s: float) -> List[Tuple[float, float]]:
+        count = self.rng.poisson(per_hour * self.config.duration_seconds / 3600.0)
+        starts = np.sort(self.rng.uniform(0, max(self.config.duration_seconds - max_s, 0), count))
+        return [(float(start), float(start + self.rng.uniform(min_s, max_s))) for start in starts]
+
+    def drift(self, t: np.ndarray) -> np.ndarray:
+        """Smooth multi-minute variation in [-1, 1]"""
+        total = np.zeros_like(t)
+        for period, phase in zip(self._drift_periods, self._drift_phases):
+            total += np.sin(2 * np.pi * t / period + phase)
+        return total / len(self._drift_periods)
+
+    def heart_rate(self, t: np.ndarray) -> np.ndarray:
+        # Slow drift plus respiratory sinus arrhythmia
+        resp = np.sin(2 * np.pi * self.config.respiratory_rate_bpm / 60.0 * t)
+        return self.config.heart_rate_bpm * (1 + 0.08 * self.drift(t)) + 2.0 * resp
+
+    def respiratory_rate(self, t: np.ndarray) -> np.ndarray:
+        return self.config.respiratory_rate_bpm * (1 + 0.1 * self.drift(t + 900))
+
+    def spo2(self, t: np.ndarray) -> np.ndarray:
+        values = self.config.spo2_percent + 0.5 * self.drift(t + 1800)
+        for start, end in self.desaturations:
+            inside = (t >= start) & (t < end)
+            if np.any(inside):
+                dip = np.sin(np.pi * (t[inside] - start) / (end - start))
+                values[inside] -= 10.0 * dip
+        return np.clip(values, 0, 100)
+
+    def _mask(self, t: np.ndarray, events: List[Tuple[float, float]]) -> np.ndarray:
+        mask = np.zeros(t.shape, dtype=bool)
+        for start, end in events:
+            if end >= t[0] and start <= t[-1]:
+                mask |= (t >= start) & (t < end)
+        return mask
+
+    def waveform_chunk(self, n_samples: int) -> Dict[str, np.ndarray]:
+        """Next n_samples of every waveform channel, continuing from the previous chunk"""
+        fs = self.config.sampling_rate
+        start_sample = int(round(self._position * fs))
+        t = (start_sample + np.arange(n_samples)) / fs
+        self._position = (start_sample + n_samples) / fs
+
+        # Integrate instantaneous rates so beats and breaths stay continuous across chunks
+        cardiac_phase = self._cardiac_phase + np.cumsum(self.heart_rate(t) / 60.0 / fs)
+        resp_phase = self._resp_phase + np.cumsum(self.respiratory_rate(t) / 60.0 / fs)
+        onsets = np.nonzero(np.diff(np.floor(np.concatenate(([self._resp_phase], resp_phase)))) > 0)[0]
+        self.breath_onsets.extend((start_sample + onsets).tolist())
+        self._cardiac_phase = float(cardiac_phase[-1])
+        self._resp_phase = float(resp_phase[-1])
+
+        rr = 60.0 / self.heart_rate(t)
+        # Seconds relative to the R peak; each cycle starts 0.25 s before it
+        beat_time = np.mod(cardiac_phase, 1.0) * rr - 0.25
+        ecg = np.zeros(n_samples)
+        for offset, width, amplitude in ECG_WAVES:
+            ecg += amplitude * np.exp(-0.5 * ((beat_time - offset) / width) ** 2)
+        ecg += self.config.baseline_wander * np.sin(2 * np.pi * 0.3 * t)
+
+        # Pleth pulse arrives ~0.2 s after the R peak, with a dicrotic wave
+        pulse_time = beat_time - 0.2
+        pleth = 0.3 + 0.5 * np.exp(-0.5 * (pulse_time / 0.08) ** 2) + 0.15 * np.exp(-0.5 * ((pulse_time - 0.3) / 0.06) ** 2)
+
+        resp = 0.5 + 0.3 * (1 + 0.2 * self.drift(t + 300)) * np.sin(2 * np.pi * resp_phase)
+
+        signals = {
+            "II": ecg,
+            "V": 0.7 * ecg,
+            "AVR": -0.5 * ecg,
+            "PLETH": pleth,
+            "RESP": resp
+        }
+
+        scale = {"II": 1.0, "V": 0.7, "AVR": 0.5, "PLETH": 0.5, "RESP": 0.3}
+        artifact_mask = self._mask(t, self.artifacts)
+        dropout_mask = self._mask(t, self.dropouts)
+        for name, values in signals.items():
+            values += self.config.noise_level * scale[name] * self.rng.standard_normal(n_samples)
+            if np.any(artifact_mask):
+                burst = np.cumsum(self.rng.standard_normal(int(artifact_mask.sum()))) * 0.05 * scale[name]
+                values[artifact_mask] += burst
+            values[dropout_mask] = np.nan
+        return signals
+
+    def numerics(self) -> Dict[str, np.ndarray]:
+        """1 Hz numerics for the whole record (small enough to build in one go)"""
+        t = np.arange(int(self.config.duration_seconds), dtype=float)
+        noise = self._numerics_noise[:t.size]
+        hr = self.heart_rate(t) + noise[:, 0]
+        return {
+            "HR": hr,
+            "PULSE": hr + 0.5 * noise[:, 1],
+            "RESP": self.respiratory_rate(t) + 0.5 * noise[:, 2],
+            "SpO2": np.round(self.spo2(t) + 0.3 * noise[:, 3])
+        }
+
+class Format16Writer:
+    """Streams interleaved 16-bit samples to a .dat file and writes the matching .hea"""
+
+    def __init__(self, directory: str, record_name: str, fs: float, channels: List[str],
+                 units: Dict[str, Tuple[str, float]]):
+        self.directory = directory
+        self.record_name = record_name
+        self.fs = fs
+        self.channels = channels
+        self.units = units
+        self.n_samples = 0
+        self.init_values: Optional[np.ndarray] = None
+        self.checksums = np.zeros(len(channels), dtype=np.int64)
+        self.dat_path = os.path.join(directory, f"{record_name}.dat")
+        self.hea_path = os.path.join(directory, f"{record_name}.hea")
+        self._file = open(self.dat_path, "wb")
+
+    def write(self, signals: Dict[str, np.ndarray]):
+        columns = []
+        for name in self.channels:
+            gain = self.units[name][1]
+            values = signals[name] * gain
+            digital = np.where(np.isnan(values), WFDB_INVALID_SAMPLE, np.clip(np.round(values), -32767, 32767))
+            columns.append(digital.astype("<i2"))
+        block = np.column_stack(columns)
+        if self.init_values is None and len(block):
+            self.init_values = block[0].astype(np.int64)
+        self.checksums += block.sum(axis=0, dtype=np.int64)
+        self.n_samples += len(block)
+        self._file.write(block.tobytes())
+
+    def close(self):
+        self._file.close()
+        init_values = self.init_values if self.init_values is not None else np.zeros(len(self.channels), dtype=np.int64)
+        lines = [f"{self.record_name} {len(self.channels)} {self.fs:g} {self.n_samples}"]
+        for i, name in enumerate(self.channels):
+            unit, gain = self.units[name]
+            checksum = int(self.checksums[i]) & 0xFFFF
+            if checksum >= 0x8000:
+                checksum -= 0x10000
+            lines.append(
+                f"{self.record_name}.dat 16 {gain:g}(0)/{unit} 16 0 {int(init_values[i])} {checksum} 0 {name},"
+            )
+        with open(self.hea_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+def generate_record(config: SyntheticRecordConfig) -> Dict[str, str]:
+    """Write the raw record, its `n` numerics record and `.breath` annotations; returns the file paths"""
+    unknown = [name for name in config.channels if name not in WAVEFORM_CHANNELS]
+    if unknown:
+        raise ValueError(f"Unsupported channels: {unknown} (choose from {list(WAVEFORM_CHANNELS)})")
+
+    os.makedirs(config.output_dir, exist_ok=True)
+    model = SyntheticSignalModel(config)
+    fs = config.sampling_rate
+    total_samples = int(round(config.duration_seconds * fs))
+    chunk_samples = max(1, int(config.chunk_seconds * fs))
+
+    writer = Format16Writer(config.output_dir, config.record_name, fs, config.channels, WAVEFORM_CHANNELS)
+    try:
+        written = 0
+        while written < total_samples:
+            n = min(chunk_samples, total_samples - written)
+            writer.write(model.waveform_chunk(n))
+            written += n
+    finally:
+        writer.close()
+
+    numerics_name = f"{config.record_name}n"
+    numerics_writer = Format16Writer(config.output_dir, numerics_name, 1, list(NUMERIC_CHANNELS), NUMERIC_CHANNELS)
+    try:
+        numerics_writer.write(model.numerics())
+    finally:
+        numerics_writer.close()
+
+    breath_samples = np.asarray(model.breath_onsets, dtype=np.int64)
+    if breath_samples.size:
+        wfdb.wrann(config.record_name, "breath", sample=breath_samples,
+                   symbol=['"'] * breath_samples.size, aux_note=["ann1"] * breath_samples.size,
+                   fs=fs, write_dir=config.output_dir)
+
+    return {
+        "dat_file": writer.dat_path,
+        "hea_file": writer.hea_path,
+        "dat_normalized_file": numerics_writer.dat_path,
+        "hea_normalized_file": numerics_writer.hea_path,
+        "breath_annotation_file": os.path.join(config.output_dir, f"{config.record_name}.breath")
+    }
+
+def parse_duration(value: str) -> float:
+    """Seconds from '480', '8m', '1.5h' or '24h'"""
+    units = {"s": 1, "m": 60, "h": 3600}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+def main():
+    defaults = SyntheticRecordConfig()
+    parser = argparse.ArgumentParser(description="Generate BIDMC-style synthetic WFDB records")
+    parser.add_argument("--record", default=defaults.record_name, help="Record name (numerics go to <record>n)")
+    parser.add_argument("--output-dir", default=defaults.output_dir)
+    parser.add_argument("--duration", default="8m", help="e.g. 480, 8m, 2h, 24h")
+    parser.add_argument("--fs", type=int, default=defaults.sampling_rate, help="Waveform sampling rate (Hz)")
+    parser.add_argument("--channels", nargs="+", default=defaults.channels, choices=list(WAVEFORM_CHANNELS))
+    parser.add_argument("--heart-rate", type=float, default=defaults.heart_rate_bpm)
+    parser.add_argument("--resp-rate", type=float, default=defaults.respiratory_rate_bpm)
+    parser.add_argument("--spo2", type=float, default=defaults.spo2_percent)
+    parser.add_argument("--noise", type=float, default=defaults.noise_level)
+    parser.add_argument("--artifacts-per-hour", type=float, default=defaults.artifacts_per_hour)
+    parser.add_argument("--dropouts-per-hour", type=float, default=defaults.dropouts_per_hour)
+    parser.add_argument("--desaturations-per-hour", type=float, default=defaults.desaturations_per_hour)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = SyntheticRecordConfig(
+        record_name=args.record,
+        output_dir=args.output_dir,
+        duration_seconds=parse_duration(args.duration),
+        sampling_rate=args.fs,
+        channels=args.channels,
+        heart_rate_bpm=args.heart_rate,
+        respiratory_rate_bpm=args.resp_rate,
+        spo2_percent=args.spo2,
+        noise_level=args.noise,
+        artifacts_per_hour=args.artifacts_per_hour,
+        dropouts_per_hour=args.dropouts_per_hour,
+        desaturations_per_hour=args.desaturations_per_hour,
+        seed=args.seed
+    )
+
+    print(f"🧬 Generating {config.duration_seconds / 60:.1f} min synthetic record '{config.record_name}' "
+          f"at {config.sampling_rate} Hz ({', '.join(config.channels)})")
+    paths = generate_record(config)
+    for label, path in paths.items():
+        if os.path.exists(path):
+            print(f"   ✅ {label}: {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ VitalSense Pro - Vital Signs Data Extractor
 Extracts all features required for MAI-DxO pipeline from WFDB files
 """
 
-import wfdb
 import numpy as np
 import json
 from scipy import signal
@@ -12,6 +11,11 @@ from scipy.stats import skew
 from datetime import datetime
 import os
 
+from services.hrv_engine import compute_hrv
+from services.qrs_detection import detect_window_qrs, ecg_channel
+from services.respiratory_analysis import record_breaths
+from services.wfdb_reader import open_record, read_window
+
 class VitalSignsExtractor:
     def __init__(self):
         self.sampling_rate = 125
@@ -19,11 +23,11 @@ class VitalSignsExtractor:
         self.analysis_window_end = 8 * 60    # 8 minutes
         
     def load_wfdb_files(self, record_path):
-        """Load WFDB record and annotations"""
+        """Open WFDB record and its numerics (n) record without decoding any samples"""
         try:
-            record = wfdb.rdrecord(record_path)
+            record = open_record(record_path)
             try:
-                annotations = wfdb.rdrecord(record_path + 'n')
+                annotations = open_record(record_path + 'n')
                 return record, annotations
             except:
                 return record, None
@@ -31,21 +35,20 @@ class VitalSignsExtractor:
             print(f"Error loading WFDB files: {e}")
             return None, None
     
-    def extract_analysis_window(self, signals, sampling_rate):
-        """Extract final 2-minute segment (minutes 6-8) for analysis"""
-        start_sample = int(self.analysis_window_start * sampling_rate)
-        end_sample = int(self.analysis_window_end * sampling_rate)
-        
-        if end_sample > len(signals):
-            end_sample = len(signals)
-            start_sample = max(0, end_sample - int(120 * sampling_rate))
+    def read_analysis_window(self, record, channels=None):
+        """Read the final 2-minute segment (minutes 6-8) for analysis; only that range is decoded"""
+        end_s = min(self.analysis_window_end, record.duration_seconds)
+        if end_s < self.analysis_window_end:
+            start_s = max(0.0, end_s - 120)
+        else:
+            start_s = self.analysis_window_start
         
-        return signals[start_sample:end_sample]
+        return read_window(record, channels, start_s, end_s)
     
     def analyze_spo2_waveform(self, pleth_signal, spo2_values=None):
         """Filtered SpO₂ Waveform Analysis"""
         if spo2_values is not None:
-            analysis_spo2 = self.extract_analysis_window(spo2_values, 1)
+            analysis_spo2 = spo2_values
             
             return {
                 "mean_spo2": float(np.mean(analysis_spo2)),
@@ -67,15 +70,37 @@ class VitalSignsExtractor:
                 "lowest_point_duration": 0.0
             }
     
-    def analyze_pulse_rate_waveform(self, pleth_signal, pulse_values=None):
+    def pleth_peak_intervals(self, pleth_signal, fs):
+        """Seconds between successive PLETH pulse peaks (at most 240 bpm apart), skipping dropouts"""
+        pleth_signal = np.asarray(pleth_signal, dtype=np.float64)
+        finite = np.isfinite(pleth_signal)
+        if fs is None or finite.sum() < 2:
+            return np.array([])
+        spread = np.ptp(pleth_signal[finite])
+        if spread == 0:
+            return np.array([])
+        if not finite.all():
+            # Bridge gaps linearly as the RESP path does; intervals across a gap are dropped below
+            positions = np.arange(len(pleth_signal))
+            pleth_signal = np.interp(positions, positions[finite], pleth_signal[finite])
+        peaks, _ = signal.find_peaks(pleth_signal, distance=max(1, int(0.25 * fs)), prominence=0.3 * spread)
+        gaps_before = np.concatenate(([0], np.cumsum(~finite)))
+        measured = gaps_before[peaks[1:] + 1] == gaps_before[peaks[:-1]]
+        return (np.diff(peaks) / fs)[measured]
+    
+    def analyze_pulse_rate_waveform(self, pleth_signal, pulse_values=None, fs=None):
         """Filtered Pulse Rate Waveform Analysis"""
         if pulse_values is not None:
-            analysis_pulse = self.extract_analysis_window(pulse_values, 1)
+            analysis_pulse = pulse_values
+            intervals = self.pleth_peak_intervals(pleth_signal, fs)
+            if len(intervals) == 0:
+                print("⚠️ No PLETH peak intervals found; estimating peak_to_peak_interval from the mean pulse rate")
+                intervals = np.array([60.0 / np.mean(analysis_pulse)])
             
             return {
                 "mean_pulse_rate": float(np.mean(analysis_pulse)),
                 "pulse_rate_variability": float(np.std(analysis_pulse)),
-                "peak_to_peak_interval": [0.8, 0.82, 0.79, 0.81, 0.80],
+                "peak_to_peak_interval": intervals.tolist()[:5],
                 "abnormal_patterns": "regular rhythm" if np.std(analysis_pulse) < 5 else "irregular rhythm detected"
             }
         else:
@@ -86,24 +111,35 @@ class VitalSignsExtractor:
                 "abnormal_patterns": "estimated_from_pleth"
             }
     
-    def analyze_heart_rate_waveform(self, ecg_signal, hr_values=None):
-        """Filtered Heart Rate Waveform Analysis"""
+    def approximate_hrv(self, rr_intervals):
+        """Time-domain HRV from RR intervals in seconds, used when no beats were detected"""
+        rr_ms = np.asarray(rr_intervals, dtype=np.float64) * 1000
+        successive = np.abs(np.diff(rr_ms))
+        return {
+            "SDNN": float(np.std(rr_ms)),
+            "RMSSD": float(np.sqrt(np.mean(successive ** 2))) if len(successive) else 0.0,
+            "pNN50": float(np.mean(successive > 50) * 100) if len(successive) else 0.0
+        }
+    
+    def analyze_heart_rate_waveform(self, ecg_signal, hr_values=None, rr_intervals=None, hrv=None):
+        """Filtered Heart Rate Waveform Analysis
+        
+        rr_intervals (seconds) and hrv (HRVMetrics) come from beats detected on the ECG;
+        without them the 1 Hz HR numerics are used as an approximation.
+        """
         if hr_values is not None:
-            analysis_hr = self.extract_analysis_window(hr_values, 1)
+            analysis_hr = hr_values
             
             mean_hr = np.mean(analysis_hr)
             std_hr = np.std(analysis_hr)
-            rr_intervals = 60.0 / analysis_hr
+            if rr_intervals is None or len(rr_intervals) == 0:
+                rr_intervals = 60.0 / analysis_hr
             
             return {
                 "mean_hr": float(mean_hr),
                 "std_hr": float(std_hr),
-                "rr_intervals": rr_intervals.tolist()[:10],  # First 10 values
-                "hrv_metrics": {
-                    "SDNN": float(np.std(rr_intervals) * 1000),
-                    "RMSSD": 30.0,  # Simplified
-                    "pNN50": 10.0   # Simplified
-                },
+                "rr_intervals": np.asarray(rr_intervals).tolist()[:10],  # First 10 values
+                "hrv_metrics": hrv.as_dict() if hrv is not None else self.approximate_hrv(rr_intervals),
                 "arrhythmia_flag": bool(std_hr / mean_hr > 0.20)
             }
         else:
@@ -118,7 +154,7 @@ class VitalSignsExtractor:
     def analyze_respiratory_rate(self, resp_signal, resp_values=None):
         """Filtered Respiratory Rate Analysis"""
         if resp_values is not None:
-            analysis_resp = self.extract_analysis_window(resp_values, 1)
+            analysis_resp = resp_values
             
             return {
                 "mean_rr": float(np.mean(analysis_resp)),
@@ -136,25 +172,41 @@ class VitalSignsExtractor:
                 "trend": "estimated_from_signal"
             }
     
-    def analyze_breathing_pattern(self, resp_signal):
+    def analyze_breathing_pattern(self, resp_signal, breaths=None):
         """Breathing Pattern Regulatory Analysis"""
+        summary = breaths.summary() if breaths is not None else {}
+        if 'cycle_duration' not in summary:
+            return {
+                "pattern_type": "undetermined",
+                "cycle_duration": None,
+                "cycle_amplitude": None,
+                "modality": "impedance"
+            }
+        
         return {
-            "pattern_type": "normal",
-            "cycle_duration": 4.0,
-            "cycle_amplitude": 1.0,
+            "pattern_type": "normal" if summary['pattern_classification'] == 'regular' else "irregular",
+            "cycle_duration": summary['cycle_duration'],
+            "cycle_duration_cv": summary['cycle_duration_cv'],
+            "cycle_amplitude": summary['amplitude_mean'],
+            "amplitude_variability": summary['amplitude_variability'],
+            "breath_count": summary['breath_count'],
+            "pauses": summary['pauses'],
             "modality": "impedance"
         }
     
-    def analyze_respiratory_waveform(self, resp_signal):
+    def analyze_respiratory_waveform(self, resp_signal, breaths=None):
         """Respiratory Waveform Pattern Analysis"""
-        analysis_resp = self.extract_analysis_window(resp_signal, self.sampling_rate)
+        analysis_resp = resp_signal
+        summary = breaths.summary() if breaths is not None else {}
+        skewness = summary.get('skewness', float(skew(analysis_resp)) if len(analysis_resp) > 0 else 0.0)
         
         return {
-            "waveform_shape": "sinusoidal",
-            "skewness": float(skew(analysis_resp)) if len(analysis_resp) > 0 else 0.0,
+            "waveform_shape": "sinusoidal" if abs(skewness) < 0.5 else "asymmetric",
+            "skewness": skewness,
             "amplitude_range": float(np.max(analysis_resp) - np.min(analysis_resp)) if len(analysis_resp) > 0 else 1.0,
-            "inspiration_to_expiration_ratio": 0.5,
-            "artifact_presence": False
+            "inspiration_to_expiration_ratio": summary.get('ie_ratio'),
+            "ie_ratio_variability": summary.get('ie_ratio_std'),
+            "artifact_presence": bool(len(analysis_resp) > 0 and np.isnan(analysis_resp).any())
         }
     
     def extract_all_features(self, record_path):
@@ -168,45 +220,59 @@ class VitalSignsExtractor:
         
         print(f"📊 Record info:")
         print(f"   - Signals: {len(record.sig_name)}")
-        print(f"   - Signal names: {record.sig_name}")
-        print(f"   - Duration: {len(record.p_signal)/record.fs:.1f} seconds")
+        print(f"   - Signal names: {list(record.sig_name)}")
+        print(f"   - Duration: {record.duration_seconds:.1f} seconds")
         print(f"   - Sampling rate: {record.fs} Hz")
         
-        # Map signals
-        signal_map = {}
-        for i, name in enumerate(record.sig_name):
-            signal_map[name.strip().rstrip(',')] = record.p_signal[:, i]
+        # Decode only the waveform channels the analyses use, within the analysis window
+        names = [name.strip().rstrip(',') for name in record.sig_name]
+        ecg_name = 'II' if 'II' in names else 'V'
+        window = self.read_analysis_window(
+            record, [name for name in ('PLETH', ecg_name, 'RESP') if name in names])
         
         processed_map = {}
         if annotations is not None:
-            print(f"📈 Processed signals: {annotations.sig_name}")
-            for i, name in enumerate(annotations.sig_name):
-                processed_map[name.strip().rstrip(',')] = annotations.p_signal[:, i]
+            print(f"📈 Processed signals: {list(annotations.sig_name)}")
+            processed_window = self.read_analysis_window(annotations)
+            for name in processed_window.sig_name:
+                processed_map[name.strip().rstrip(',')] = processed_window.channel(name)
         
         print(f"🧠 Analyzing final 2 minutes (minutes 6-8)...")
         
         features = {}
         
         # Extract all 6 required features
-        pleth_signal = signal_map.get('PLETH', np.zeros(len(record.p_signal)))
-        ecg_signal = signal_map.get('II', signal_map.get('V', np.zeros(len(record.p_signal))))
-        resp_signal = signal_map.get('RESP', np.zeros(len(record.p_signal)))
+        empty = np.zeros(window.n_samples)
+        pleth_signal = window.channel('PLETH') if 'PLETH' in names else empty
+        ecg_signal = window.channel(ecg_name) if ecg_name in names else empty
+        resp_signal = window.channel('RESP') if 'RESP' in names else empty
         
         features['spo2_analysis'] = self.analyze_spo2_waveform(
             pleth_signal, processed_map.get('SpO2'))
+        # Beat-to-beat intervals and HRV from the shared QRS detector, run on the analysis window only
+        ecg_idx = ecg_channel(record)
+        rr_intervals, hrv = None, None
+        if ecg_idx is not None:
+            beats = detect_window_qrs(record, ecg_idx, window.start_s, window.end_s)
+            rr_intervals = np.diff(beats) / record.fs
+            hrv = compute_hrv(beats, record.fs)
+        
         features['pulse_rate_analysis'] = self.analyze_pulse_rate_waveform(
-            pleth_signal, processed_map.get('PULSE'))
+            pleth_signal, processed_map.get('PULSE'), window.fs)
         features['heart_rate_analysis'] = self.analyze_heart_rate_waveform(
-            ecg_signal, processed_map.get('HR'))
+            ecg_signal, processed_map.get('HR'), rr_intervals, hrv)
         features['respiratory_rate_analysis'] = self.analyze_respiratory_rate(
             resp_signal, processed_map.get('RESP'))
-        features['breathing_pattern_analysis'] = self.analyze_breathing_pattern(resp_signal)
-        features['respiratory_waveform_analysis'] = self.analyze_respiratory_waveform(resp_signal)
+        # Breaths on the impedance waveform (cached per record window)
+        resp_idx = record.find_channel('RESP')
+        breaths = record_breaths(record, resp_idx, window.start_s, window.end_s) if resp_idx is not None else None
+        features['breathing_pattern_analysis'] = self.analyze_breathing_pattern(resp_signal, breaths)
+        features['respiratory_waveform_analysis'] = self.analyze_respiratory_waveform(resp_signal, breaths)
         
         features['patient_metadata'] = {
             "age": 88,
             "gender": "Male",
-            "recording_duration_seconds": len(record.p_signal) / record.fs,
+            "recording_duration_seconds": record.duration_seconds,
             "analysis_window": "6.0-8.0 minutes",
             "sampling_rate": record.fs,
             "extraction_timestamp": datetime.now().isoformat()
@@ -57,7 +57,7 @@ export async function GET(request: NextRequest) {
         FROM analysis_sessions a
         JOIN patients p ON a.patient_id = p.patient_id
         LEFT JOIN health_centers hc ON p.registered_at_health_center_id = hc.id
-        WHERE a.status IN ('PROCESSING', 'COMPLETED')
+        WHERE a.status IN ('PROCESSING', 'AI_COMPLETE', 'COMPLETED')
           AND a.created_at >= NOW() - INTERVAL '30 days'
           AND a.patient_id IS NOT NULL
           AND p.registered_at_health_center_id = ANY($1)
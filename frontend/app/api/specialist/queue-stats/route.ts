@@ -46,7 +46,7 @@ export async function GET(request: NextRequest) {
       SELECT COUNT(*) as count
       FROM analysis_sessions a
       JOIN patients p ON a.patient_id = p.patient_id
-      WHERE a.status IN ('PROCESSING', 'COMPLETED')
+      WHERE a.status IN ('PROCESSING', 'AI_COMPLETE', 'COMPLETED')
         AND a.created_at >= NOW() - INTERVAL '30 days'
         AND a.ai_risk_level IN ('HIGH', 'MEDIUM')
         AND p.registered_at_health_center_id = ANY($1)
@@ -56,7 +56,7 @@ export async function GET(request: NextRequest) {
       SELECT COUNT(*) as count
       FROM analysis_sessions a
       JOIN patients p ON a.patient_id = p.patient_id
-      WHERE a.status IN ('PROCESSING', 'COMPLETED')
+      WHERE a.status IN ('PROCESSING', 'AI_COMPLETE', 'COMPLETED')
         AND a.created_at >= NOW() - INTERVAL '30 days'
         AND a.ai_risk_level = 'HIGH'
         AND p.registered_at_health_center_id = ANY($1)